@@ -0,0 +1,60 @@
+"""Benchmarks of `HTTPClient` access methods against a local fake server.
+
+Run with, e.g.::
+
+    pytest benchmarks/bench_client.py --benchmark-only
+"""
+
+import json
+import pytest
+
+import tes
+
+from tes.testing import make_task
+
+
+def test_create_task(benchmark, client, task):
+    benchmark(client.create_task, task)
+
+
+@pytest.mark.parametrize("view", ["MINIMAL", "BASIC", "FULL"])
+def test_get_task(benchmark, client, fake_api, view):
+    task_id = fake_api.order[0]
+    benchmark(client.get_task, task_id, view)
+
+
+@pytest.mark.parametrize("page_size", [16, 256])
+def test_list_tasks_pagination(benchmark, client, page_size):
+    def list_all():
+        count = 0
+        page_token = None
+        while True:
+            response = client.list_tasks(
+                view="MINIMAL", page_size=page_size, page_token=page_token)
+            count += len(response.tasks or [])
+            page_token = response.next_page_token
+            if not page_token:
+                return count
+
+    assert benchmark(list_all) >= 1
+
+
+def test_wait_overhead(benchmark, client, fake_api):
+    # the task is complete already, so this measures a single poll through
+    # `wait()` rather than its poll interval
+    task_id = fake_api.order[0]
+    benchmark(client.wait, task_id, 5)
+
+
+@pytest.mark.parametrize("n_tasks,view", [
+    (256, "MINIMAL"), (256, "FULL"),
+])
+def test_decode_list_tasks(benchmark, n_tasks, view):
+    tasks = [json.loads(make_task(n_inputs=10, n_executors=2, log_bytes=1024,
+                                  state="COMPLETE").as_json())
+             for _ in range(n_tasks)]
+    if view == "MINIMAL":
+        tasks = [{"id": t["id"], "state": t["state"]} for t in tasks]
+    body = json.dumps({"tasks": tasks})
+    benchmark.extra_info["bytes"] = len(body)
+    benchmark(lambda: tes.unmarshal(json.loads(body), tes.ListTasksResponse))
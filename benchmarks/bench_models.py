@@ -0,0 +1,136 @@
+"""Micro-benchmarks of model serialization and unmarshalling.
+
+Run with pytest-benchmark, e.g.::
+
+    pytest benchmarks/bench_models.py --benchmark-only
+
+or standalone, printing operations per second and allocations measured with
+`tracemalloc` for each case::
+
+    python benchmarks/bench_models.py [--min-time SECONDS]
+"""
+
+import argparse
+import json
+import pytest
+import time
+import tracemalloc
+
+from typing import Any, Callable, Dict, List, Tuple
+
+import tes
+
+from attr import evolve
+
+from tes.template import TaskTemplate
+from tes.testing import make_task
+
+
+# task sizes: few vs many inputs and executors, without logs vs full logs
+# with large stdout and stderr
+CASES: Dict[str, Dict[str, Any]] = {
+    "small": dict(n_inputs=1, n_executors=1, with_logs=False),
+    "inputs-500": dict(n_inputs=500, n_executors=1, with_logs=False),
+    "executors-50": dict(n_inputs=1, n_executors=50, with_logs=False),
+    "full-logs": dict(n_inputs=1, n_executors=50, log_bytes=64 * 1024),
+}
+LIST_SIZE = 100
+
+
+def operations(case: str) -> List[Tuple[str, Callable[[], Any]]]:
+    """Build the benchmarked operations for a task size.
+
+    Args:
+        case: Key of `CASES`.
+
+    Returns:
+        List of operation names and callables.
+    """
+    task = make_task(state="COMPLETE", **CASES[case])
+    doc = json.loads(task.as_json())
+    body = json.dumps(doc)
+    listing = {"tasks": [doc] * LIST_SIZE, "next_page_token": "1"}
+    template = TaskTemplate(evolve(task, name="task-{{index}}"))
+    return [
+        ("Task.as_json", task.as_json),
+        ("TaskTemplate.render", lambda: template.render({"index": 1})),
+        ("Task.as_dict", task.as_dict),
+        ("unmarshal(Task, dict)", lambda: tes.unmarshal(doc, tes.Task)),
+        ("unmarshal(Task, str)", lambda: tes.unmarshal(body, tes.Task)),
+        (f"unmarshal(ListTasksResponse, {LIST_SIZE} tasks)",
+         lambda: tes.unmarshal(listing, tes.ListTasksResponse)),
+    ]
+
+
+def allocations(func: Callable[[], Any]) -> Tuple[int, int]:
+    """Measure memory allocated by a call.
+
+    `func` is called twice, each time with fresh tracing: once for the peak,
+    so that the snapshots taken for the blocks do not count towards it
+    (`tracemalloc.reset_peak()` needs Python 3.9), and once for the blocks.
+
+    Args:
+        func: Function to call.
+
+    Returns:
+        Tuple of peak traced memory in bytes and the number of memory blocks
+        allocated and still alive when `func` returns, including its result.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = func()  # noqa: F841
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(
+        stat.count_diff for stat in after.compare_to(before, "filename"))
+    return peak, blocks
+
+
+# built once, as test parameters and for main()
+CASE_OPERATIONS = [
+    (case, name, func) for case in CASES for name, func in operations(case)
+]
+
+
+@pytest.mark.parametrize("case,name,func", CASE_OPERATIONS, ids=[
+    f"{case}-{name}" for case, name, _ in CASE_OPERATIONS
+])
+def test_model(benchmark, case, name, func):
+    benchmark.group = name
+    peak, blocks = allocations(func)
+    benchmark.extra_info["peak_bytes"] = peak
+    benchmark.extra_info["blocks"] = blocks
+    benchmark(func)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="Seconds to run each operation for.")
+    args = parser.parse_args()
+    print(f"{'case':<14}{'operation':<42}{'ops/s':>10}"
+          f"{'peak KiB':>11}{'blocks':>9}")
+    for case, name, func in CASE_OPERATIONS:
+        peak, blocks = allocations(func)
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= args.min_time:
+                break
+        print(f"{case:<14}{name:<42}{calls / elapsed:>10.1f}"
+              f"{peak / 1024:>11.1f}{blocks:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Benchmarks of `HTTPClient` calls through each transport.
+
+Run with, e.g.::
+
+    pytest benchmarks/bench_transport.py --benchmark-only
+"""
+
+import pytest
+
+import tes
+
+from tes.bench import H2C_TRANSPORTS, TRANSPORTS
+from tes.testing import InMemoryTransport
+
+
+@pytest.fixture(params=list(TRANSPORTS) + ["in-memory"])
+def transport_client(request, fake_server, fake_api):
+    server = fake_server
+    if request.param == "in-memory":
+        transport = InMemoryTransport(fake_api)
+    else:
+        try:
+            transport = TRANSPORTS[request.param](8)
+        except ImportError as exc:
+            pytest.skip(str(exc))
+        if request.param in H2C_TRANSPORTS:
+            server = request.getfixturevalue("fake_h2c_server")
+    cli = tes.HTTPClient(server.url, transport=transport)
+    cli.discover()
+    yield cli
+    transport.close()
+
+
+def test_get_task(benchmark, transport_client, fake_api):
+    benchmark.group = "get_task MINIMAL"
+    task_id = fake_api.order[0]
+    benchmark(transport_client.get_task, task_id, "MINIMAL")
+
+
+def test_list_tasks(benchmark, transport_client):
+    benchmark.group = "list_tasks FULL"
+    benchmark(transport_client.list_tasks, "FULL", 64)
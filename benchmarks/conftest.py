@@ -0,0 +1,52 @@
+import pytest
+
+import tes
+
+from tes.testing import FakeTES, FakeTESServer, make_task
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("tes benchmarks")
+    group.addoption("--fake-latency", type=float, default=0.0,
+                    help="Latency of the fake TES server in seconds.")
+    group.addoption("--fake-tasks", type=int, default=1000,
+                    help="Number of tasks stored on the fake TES server.")
+
+
+@pytest.fixture(scope="session")
+def fake_api(request):
+    api = FakeTES(latency=request.config.getoption("--fake-latency"))
+    for _ in range(request.config.getoption("--fake-tasks")):
+        api.add_task(make_task(n_inputs=10, n_executors=2, log_bytes=1024,
+                               state="COMPLETE"))
+    return api
+
+
+@pytest.fixture(scope="session")
+def fake_server(fake_api):
+    with FakeTESServer(fake_api) as server:
+        yield server
+
+
+@pytest.fixture(scope="session")
+def fake_h2c_server(fake_api):
+    try:
+        server = FakeTESServer(fake_api, http2=True)
+    except ImportError as exc:
+        pytest.skip(str(exc))
+    with server:
+        yield server
+
+
+@pytest.fixture
+def client(fake_server):
+    cli = tes.HTTPClient(fake_server.url, timeout=10)
+    # skip base path fallbacks, as a long-lived client would after discovery
+    cli.discover()
+    return cli
+
+
+@pytest.fixture
+def task():
+    return tes.Task(
+        executors=[tes.Executor(image="alpine", command=["echo", "hello"])])
@@ -40,6 +40,13 @@ setup(
     python_requires=">=3.7, <4",
     install_requires=read("requirements.txt").splitlines(),
     tests_require=read("tests/requirements.txt").splitlines(),
+    extras_require={
+        "http2": ["httpx[http2]>=0.23.0"],
+        "opentelemetry": ["opentelemetry-api>=1.0.0"],
+    },
+    entry_points={
+        "console_scripts": ["tes-bench=tes.bench:main"],
+    },
     zip_safe=True,
     classifiers=[
         "Development Status :: 4 - Beta",
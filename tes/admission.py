@@ -0,0 +1,236 @@
+"""Admission control capping the number of tasks in flight on a server."""
+
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+from attr import evolve
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, List, Optional, Set, Tuple
+
+from tes.cache import tagged_tasks
+from tes.futures import FINAL_STATES, TaskFuture, watch_created
+from tes.models import Task
+from tes.submission import SubmissionQueue
+
+
+# tag storing the client ID of the admission controller that created a task
+ADMISSION_TAG = "tes-admission-client"
+
+
+class AdmissionController(object):
+    """Hold back task submissions while too many tasks are in flight.
+
+    Tasks submitted with `submit()` are created on the server only while
+    fewer than `max_in_flight` tasks are in flight, i.e., created but not
+    yet in a final state; the others wait in a local queue, highest
+    `priority` first, and first come, first served within a priority. This
+    keeps the server's queue short, however many tasks are submitted.
+
+    Tasks in flight are tracked through the futures of admitted tasks,
+    completed by the client's poller (see `HTTPClient.poller`). Admitted
+    tasks are tagged with `client_id` in `ADMISSION_TAG`. If
+    `reconcile_interval` is set, tasks in flight on the server with the same
+    client ID are also counted every `reconcile_interval` seconds while
+    tasks are waiting for admission, see `reconcile()`, and the larger of
+    both numbers is capped, to account for tasks created with the same
+    client ID elsewhere, e.g. by an earlier run or another process. Tasks of
+    other clients are not counted.
+
+    Admitted tasks are created in the background with a
+    `tes.submission.SubmissionQueue` of `max_workers` workers.
+
+    Args:
+        client: `HTTPClient` to create and poll tasks with.
+        max_in_flight: Largest number of tasks in flight.
+        max_workers: Largest number of concurrent create requests.
+        client_id: ID to tag admitted tasks with; a random ID if `None`.
+        reconcile_interval: Seconds between counts of the tasks in flight on
+            the server; tasks on the server are not counted if `None`.
+        scan_page_size: Page size for counting tasks on the server.
+        max_scan_pages: Largest number of pages to count tasks on the server
+            from, newest first.
+
+    Attributes:
+        client_id: ID admitted tasks are tagged with.
+        server_in_flight: Number of tasks with the client ID in flight on
+            the server at the last count.
+
+    Raises:
+        ValueError: If `max_in_flight` is smaller than 1.
+    """
+
+    def __init__(
+        self, client: Any, max_in_flight: int = 1000, max_workers: int = 8,
+        client_id: Optional[str] = None,
+        reconcile_interval: Optional[float] = None,
+        scan_page_size: int = 256, max_scan_pages: int = 40
+    ):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.client_id = client_id or uuid.uuid4().hex
+        self.reconcile_interval = reconcile_interval
+        self.scan_page_size = scan_page_size
+        self.max_scan_pages = max_scan_pages
+        self.server_in_flight = 0
+        self._submissions = SubmissionQueue(
+            client, max_workers=max_workers, max_queue_size=max_in_flight)
+        self._heap: List[Tuple[int, int, Task, TaskFuture]] = []
+        self._counter = itertools.count()
+        self._admitted: Set[TaskFuture] = set()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._reconciled = 0.0
+        self._thread = threading.Thread(
+            target=self._dispatch, name="tes-admission", daemon=True)
+        self._thread.start()
+
+    def submit(self, task: Task, priority: int = 0) -> TaskFuture:
+        """Submit a task for creation once there is room in flight.
+
+        Args:
+            task: `tes.models.Task` instance.
+            priority: Priority of the task; tasks with higher priority are
+                admitted first.
+
+        Returns:
+            `tes.futures.TaskFuture` resolved with the task in `MINIMAL` view
+            once it reaches a final state, or failing with the error raised
+            by `HTTPClient.create_task()`. Its `task_id` is `None` until the
+            task is created. Cancelling it before then drops the task.
+
+        Raises:
+            TypeError: If `task` is not a `tes.models.Task` instance.
+            RuntimeError: If the controller has been shut down.
+        """
+        if not isinstance(task, Task):
+            raise TypeError("Expected Task instance")
+        future = TaskFuture(None)  # type: ignore
+        future.add_done_callback(self._release)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Admission controller has been shut down")
+            heapq.heappush(
+                self._heap, (-priority, next(self._counter), task, future))
+            self._condition.notify_all()
+        return future
+
+    def in_flight(self) -> int:
+        """Number of admitted tasks not in a final state yet."""
+        with self._condition:
+            return len(self._admitted)
+
+    def pending(self) -> int:
+        """Number of tasks waiting for admission."""
+        with self._condition:
+            return len(self._heap)
+
+    def reconcile(self) -> int:
+        """Count the tasks with the client ID in flight on the server.
+
+        Scans up to `max_scan_pages` pages of tasks listed with
+        `tes.cache.tagged_tasks()`, newest first.
+
+        Returns:
+            Number of tasks not in a final state; also stored in
+            `server_in_flight`.
+        """
+        count = sum(
+            1 for task in tagged_tasks(
+                self.client, ADMISSION_TAG, self.client_id,
+                self.max_scan_pages, self.scan_page_size)
+            if task.state not in FINAL_STATES
+        )
+        with self._condition:
+            self.server_in_flight = count
+            self._reconciled = time.monotonic()
+            self._condition.notify_all()
+        return count
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """Stop accepting tasks.
+
+        Tasks waiting for admission are still admitted as room frees up,
+        unless `cancel_pending` is set.
+
+        Args:
+            wait: Wait until all waiting tasks have been created.
+            cancel_pending: Cancel the futures of tasks waiting for
+                admission instead.
+        """
+        with self._condition:
+            self._closed = True
+            pending = self._heap if cancel_pending else []
+            if cancel_pending:
+                self._heap = []
+            self._condition.notify_all()
+        for _, _, _, future in pending:
+            future.cancel()
+        if wait:
+            self._thread.join()
+        self._submissions.shutdown(wait=wait)
+
+    def _full(self) -> bool:
+        """Whether no more tasks can be admitted right now."""
+        return max(len(self._admitted), self.server_in_flight) \
+            >= self.max_in_flight
+
+    def _dispatch(self) -> None:
+        while True:
+            self._maybe_reconcile()
+            with self._condition:
+                while self._heap and self._heap[0][3].done():
+                    heapq.heappop(self._heap)
+                if not self._heap and self._closed:
+                    return
+                if not self._heap:
+                    # nothing to admit, no need to count tasks either
+                    self._condition.wait()
+                    continue
+                if self._full():
+                    self._condition.wait(self._until_reconcile())
+                    continue
+                _, _, task, future = heapq.heappop(self._heap)
+                self._admitted.add(future)
+            tagged = evolve(task, tags=dict(task.tags or {}, **{
+                ADMISSION_TAG: self.client_id}))
+            created = self._submissions.enqueue(tagged)
+            created.add_done_callback(
+                partial(watch_created, self.client, future))
+
+    def _maybe_reconcile(self) -> None:
+        if self.reconcile_interval is None or self._until_reconcile():
+            return
+        with self._condition:
+            if not self._heap:
+                return
+        try:
+            self.reconcile()
+        except Exception:
+            with self._condition:
+                self._reconciled = time.monotonic()
+
+    def _until_reconcile(self) -> Optional[float]:
+        """Seconds until the next count of the tasks on the server."""
+        if self.reconcile_interval is None:
+            return None
+        return max(
+            self._reconciled + self.reconcile_interval - time.monotonic(), 0)
+
+    def _release(self, future: Future) -> None:
+        """Free the slot of a task once done."""
+        with self._condition:
+            if future in self._admitted:
+                self._admitted.discard(future)
+                self._condition.notify_all()
+
+    def __enter__(self) -> "AdmissionController":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
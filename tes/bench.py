@@ -0,0 +1,373 @@
+"""Load generator driving a TES server through `HTTPClient` (`tes-bench`)."""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import requests
+import sys
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from tes.client import HTTPClient
+from tes.models import Executor, Task
+from tes.testing import FakeTES, FakeTESServer
+from tes.transport import (HttpxTransport, RequestsTransport,
+                           SessionTransport, Transport, UnixSocketTransport,
+                           Urllib3Transport)
+
+
+QUANTILES = [("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999)]
+
+# transports by name, created given the concurrency
+TRANSPORTS: Dict[str, Callable[[int], Transport]] = {
+    "requests": lambda concurrency: RequestsTransport(),
+    "session": lambda concurrency: SessionTransport(
+        pool_maxsize=concurrency),
+    "urllib3": lambda concurrency: Urllib3Transport(maxsize=concurrency),
+    "httpx": lambda concurrency: HttpxTransport(),
+    "httpx-http2": lambda concurrency: HttpxTransport(http2=True),
+    "httpx-h2c": lambda concurrency: HttpxTransport(
+        http2_prior_knowledge=True),
+    "unix": lambda concurrency: UnixSocketTransport(maxsize=concurrency),
+}
+# transports speaking HTTP/2 without negotiation, i.e., only to h2c servers
+H2C_TRANSPORTS = frozenset(["httpx-h2c"])
+
+
+def percentile(samples: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted samples.
+
+    Args:
+        samples: Samples in ascending order.
+        q: Quantile between 0 and 1.
+
+    Returns:
+        The percentile, or `None` if there are no samples.
+    """
+    if not samples:
+        return None
+    rank = min(max(math.ceil(q * len(samples)), 1), len(samples))
+    return samples[rank - 1]
+
+
+class Workload(object):
+    """Open-loop workload of task creation, polling and listing.
+
+    Each operation is started at a fixed rate, independent of how long
+    earlier operations take, on a pool of `concurrency` threads. Operations
+    due while all threads are busy are skipped and counted, rather than
+    delayed, so that a saturated server shows up as skipped operations
+    instead of silently lowering the offered load.
+
+    Args:
+        client: Client to drive.
+        create_rate: Tasks created per second.
+        poll_rate: `get_task()` calls per second, for random tasks created
+            during the run or listed at start; polls are skipped while there
+            are no such tasks.
+        list_rate: `list_tasks()` calls per second.
+        page_size: Page size of `list_tasks()` calls.
+        concurrency: Number of concurrent requests.
+        view: View of `get_task()` calls.
+        task: Task to create; a task running `true` in `alpine` if `None`.
+    """
+
+    def __init__(
+        self, client: HTTPClient, create_rate: float = 1.0,
+        poll_rate: float = 10.0, list_rate: float = 1.0,
+        page_size: int = 256, concurrency: int = 8, view: str = "MINIMAL",
+        task: Optional[Task] = None
+    ):
+        self.client = client
+        self.rates = {
+            "create_task": create_rate,
+            "get_task": poll_rate,
+            "list_tasks": list_rate,
+        }
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.view = view
+        self.task = task or Task(
+            name="tes-bench",
+            executors=[Executor(image="alpine", command=["true"])],
+            tags={"tes-bench": "true"},
+        )
+        self.task_ids: List[str] = []
+        self.latencies: Dict[str, List[float]] = {op: [] for op in self.rates}
+        self.errors: Dict[str, int] = {op: 0 for op in self.rates}
+        self.skipped: Dict[str, int] = {op: 0 for op in self.rates}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def _operation(self, op: str) -> Optional[Callable[[], Any]]:
+        if op == "create_task":
+            def create() -> None:
+                task_id = self.client.create_task(self.task)
+                with self._lock:
+                    self.task_ids.append(task_id)
+            return create
+        if op == "get_task":
+            with self._lock:
+                task_id = self._random.choice(self.task_ids) \
+                    if self.task_ids else None
+            if task_id is None:
+                return None
+            return lambda: self.client.get_task(task_id, view=self.view)
+        return lambda: self.client.list_tasks(
+            view="MINIMAL", page_size=self.page_size)
+
+    def _run_one(self, op: str, func: Callable[[], Any]) -> None:
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            with self._lock:
+                self.errors[op] += 1
+        else:
+            with self._lock:
+                self.latencies[op].append(time.perf_counter() - start)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def run(self, duration: float) -> Dict[str, Any]:
+        """Run the workload.
+
+        Args:
+            duration: Seconds to start operations for; operations in flight
+                at the end are awaited.
+
+        Returns:
+            Report as returned by `report()`.
+        """
+        try:
+            listed = self.client.list_tasks(view="MINIMAL",
+                                            page_size=self.page_size)
+            self.task_ids.extend(t.id for t in listed.tasks or [] if t.id)
+        except Exception:
+            pass
+        start = time.monotonic()
+        # entries are start time, operation and number of operations started
+        schedule = [
+            (start, op, 0) for op, rate in self.rates.items() if rate > 0]
+        heapq.heapify(schedule)
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="tes-bench"
+        ) as executor:
+            while schedule:
+                due, op, count = heapq.heappop(schedule)
+                if due >= start + duration:
+                    continue
+                time.sleep(max(due - time.monotonic(), 0))
+                func = self._operation(op)
+                with self._lock:
+                    busy = self._in_flight >= self.concurrency
+                    if func is not None and not busy:
+                        self._in_flight += 1
+                if func is None or busy:
+                    self.skipped[op] += 1
+                else:
+                    executor.submit(self._run_one, op, func)
+                count += 1
+                heapq.heappush(
+                    schedule, (start + count / self.rates[op], op, count))
+        return self.report(time.monotonic() - start)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        """Summarize the results.
+
+        Args:
+            elapsed: Seconds the run took.
+
+        Returns:
+            Dictionary with the run parameters and, per endpoint, the number
+            of successful, failed and skipped operations, the throughput of
+            successful operations per second, and latency percentiles in
+            seconds.
+        """
+        endpoints = {}
+        for op, rate in self.rates.items():
+            samples = sorted(self.latencies[op])
+            latency: Dict[str, Optional[float]] = {
+                name: percentile(samples, q) for name, q in QUANTILES}
+            latency["max"] = samples[-1] if samples else None
+            latency["mean"] = sum(samples) / len(samples) if samples else None
+            endpoints[op] = {
+                "rate": rate,
+                "requests": len(samples),
+                "errors": self.errors[op],
+                "skipped": self.skipped[op],
+                "throughput": len(samples) / elapsed if elapsed else 0.0,
+                "latency": latency,
+            }
+        return {
+            "url": self.client.url,
+            "transport": type(self.client.transport).__name__,
+            "duration": elapsed,
+            "concurrency": self.concurrency,
+            "page_size": self.page_size,
+            "view": self.view,
+            "endpoints": endpoints,
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Format a workload report as a text table.
+
+    Args:
+        report: Report as returned by `Workload.report()`.
+
+    Returns:
+        Text report; latencies are in milliseconds.
+    """
+    url = report["url"]
+    if isinstance(url, list):
+        url = ", ".join(url)
+    columns = ["ok", "errors", "skipped", "ops/s"] + \
+        [name for name, _ in QUANTILES] + ["max"]
+    lines = [
+        f"{url} ({report['transport']}): {report['duration']:.1f}s, "
+        f"concurrency {report['concurrency']}, page size "
+        f"{report['page_size']}, view {report['view']}",
+        f"{'endpoint':<12}" + "".join(f"{c:>10}" for c in columns),
+    ]
+    for op, stats in report["endpoints"].items():
+        if not stats["rate"]:
+            continue
+        row = [str(stats["requests"]), str(stats["errors"]),
+               str(stats["skipped"]), f"{stats['throughput']:.1f}"]
+        for name in [name for name, _ in QUANTILES] + ["max"]:
+            value = stats["latency"][name]
+            row.append("-" if value is None else f"{value * 1000:.2f}")
+        lines.append(f"{op:<12}" + "".join(f"{v:>10}" for v in row))
+    if "server_connections" in report:
+        lines.append(
+            f"connections accepted by the server: "
+            f"{report['server_connections']}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments of `tes-bench`."""
+    parser = argparse.ArgumentParser(
+        prog="tes-bench",
+        description="Drive a load of task creation, polling and listing "
+                    "through py-tes against a TES server and report "
+                    "throughput and latency per endpoint.",
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("url", nargs="?", help="TES server URL.")
+    target.add_argument("--fake", action="store_true",
+                        help="Run against an in-process fake TES server.")
+    parser.add_argument("--fake-latency", type=float, default=0.0,
+                        help="Latency of the fake server in seconds.")
+    parser.add_argument("--fake-http2", action="store_true",
+                        help="Serve HTTP/2 without TLS (h2c) from the fake "
+                             "server; implied by --transport httpx-h2c.")
+    parser.add_argument("--fake-unix", action="store_true",
+                        help="Serve the fake server on a Unix domain socket.")
+    parser.add_argument("--create-rate", type=float, default=1.0,
+                        help="Tasks created per second (default: 1).")
+    parser.add_argument("--poll-rate", type=float, default=10.0,
+                        help="Task polls per second (default: 10).")
+    parser.add_argument("--list-rate", type=float, default=1.0,
+                        help="Task listings per second (default: 1).")
+    parser.add_argument("--page-size", type=int, default=256,
+                        help="Page size of task listings (default: 256).")
+    parser.add_argument("--view", default="MINIMAL",
+                        choices=["MINIMAL", "BASIC", "FULL"],
+                        help="View of task polls (default: MINIMAL).")
+    parser.add_argument("--image", default="alpine",
+                        help="Image of created tasks (default: alpine).")
+    parser.add_argument("-c", "--concurrency", type=int, default=8,
+                        help="Concurrent requests (default: 8).")
+    parser.add_argument("-d", "--duration", type=float, default=10.0,
+                        help="Duration in seconds (default: 10).")
+    parser.add_argument("--transport", choices=list(TRANSPORTS),
+                        default="requests",
+                        help="Transport to send requests with (default: "
+                             "requests, or unix for http+unix URLs).")
+    parser.add_argument("--timeout", type=int, default=10,
+                        help="Request timeout in seconds (default: 10).")
+    parser.add_argument("--user", help="Basic auth user.")
+    parser.add_argument("--password", help="Basic auth password.")
+    parser.add_argument("--token", help="Bearer token.")
+    parser.add_argument("--format", choices=["text", "json"], default="text",
+                        help="Report format (default: text).")
+    parser.add_argument("-o", "--output",
+                        help="Also write the report as JSON to this file.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run `tes-bench`.
+
+    Args:
+        argv: Command line arguments; `sys.argv[1:]` if `None`.
+
+    Returns:
+        Exit code.
+    """
+    args = parse_args(argv)
+    server = None
+    url = args.url
+    if args.fake:
+        unix_socket = None
+        if args.fake_unix:
+            unix_socket = os.path.join(tempfile.mkdtemp(), "tes.sock")
+        http2 = args.fake_http2 or args.transport in H2C_TRANSPORTS
+        server = FakeTESServer(FakeTES(latency=args.fake_latency),
+                               http2=http2, unix_socket=unix_socket).start()
+        url = server.url
+    name = args.transport
+    if name == "requests" and url.startswith("http+unix://"):
+        name = "unix"
+    try:
+        transport = TRANSPORTS[name](args.concurrency)
+        client = HTTPClient(
+            url, timeout=args.timeout, user=args.user,
+            password=args.password, token=args.token, transport=transport)
+        try:
+            client.discover()
+        except requests.exceptions.HTTPError:
+            # no service info: keep trying all base paths
+            pass
+        workload = Workload(
+            client, create_rate=args.create_rate, poll_rate=args.poll_rate,
+            list_rate=args.list_rate, page_size=args.page_size,
+            concurrency=args.concurrency, view=args.view,
+            task=Task(
+                name="tes-bench",
+                executors=[Executor(image=args.image, command=["true"])],
+                tags={"tes-bench": "true"},
+            ),
+        )
+        report = workload.run(args.duration)
+        transport.close()
+        if server is not None:
+            report["server_connections"] = server.connections
+    finally:
+        if server is not None:
+            server.stop()
+            if server.unix_socket is not None:
+                os.rmdir(os.path.dirname(server.unix_socket))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.format == "json":
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Call caching: reuse completed tasks with identical specifications."""
+
+import hashlib
+import json
+import requests
+import threading
+
+from attr import evolve
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+from tes.instrumentation import fire
+from tes.models import Task
+
+
+# tag storing the call cache key of a task
+CACHE_TAG = "tes-call-cache-key"
+# fields that do not change what a task computes
+_IGNORED_FIELDS = ("id", "state", "logs", "creation_time", "name",
+                   "description", "tags")
+
+
+def task_key(task: Task) -> str:
+    """Compute the call cache key of a task.
+
+    The key is the SHA-256 digest of the task's canonical JSON
+    representation, without the fields that do not change what the task
+    computes: ID, state, logs, creation time, name, description and tags.
+
+    Args:
+        task: `tes.models.Task` instance.
+
+    Returns:
+        Hexadecimal key.
+    """
+    doc = json.loads(task.as_json())
+    for field in _IGNORED_FIELDS:
+        doc.pop(field, None)
+    canonical = json.dumps(doc, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def tagged_tasks(
+    client: Any, key: str, value: str, max_pages: Optional[int] = None,
+    page_size: Optional[int] = None
+) -> Iterator[Task]:
+    """List the tasks with a tag, most recent first.
+
+    Tasks are listed in `BASIC` view, filtered by tag on the server, and
+    their tags are checked again, as servers implementing TES 1.0 ignore
+    tag filters and list all tasks.
+
+    Args:
+        client: `HTTPClient` to list tasks with.
+        key: Tag key.
+        value: Tag value.
+        max_pages: Largest number of pages to look through; all pages if
+            `None`.
+        page_size: Number of tasks per page; the server's default if
+            `None`.
+
+    Yields:
+        `tes.models.Task` instances in `BASIC` view.
+    """
+    page_token = None
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        page = client.list_tasks(
+            view="BASIC", page_size=page_size, page_token=page_token,
+            tag_key=[key], tag_value=[value])
+        pages += 1
+        for task in page.tasks or []:
+            if (task.tags or {}).get(key) == value:
+                yield task
+        page_token = page.next_page_token
+        if not page_token:
+            break
+
+
+class CallCache(object):
+    """Create tasks unless an identical task has completed already.
+
+    `create_task()` looks up a `COMPLETE` task with the same key (see
+    `task_key()`) and returns its ID instead of creating a new task. Keys
+    are stored in the `tag` tag of created tasks, and looked up first in a
+    local index of tasks created or found by the cache, then, if
+    `server_lookup` is set, on the server with `tagged_tasks()`, so that
+    tasks created by earlier runs are reused too. Tasks in the local index
+    known to be `COMPLETE` are reused without any request; tasks purged
+    from the server are treated as misses.
+
+    Each lookup is reported to the `record_cache` hook of the client, e.g.
+    to `tes.metrics.MetricsRegistry`.
+
+    Args:
+        client: `HTTPClient` to create and look up tasks with.
+        tag: Tag to store keys in.
+        server_lookup: Look up keys missing from the local index on the
+            server.
+        name: Name of the cache reported to hooks.
+        max_scan_pages: Largest number of pages of tasks with a key to look
+            through on the server.
+    """
+
+    def __init__(
+        self, client: Any, tag: str = CACHE_TAG, server_lookup: bool = True,
+        name: str = "call", max_scan_pages: int = 4
+    ):
+        self.client = client
+        self.tag = tag
+        self.server_lookup = server_lookup
+        self.name = name
+        self.max_scan_pages = max_scan_pages
+        # key -> (task ID, whether the task is known to be COMPLETE)
+        self._index: Dict[str, Tuple[str, bool]] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, task: Union[Task, str]) -> Optional[str]:
+        """Look up a `COMPLETE` task with the same key.
+
+        Args:
+            task: `tes.models.Task` instance, or its key.
+
+        Returns:
+            Task ID, or `None` if there is no such task.
+        """
+        key = task if isinstance(task, str) else task_key(task)
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is not None:
+            task_id, complete = entry
+            if complete:
+                return task_id
+            try:
+                state = self.client.get_task(task_id, "MINIMAL").state
+            except requests.exceptions.HTTPError as exc:
+                if exc.response is None or exc.response.status_code != 404:
+                    raise
+                # purged from the server
+                state = None
+                self._forget(key, task_id)
+            if state == "COMPLETE":
+                self._remember(key, task_id, True)
+                return task_id
+        if not self.server_lookup:
+            return None
+        for found in tagged_tasks(
+                self.client, self.tag, key, self.max_scan_pages):
+            if found.state == "COMPLETE":
+                self._remember(key, found.id, True)
+                return found.id
+        return None
+
+    def create_task(
+        self, task: Task, timeout_total: Optional[float] = None
+    ) -> str:
+        """Create a task unless an identical task has completed already.
+
+        Args:
+            task: `tes.models.Task` instance.
+            timeout_total: Time budget in seconds for creating the task,
+                see `HTTPClient.create_task()`.
+
+        Returns:
+            ID of the `COMPLETE` identical task, or of the created task.
+
+        Raises:
+            TypeError: If `task` is not a `tes.models.Task` instance.
+        """
+        if not isinstance(task, Task):
+            raise TypeError("Expected Task instance")
+        key = task_key(task)
+        task_id = self.lookup(key)
+        fire(self.client.hooks, 'record_cache', task_id is not None, self.name)
+        if task_id is not None:
+            return task_id
+        tagged = evolve(task, tags=dict(task.tags or {}, **{self.tag: key}))
+        task_id = self.client.create_task(
+            tagged, timeout_total=timeout_total)
+        self._remember(key, task_id, False)
+        return task_id
+
+    def _remember(self, key: str, task_id: str, complete: bool) -> None:
+        with self._lock:
+            self._index[key] = (task_id, complete)
+
+    def _forget(self, key: str, task_id: str) -> None:
+        with self._lock:
+            if self._index.get(key, (None,))[0] == task_id:
+                del self._index[key]
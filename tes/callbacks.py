@@ -0,0 +1,145 @@
+"""Embedded HTTP server receiving task state change callbacks."""
+
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional, Tuple
+
+from tes.futures import TaskPoller
+
+
+class CallbackListener(object):
+    """Local HTTP server resolving task futures from pushed notifications.
+
+    TES servers that can POST state changes of tasks to a webhook make
+    polling unnecessary: the listener accepts such notifications and hands
+    them to a `tes.futures.TaskPoller`, which resolves the futures of tasks
+    reaching a final state right away. The poller keeps polling every
+    `fallback_interval` seconds to catch missed notifications. Use the
+    listener's poller for the client::
+
+        with CallbackListener() as listener:
+            client = tes.HTTPClient(url, poller=listener.poller)
+            future = client.submit(task)  # with the callback URL configured
+            future.result()
+
+    How the callback URL (`CallbackListener.url`) is passed to the server
+    depends on the server; `tes.testing.FakeTES` reads it from the
+    `tes.testing.CALLBACK_TAG` tag of each task.
+
+    Notifications are JSON objects with the `id` and `state` of a task, as
+    in the `MINIMAL` view of `GET /tasks/{id}`, or lists thereof. They are
+    answered with status 204, or 400 if malformed.
+
+    Args:
+        poller: Poller to notify; a new poller polling every
+            `fallback_interval` seconds if `None`.
+        host: Address to listen on.
+        port: Port to listen on; a free port is chosen if 0.
+        path: Path to accept notifications at.
+        fallback_interval: Seconds between fallback polls of a task, if
+            `poller` is `None`.
+
+    Attributes:
+        poller: Poller notified of state changes.
+        url: Callback URL.
+        received: Number of notifications received so far.
+    """
+
+    def __init__(
+        self, poller: Optional[TaskPoller] = None, host: str = "127.0.0.1",
+        port: int = 0, path: str = "/callbacks",
+        fallback_interval: float = 30.0
+    ):
+        self.poller = poller or TaskPoller(interval=fallback_interval)
+        self.path = path
+        self.received = 0
+        self.server = ThreadingHTTPServer((host, port), _handler(self))
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}{path}"
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CallbackListener":
+        """Start listening from a background thread."""
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="tes-callbacks",
+            daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop listening and close the listening socket."""
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+
+    def handle(self, body: bytes) -> int:
+        """Apply a notification.
+
+        Args:
+            body: Request body.
+
+        Returns:
+            Status code to answer with.
+        """
+        try:
+            updates = _parse(body)
+        except ValueError:
+            return 400
+        with self._lock:
+            self.received += len(updates)
+        for task_id, state in updates:
+            self.poller.notify(task_id, state)
+        return 204
+
+    def __enter__(self) -> "CallbackListener":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+
+def _parse(body: bytes) -> List[Tuple[str, str]]:
+    """Extract task IDs and states from a notification.
+
+    Raises:
+        ValueError: If the notification is malformed.
+    """
+    doc: Any = json.loads(body)
+    docs = doc if isinstance(doc, list) else [doc]
+    updates = []
+    for item in docs:
+        if not isinstance(item, dict) or \
+                not isinstance(item.get("id"), str) or \
+                not isinstance(item.get("state"), str):
+            raise ValueError("Notifications must have an id and a state")
+        updates.append((item["id"], item["state"]))
+    return updates
+
+
+def _handler(listener: CallbackListener) -> type:
+    """Build a request handler class notifying `listener`."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            if self.path.split("?")[0] != listener.path:
+                status = 404
+            else:
+                status = listener.handle(body)
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return Handler
@@ -2,17 +2,32 @@
 
 import re
 import requests
+import threading
 import time
 
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait as wait_futures
 from attr import attrs, attrib
 from attr.validators import instance_of, optional
+from functools import partial
 from urllib.parse import urlparse
-from typing import Any, Dict, List, Optional
+from typing import (Any, Dict, Iterable, List, Mapping, Optional, Sequence,
+                    Tuple, Type, Union)
 
 from tes.models import (Task, ListTasksRequest, ListTasksResponse, ServiceInfo,
                         GetTaskRequest, CancelTaskRequest, CreateTaskResponse,
                         strconv)
-from tes.utils import unmarshal, TimeoutError
+from tes.endpoints import Endpoint, EndpointPool
+from tes.futures import TaskFuture, TaskPoller, default_poller, watch_created
+from tes.hedging import HedgePolicy
+from tes.instrumentation import fire, Hooks, RequestEvent
+from tes.submission import SubmissionQueue
+from tes.template import TaskTemplate
+from tes.tracing import NOOP_SPAN, NOOP_TRACER, Span, Tracer
+from tes.transport import DEFAULT_TRANSPORT, Transport, UnixSocketTransport
+from tes.utils import (unmarshal, never_connected, NoResponseError,
+                       TimeoutError)
 
 
 def append_suffixes_to_url(
@@ -44,9 +59,35 @@ def append_suffixes_to_url(
     return compiled_paths
 
 
+def cap_timeout(
+    timeout: Union[None, float, Tuple[float, float]], remaining: float
+) -> Union[float, Tuple[float, float]]:
+    """Cap a :mod:`requests` timeout to the time remaining until a deadline.
+
+    Args:
+        timeout: Timeout as passed to :mod:`requests`; either a single value,
+            a `(connect, read)` tuple or `None`.
+        remaining: Seconds left until the deadline.
+
+    Returns:
+        Timeout of the same shape as `timeout`, with each value capped to
+        `remaining`.
+    """
+    if timeout is None:
+        return remaining
+    if isinstance(timeout, tuple):
+        return (min(timeout[0], remaining), min(timeout[1], remaining))
+    return min(timeout, remaining)
+
+
 def send_request(
     paths: List[str], method: str = 'get',
-    kwargs_requests: Optional[Dict[str, Any]] = None, **kwargs: Any
+    kwargs_requests: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+    hooks: Optional[Sequence[Hooks]] = None, endpoint: str = '',
+    event_log: Optional[List[RequestEvent]] = None,
+    tracer: Tracer = NOOP_TRACER, parent_span: Optional[Span] = None,
+    transport: Optional[Transport] = None, **kwargs: Any
 ) -> requests.Response:
     """Send request to a list of URLs, returning the first valid response.
 
@@ -55,6 +96,22 @@ def send_request(
         method: HTTP method to use for the request; one of 'get' (default),
             'post', 'put', and 'delete'.
         kwargs_requests: Keyword arguments to pass to the :mod:`requests` call.
+        deadline: Absolute point in time, as given by :func:`time.monotonic`,
+            by which all attempts must have finished. The timeout of each
+            attempt is capped to the time remaining.
+        hooks: Request lifecycle hooks to call for each attempt, see
+            `tes.instrumentation.Hooks`.
+        endpoint: Name of the endpoint to report to `hooks`.
+        event_log: List to append the events of all attempts to. If given,
+            attempts are numbered on from the length of the list, and the
+            `post_response` hook for a successful response is left to the
+            caller, who may complete its event (the last one in the list)
+            with the decode time first.
+        tracer: Tracer to emit a span for each attempt with, see
+            `tes.tracing.Tracer`.
+        parent_span: Parent span of the attempt spans.
+        transport: Transport to send requests with, see
+            `tes.transport.Transport`; `DEFAULT_TRANSPORT` if `None`.
         **kwargs: Keyword arguments for path parameter substition.
 
     Returns:
@@ -68,39 +125,276 @@ def send_request(
         requests.exceptions.HTTPError: If, after trying all paths, at least one
             404 status code and no other 4xx or 5xx status codes are received.
         ValueError: If an unsupported HTTP method is provided.
+        tes.utils.TimeoutError: If `deadline` passes before a valid response
+            is received.
     """
     if kwargs_requests is None:
         kwargs_requests = {}
     if method not in ('get', 'post', 'put', 'delete'):
         raise ValueError(f"Unsupported HTTP method: {method}")
 
+    if transport is None:
+        transport = DEFAULT_TRANSPORT
     response: requests.Response = requests.Response()
     http_exceptions: Dict[str, Exception] = {}
-    for path in paths:
+    event: Optional[RequestEvent] = None
+    for index, path in enumerate(paths):
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    f"Deadline exceeded before trying {path}; HTTP "
+                    f"Exceptions: {http_exceptions}")
+            kwargs_requests = dict(kwargs_requests)
+            kwargs_requests['timeout'] = cap_timeout(
+                kwargs_requests.get('timeout'), remaining)
+        url = path.format(**kwargs)
+        event = RequestEvent(
+            endpoint=endpoint, method=method, path=url,
+            attempt=(len(event_log) if event_log is not None else index) + 1,
+            request_bytes=len(kwargs_requests.get('data') or ''))
+        if event_log is not None:
+            event_log.append(event)
+        fire(hooks, 'pre_request', event)
+        span = tracer.start_span("tes.attempt", {
+            "http.method": method.upper(),
+            "http.url": url,
+            "tes.attempt": event.attempt,
+        }, parent=parent_span)
+        start = time.monotonic()
         try:
-            response = getattr(requests, method)(
-                path.format(**kwargs), **kwargs_requests)
+            response = transport.request(method, url, **kwargs_requests)
         except requests.exceptions.RequestException as exc:
             http_exceptions[path] = exc
+            event.total = time.monotonic() - start
+            event.error = exc
+            span.record_exception(exc)
+            span.end()
+            fire(hooks, 'on_error', event)
             continue
+        span.set_attribute("http.status_code", response.status_code)
+        span.end()
+        event.total = time.monotonic() - start
+        event.status_code = response.status_code
+        event.ttfb = response.elapsed.total_seconds()
+        event.connect_time = getattr(response, "connect_time", None)
+        event.response_bytes = len(response.content)
+        event.response = response
         if response.status_code != 404:
             break
+        fire(hooks, 'post_response', event)
 
     if response.status_code is None:
-        raise requests.exceptions.HTTPError(
-            f"No response received; HTTP Exceptions: {http_exceptions}")
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Deadline exceeded; HTTP Exceptions: {http_exceptions}")
+        raise NoResponseError(
+            f"No response received; HTTP Exceptions: {http_exceptions}",
+            exceptions=http_exceptions)
+    if response.status_code != 404 and (event_log is None or not response.ok):
+        fire(hooks, 'post_response', event)  # type: ignore
     response.raise_for_status()
     return response
 
 
+def probe_paths(
+    paths: List[str], kwargs_requests: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None, transport: Optional[Transport] = None,
+    **kwargs: Any
+) -> Tuple[int, requests.Response]:
+    """Send `GET` requests to a list of URLs concurrently.
+
+    Unlike :func:`send_request`, all paths are tried at the same time, so
+    that finding a valid path takes a single round trip. The order of `paths`
+    is still respected: a response is only accepted once all paths preceding
+    it have failed or returned a 404 status code. Requests that are not yet
+    needed are cancelled, and responses that are not used are closed.
+
+    Args:
+        paths: List of fully qualified URLs, in order of preference.
+        kwargs_requests: Keyword arguments to pass to the :mod:`requests` call.
+        deadline: Absolute point in time, as given by :func:`time.monotonic`,
+            by which a valid response must have been received.
+        transport: Transport to send requests with; `DEFAULT_TRANSPORT` if
+            `None`.
+        **kwargs: Keyword arguments for path parameter substition.
+
+    Returns:
+        Tuple of the index of the chosen path in `paths` and its response.
+
+    Raises:
+        requests.exceptions.HTTPError: Under the same conditions as
+            :func:`send_request`.
+        tes.utils.TimeoutError: If `deadline` passes before a valid response
+            is received.
+    """
+    if kwargs_requests is None:
+        kwargs_requests = {}
+    if transport is None:
+        transport = DEFAULT_TRANSPORT
+    if deadline is not None:
+        kwargs_requests = dict(kwargs_requests)
+        kwargs_requests['timeout'] = cap_timeout(
+            kwargs_requests.get('timeout'),
+            max(deadline - time.monotonic(), 0))
+
+    executor = ThreadPoolExecutor(max_workers=max(len(paths), 1))
+    futures = [
+        executor.submit(
+            transport.request, 'get', path.format(**kwargs), **kwargs_requests)
+        for path in paths
+    ]
+    winner: Optional[int] = None
+    pending = set(futures)
+    try:
+        while winner is None and pending:
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - time.monotonic(), 0)
+            done, pending = wait_futures(
+                pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("Deadline exceeded while probing paths")
+            for index, future in enumerate(futures):
+                if not future.done():
+                    break
+                if (
+                    future.exception() is None and
+                    future.result().status_code != 404
+                ):
+                    winner = index
+                    break
+    finally:
+        for index, future in enumerate(futures):
+            if index != winner and not future.cancel():
+                future.add_done_callback(_close_response)
+        executor.shutdown(wait=False)
+
+    if winner is None:
+        responses = [f.result() for f in futures if f.exception() is None]
+        if not responses:
+            http_exceptions = dict(zip(paths, [f.exception() for f in futures]))
+            raise NoResponseError(
+                f"No response received; HTTP Exceptions: {http_exceptions}",
+                exceptions=http_exceptions)
+        responses[-1].raise_for_status()
+    response = futures[winner].result()
+    response.raise_for_status()
+    return winner, response
+
+
+def _close_response(future) -> None:
+    """Close the response of a finished, unused request future."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+@attrs
+class _Call(object):
+    """State of a single access method call, shared by all its attempts."""
+
+    endpoint: str = attrib()
+    suffixes: List[str] = attrib()
+    method: str = attrib(default='get')
+    kwargs_requests: Dict[str, Any] = attrib(factory=dict)
+    deadline: Optional[float] = attrib(default=None)
+    path_params: Dict[str, Any] = attrib(factory=dict)
+    event_log: Optional[List[RequestEvent]] = attrib(default=None)
+    span: Span = attrib(default=NOOP_SPAN)
+
+
+def _find_event(
+    event_log: List[RequestEvent], response: requests.Response
+) -> RequestEvent:
+    """Find the event of the attempt that returned `response`."""
+    for event in reversed(event_log):
+        if event.response is response:
+            return event
+    raise LookupError("No event recorded for response")  # pragma: no cover
+
+
 def process_url(value):
+    if isinstance(value, list):
+        return [process_url(v) for v in value]
     return re.sub("[/]+$", "", value)
 
 
+def _is_url(inst, attribute, value) -> None:
+    """`attrs` validator for a URL or a non-empty list of URLs."""
+    if isinstance(value, list) and value:
+        for v in value:
+            instance_of(str)(inst, attribute, v)
+    else:
+        instance_of(str)(inst, attribute, value)
+
+
+def _may_fail_over(exc: requests.exceptions.HTTPError, read: bool) -> bool:
+    """Whether a request may be retried against another replica.
+
+    Reads fail over on missing responses and 5xx status codes. Writes only
+    fail over if no connection could be established at all (see
+    `tes.utils.never_connected()`), so that a task is never created twice.
+
+    Args:
+        exc: Exception raised for the request.
+        read: Whether the request is a read.
+
+    Returns:
+        `True` if the request may be sent to another replica.
+    """
+    if isinstance(exc, NoResponseError):
+        return read or never_connected(exc)
+    return read and exc.response is not None and \
+        exc.response.status_code >= 500
+
+
+def _cancel_created(created: Future, future: Future) -> None:
+    """Drop a queued task if its future is cancelled before it is sent."""
+    if future.cancelled():
+        created.cancel()
+
+
 @attrs
 class HTTPClient(object):
-    """HTTP client class for interacting with the TES API."""
-    url: str = attrib(converter=process_url, validator=instance_of(str))
+    """HTTP client class for interacting with the TES API.
+
+    Attributes:
+        url: Base URL of the TES instance, or a list of base URLs of replicas
+            of the same TES instance. Reads are balanced across healthy
+            replicas by observed latency; failing replicas are ejected for a
+            cool-down period, see `tes.endpoints.EndpointPool`. Instances
+            listening on a Unix domain socket are addressed with `http+unix`
+            URLs, see `tes.transport.UnixSocketTransport`.
+        timeout: Read timeout in seconds for each individual request; also
+            used as the connect timeout unless `connect_timeout` is set.
+        connect_timeout: Connect timeout in seconds for each individual
+            request.
+        timeout_total: Default time budget in seconds for a whole access
+            method call, covering all fallback paths (and, for `wait()`, all
+            polls). Can be overridden per call. No budget if `None`.
+        user: Username for basic authentication.
+        password: Password for basic authentication.
+        token: Bearer token for authentication.
+        discovery: Discover the API base path of the TES instance on first
+            use, see `HTTPClient.discover()`.
+        hedging: Policy for hedging slow reads (`get_service_info()`,
+            `get_task()` and `list_tasks()`), see `tes.hedging.HedgePolicy`.
+            No hedging if `None`.
+        hooks: Request lifecycle hooks, called for every attempt of every
+            call, see `tes.instrumentation.Hooks`.
+        tracer: Tracer emitting spans for calls, attempts and decoding, see
+            `tes.tracing.Tracer`. Does nothing by default.
+        transport: Transport to send requests with, see
+            `tes.transport.Transport`, e.g. to record and replay traffic.
+            Uses the module-level functions of :mod:`requests` by default,
+            or `tes.transport.UnixSocketTransport` for `http+unix` URLs.
+        poller: Poller completing futures of tasks, for `submit()` and
+            `wait()`, see `tes.futures.TaskPoller`. Uses the process-wide
+            poller shared by all clients if `None`, see
+            `tes.futures.default_poller()`.
+    """
+    url: Union[str, List[str]] = attrib(
+        converter=process_url, validator=_is_url)
     timeout: int = attrib(default=10, validator=instance_of(int))
     user: Optional[str] = attrib(
         default=None, converter=strconv, validator=optional(instance_of(str)))
@@ -108,12 +402,35 @@ class HTTPClient(object):
         default=None, converter=strconv, validator=optional(instance_of(str)))
     token: Optional[str] = attrib(
         default=None, converter=strconv, validator=optional(instance_of(str)))
+    connect_timeout: Optional[Union[int, float]] = attrib(
+        default=None, validator=optional(instance_of((int, float))))
+    timeout_total: Optional[Union[int, float]] = attrib(
+        default=None, validator=optional(instance_of((int, float))))
+    discovery: bool = attrib(default=False, validator=instance_of(bool))
+    hedging: Optional[HedgePolicy] = attrib(
+        default=None, validator=optional(instance_of(HedgePolicy)))
+    hooks: List[Hooks] = attrib(factory=list, validator=instance_of(list))
+    tracer: Tracer = attrib(default=NOOP_TRACER, validator=instance_of(Tracer))
+    transport: Transport = attrib(
+        default=DEFAULT_TRANSPORT, validator=instance_of(Transport))
+    poller: Optional[TaskPoller] = attrib(
+        default=None, validator=optional(instance_of(TaskPoller)))
 
     def __attrs_post_init__(self):
+        base_urls = self.url if isinstance(self.url, list) else [self.url]
+        if self.transport is DEFAULT_TRANSPORT and any(
+            url.startswith("http+unix://") for url in base_urls
+        ):
+            self.transport = UnixSocketTransport()
+        self.endpoints: EndpointPool = EndpointPool(base_urls)
+        self.prefixes: List[str] = ["/ga4gh/tes/v1", "/v1", "/"]
         # for backward compatibility
         self.urls: List[str] = append_suffixes_to_url(
-            [self.url], ["/ga4gh/tes/v1", "/v1", "/"]
+            base_urls[:1], self.prefixes
         )
+        self._discovered: bool = False
+        self._lock = threading.Lock()
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
 
     @url.validator  # type: ignore
     def __check_url(self, attribute, value):
@@ -128,31 +445,78 @@ class HTTPClient(object):
         Raises:
             ValueError: If URL scheme is unsupported.
         """
-        u = urlparse(value)
-        if u.scheme not in ["http", "https"]:
-            raise ValueError(
-                "Unsupported URL scheme - must be one of [%s,%s]"
-                % ("http", "https")
-            )
-
-    def get_service_info(self) -> ServiceInfo:
+        for url in value if isinstance(value, list) else [value]:
+            u = urlparse(url)
+            if u.scheme not in ["http", "https", "http+unix"]:
+                raise ValueError(
+                    "Unsupported URL scheme - must be one of [%s,%s,%s]"
+                    % ("http", "https", "http+unix")
+                )
+
+    def discover(self, timeout_total: Optional[float] = None) -> str:
+        """Discover the API base path of the TES instance.
+
+        Probes `GET /service-info` under all candidate base paths
+        concurrently, then pins `HTTPClient.urls` to the most preferred base
+        path that responded, so that subsequent calls need no fallbacks.
+        With several replicas, the base path found on the first one is used
+        for all of them.
+
+        Args:
+            timeout_total: Time budget in seconds for the call; defaults to
+                `HTTPClient.timeout_total`.
+
+        Returns:
+            Discovered base URL.
+
+        Raises:
+            requests.exceptions.HTTPError: If no candidate base path returned
+                a valid response.
+        """
+        if timeout_total is None:
+            timeout_total = self.timeout_total
+        deadline = (
+            time.monotonic() + timeout_total
+            if timeout_total is not None else None
+        )
+        suffixes = ["service-info", "tasks/service-info"]
+        index, _ = probe_paths(
+            append_suffixes_to_url(self.urls, suffixes),
+            kwargs_requests=self._request_params(), deadline=deadline,
+            transport=self.transport)
+        base = self.urls[index // len(suffixes)]
+        self.prefixes = [self.prefixes[index // len(suffixes)]]
+        self.urls = [base]
+        self._discovered = True
+        return base
+
+    def get_service_info(
+        self, timeout_total: Optional[float] = None
+    ) -> ServiceInfo:
         """Access method for `GET /service-info`.
 
+        Args:
+            timeout_total: Time budget in seconds for the call; defaults to
+                `HTTPClient.timeout_total`.
+
         Returns:
             `tes.models.ServiceInfo` instance.
         """
         kwargs: Dict[str, Any] = self._request_params()
-        paths = append_suffixes_to_url(
-            self.urls, ["service-info", "tasks/service-info"]
-        )
-        response = send_request(paths=paths, kwargs_requests=kwargs)
-        return unmarshal(response.json(), ServiceInfo)
-
-    def create_task(self, task: Task) -> CreateTaskResponse:
+        return self._send(
+            "get_service_info", ["service-info", "tasks/service-info"],
+            model=ServiceInfo, kwargs_requests=kwargs,
+            timeout_total=timeout_total)
+
+    def create_task(
+        self, task: Task, timeout_total: Optional[float] = None
+    ) -> CreateTaskResponse:
         """Access method for `POST /tasks`.
 
         Args:
             task: `tes.models.Task` instance.
+            timeout_total: Time budget in seconds for the call; defaults to
+                `HTTPClient.timeout_total`.
 
         Returns:
             `tes.models.CreateTaskResponse` instance.
@@ -164,19 +528,40 @@ class HTTPClient(object):
             msg = task.as_json()
         else:
             raise TypeError("Expected Task instance")
+        return self.create_task_json(msg, timeout_total=timeout_total)
 
-        kwargs: Dict[str, Any] = self._request_params(data=msg)
-        paths = append_suffixes_to_url(self.urls, ["/tasks"])
-        response = send_request(paths=paths, method='post',
-                                kwargs_requests=kwargs)
-        return unmarshal(response.json(), CreateTaskResponse).id
+    def create_task_json(
+        self, body: str, timeout_total: Optional[float] = None
+    ) -> str:
+        """Access method for `POST /tasks`, taking a serialized task.
 
-    def get_task(self, task_id: str, view: str = "BASIC") -> Task:
+        Args:
+            body: JSON representation of the task, e.g. from
+                `tes.models.Task.as_json()` or `tes.template.TaskTemplate`;
+                sent as is.
+            timeout_total: Time budget in seconds for the call; defaults to
+                `HTTPClient.timeout_total`.
+
+        Returns:
+            Task ID.
+        """
+        kwargs: Dict[str, Any] = self._request_params(data=body)
+        return self._send(
+            "create_task", ["/tasks"], model=CreateTaskResponse,
+            method='post', kwargs_requests=kwargs,
+            timeout_total=timeout_total).id
+
+    def get_task(
+        self, task_id: str, view: str = "BASIC",
+        timeout_total: Optional[float] = None
+    ) -> Task:
         """Access method for `GET /tasks/{id}`.
 
         Args:
             task_id: TES Task ID.
             view: Task info verbosity. One of `MINIMAL`, `BASIC` and `FULL`.
+            timeout_total: Time budget in seconds for the call; defaults to
+                `HTTPClient.timeout_total`.
 
         Returns:
             `tes.models.Task` instance.
@@ -184,27 +569,35 @@ class HTTPClient(object):
         req: GetTaskRequest = GetTaskRequest(task_id, view)
         payload: Dict[str, Optional[str]] = {"view": req.view}
         kwargs: Dict[str, Any] = self._request_params(params=payload)
-        paths = append_suffixes_to_url(self.urls, ["/tasks/{task_id}"])
-        response = send_request(paths=paths, kwargs_requests=kwargs,
-                                task_id=req.id)
-        return unmarshal(response.json(), Task)
-
-    def cancel_task(self, task_id: str) -> None:
+        return self._send(
+            "get_task", ["/tasks/{task_id}"], model=Task,
+            kwargs_requests=kwargs, timeout_total=timeout_total,
+            task_id=req.id)
+
+    def cancel_task(
+        self, task_id: str, timeout_total: Optional[float] = None
+    ) -> None:
         """Access method for `POST /tasks/{id}:cancel`.
 
         Args:
             task_id: TES Task ID.
+            timeout_total: Time budget in seconds for the call; defaults to
+                `HTTPClient.timeout_total`.
         """
         req: CancelTaskRequest = CancelTaskRequest(task_id)
         kwargs: Dict[str, Any] = self._request_params()
-        paths = append_suffixes_to_url(self.urls, ["/tasks/{task_id}:cancel"])
-        send_request(paths=paths, method='post', kwargs_requests=kwargs,
-                     task_id=req.id)
+        self._send(
+            "cancel_task", ["/tasks/{task_id}:cancel"], method='post',
+            kwargs_requests=kwargs, timeout_total=timeout_total,
+            task_id=req.id)
         return None
 
     def list_tasks(
         self, view: str = "MINIMAL", page_size: Optional[int] = None,
-        page_token: Optional[str] = None
+        page_token: Optional[str] = None,
+        timeout_total: Optional[float] = None,
+        tag_key: Optional[List[str]] = None,
+        tag_value: Optional[List[str]] = None
     ) -> ListTasksResponse:
         """Access method for `GET /tasks`.
 
@@ -212,6 +605,12 @@ class HTTPClient(object):
             view: Task info verbosity. One of `MINIMAL`, `BASIC` and `FULL`.
             page_size: Number of tasks to return.
             page_token: Token to retrieve the next page of tasks.
+            timeout_total: Time budget in seconds for the call; defaults to
+                `HTTPClient.timeout_total`.
+            tag_key: Only return tasks with these tags, see `tag_value`.
+            tag_value: Values of the tags in `tag_key`, in the same order;
+                keys without a value match tasks with the tag set to any
+                value.
 
         Returns:
             `tes.models.ListTasksResponse` instance.
@@ -221,35 +620,380 @@ class HTTPClient(object):
             page_size=page_size,
             page_token=page_token,
             name_prefix=None,
-            project=None
+            project=None,
+            tag_key=tag_key,
+            tag_value=tag_value
         )
         msg: Dict = req.as_dict()
 
         kwargs: Dict[str, Any] = self._request_params(params=msg)
-        paths = append_suffixes_to_url(self.urls, ["/tasks"])
-        response = send_request(paths=paths, kwargs_requests=kwargs)
-        return unmarshal(response.json(), ListTasksResponse)
+        return self._send(
+            "list_tasks", ["/tasks"], model=ListTasksResponse,
+            kwargs_requests=kwargs, timeout_total=timeout_total)
+
+    def submit(
+        self, task: Task, timeout_total: Optional[float] = None
+    ) -> TaskFuture:
+        """Create a task and return a future of its completion.
+
+        The future is resolved by a background poller shared by all waiters,
+        see `HTTPClient.poller`.
+
+        Args:
+            task: `tes.models.Task` instance.
+            timeout_total: Time budget in seconds for creating the task;
+                defaults to `HTTPClient.timeout_total`.
+
+        Returns:
+            `tes.futures.TaskFuture` resolved with the task in `MINIMAL`
+            view once it reaches a final state.
+
+        Raises:
+            TypeError: If `task` is not a `tes.models.Task` instance.
+        """
+        task_id = self.create_task(task, timeout_total=timeout_total)
+        return self._poller().watch(self, task_id)
+
+    def map(
+        self, template: Union[TaskTemplate, Task],
+        params: Iterable[Mapping[str, Any]], max_concurrency: int = 8
+    ) -> List[TaskFuture]:
+        """Create a task per set of parameters from a template.
+
+        All tasks are rendered first, see `tes.template.TaskTemplate`, then
+        created in the background with up to `max_concurrency` requests in
+        flight, see `tes.submission.SubmissionQueue`; the call returns
+        without waiting for them.
+
+        Args:
+            template: Task template; a task is turned into a template.
+            params: Placeholder values, one mapping per task.
+            max_concurrency: Largest number of concurrent create requests.
+
+        Returns:
+            `tes.futures.TaskFuture` per task, in the order of `params`,
+            resolved with the task in `MINIMAL` view once it reaches a final
+            state, or failing with the error raised when creating it. Its
+            `task_id` is `None` until the task is created. Cancelling it
+            before then drops the task.
+
+        Raises:
+            TypeError: If `template` is neither a `tes.template.TaskTemplate`
+                nor a `tes.models.Task` instance.
+            KeyError: If a placeholder has no value.
+        """
+        if not isinstance(template, TaskTemplate):
+            template = TaskTemplate(template)
+        bodies = [template.render(values) for values in params]
+        submissions = SubmissionQueue(
+            self, max_workers=max_concurrency,
+            max_queue_size=max(len(bodies), 1))
+        futures = []
+        for body in bodies:
+            future = TaskFuture(None)  # type: ignore
+            created = submissions.enqueue(body)
+            future.add_done_callback(partial(_cancel_created, created))
+            created.add_done_callback(partial(watch_created, self, future))
+            futures.append(future)
+        # workers stop once all tasks are sent
+        submissions.shutdown(wait=False)
+        return futures
 
     def wait(self, task_id: str, timeout=None) -> Task:
-        def check_success(data: Task) -> bool:
-            return data.state not in ["QUEUED", "RUNNING", "INITIALIZING"]
+        """Wait for a task to reach a final state.
+
+        The task is polled by a background poller shared by all waiters, see
+        `HTTPClient.poller`, so that concurrent waits for the same task cost
+        no more polls than a single one.
+
+        Args:
+            task_id: TES Task ID.
+            timeout: Time budget in seconds for waiting; defaults to
+                `HTTPClient.timeout_total`. Wait indefinitely if `None`.
+
+        Returns:
+            `tes.models.Task` instance in `MINIMAL` view.
 
-        max_time = time.time() + timeout if timeout else None
+        Raises:
+            tes.utils.TimeoutError: If the task has not reached a final state
+                before `timeout` has passed.
+        """
+        if timeout is None:
+            timeout = self.timeout_total
+        future = self._poller().watch(self, task_id)
+        try:
+            return future.result(timeout=timeout if timeout else None)
+        except (FutureTimeoutError, TimeoutError):
+            last = {"id": task_id, "state": future.state} \
+                if future.state else None
+            error = TimeoutError(f"last_response: {last}")
+        except Exception:
+            raise Exception(f"Failed to get task {task_id}")
+        # stop watching the task on behalf of this waiter
+        try:
+            future.set_exception(error)
+        except Exception:  # pragma: no cover
+            return future.result()  # completed concurrently
+        raise error
+
+    def _send(
+        self, endpoint: str, suffixes: List[str],
+        model: Optional[Type] = None, method: str = 'get',
+        kwargs_requests: Optional[Dict[str, Any]] = None,
+        timeout_total: Optional[float] = None, **kwargs: Any
+    ) -> Any:
+        """Send request to all candidate paths of an endpoint and decode it.
 
-        response: Optional[Task] = None
-        while True:
+        Args:
+            endpoint: Name of the access method, reported to hooks.
+            suffixes: Endpoint paths to be appended to `HTTPClient.urls`.
+            model: TES model to unmarshal the response to; the response body
+                is not decoded if `None`.
+            method: HTTP method to use for the request.
+            kwargs_requests: Keyword arguments to pass to the :mod:`requests`
+                call.
+            timeout_total: Time budget in seconds for the call; defaults to
+                `HTTPClient.timeout_total`.
+            **kwargs: Keyword arguments for path parameter substition.
+
+        Returns:
+            Instance of `model`, or `None`.
+        """
+        if timeout_total is None:
+            timeout_total = self.timeout_total
+        deadline = (
+            time.monotonic() + timeout_total
+            if timeout_total is not None else None
+        )
+        if self.discovery and not self._discovered:
+            with self._lock:
+                if not self._discovered:
+                    try:
+                        self.discover(timeout_total=(
+                            deadline - time.monotonic()
+                            if deadline is not None else None
+                        ))
+                    except requests.exceptions.HTTPError:
+                        # keep trying all base paths in sequence
+                        self._discovered = True
+        with self.tracer.start_span(f"tes.{endpoint}", {
+            "tes.endpoint": endpoint, "http.method": method.upper(),
+        }) as span:
+            call = _Call(
+                endpoint=endpoint, suffixes=suffixes, method=method,
+                kwargs_requests=kwargs_requests or {}, deadline=deadline,
+                path_params=kwargs, event_log=[] if self.hooks else None,
+                span=span)
+            if self.hedging is not None and method == 'get':
+                response = self._send_hedged(call)
+            else:
+                response = self._send_once(call)
+            return self._decode(call, response, model)
+
+    def _decode(
+        self, call: _Call, response: requests.Response,
+        model: Optional[Type]
+    ) -> Any:
+        """Decode a response and report it to hooks.
+
+        Args:
+            call: State of the call.
+            response: Response to decode.
+            model: TES model to unmarshal the response to; the response body
+                is not decoded if `None`.
+
+        Returns:
+            Instance of `model`, or `None`.
+        """
+        start = time.monotonic()
+        try:
+            result = None
+            if model is not None:
+                with self.tracer.start_span("tes.decode.json", {
+                    "http.response_content_length": len(response.content),
+                }, parent=call.span):
+                    data = response.json()
+                with self.tracer.start_span("tes.decode.unmarshal", {
+                    "tes.model": model.__name__,
+                }, parent=call.span):
+                    result = unmarshal(data, model)
+        except Exception as exc:
+            if call.event_log is not None:
+                event = _find_event(call.event_log, response)
+                event.decode_time = time.monotonic() - start
+                event.error = exc
+                fire(self.hooks, 'on_error', event)
+            raise
+        if call.event_log is not None:
+            event = _find_event(call.event_log, response)
+            event.decode_time = time.monotonic() - start
+            fire(self.hooks, 'post_response', event)
+        return result
+
+    def _send_hedged(self, call: _Call) -> requests.Response:
+        """Send a read request, hedging it if it is slow to return.
+
+        See `tes.hedging.HedgePolicy` for details. Hedges go through the
+        replica selection again, so with several replicas they usually reach
+        a different one.
+
+        The hedge delay and the recorded latency count from when the
+        original request is actually sent, not from when it was queued for a
+        worker thread, and hedges run on a thread pool of their own: time
+        spent waiting for a busy pool does not trigger hedges that would
+        only queue up behind the requests they hedge.
+
+        Args:
+            call: State of the call.
+
+        Returns:
+            The first successful response of either request.
+        """
+        policy: HedgePolicy = self.hedging  # type: ignore
+        key = call.endpoint
+        policy.admit()
+        started = threading.Event()
+        start: List[float] = []
+
+        def send() -> requests.Response:
+            start.append(time.monotonic())
+            started.set()
+            return self._send_once(call)
+
+        futures = [self._executor().submit(send)]
+        winner = None
+        try:
+            if not started.wait(
+                max(call.deadline - time.monotonic(), 0)
+                if call.deadline is not None else None
+            ):
+                raise TimeoutError("Deadline exceeded")
+            done, _ = wait_futures(futures, timeout=max(
+                start[0] + policy.delay(key) - time.monotonic(), 0))
+            if not done and policy.try_hedge():
+                futures.append(
+                    self._executor("hedges").submit(self._send_once, call))
+            pending = set(futures)
+            while winner is None and pending:
+                timeout = None
+                if call.deadline is not None:
+                    timeout = max(call.deadline - time.monotonic(), 0)
+                done, pending = wait_futures(
+                    pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError("Deadline exceeded")
+                for future in futures:
+                    if future in done and future.exception() is None:
+                        winner = future
+                        break
+        finally:
+            for future in futures:
+                if future is not winner and not future.cancel():
+                    future.add_done_callback(partial(self._abandon, call))
+        if winner is None:
+            # all requests failed; report the original one
+            return futures[0].result()
+        policy.record(key, time.monotonic() - start[0])
+        if winner is not futures[0]:
+            policy.record_win()
+        return winner.result()
+
+    def _abandon(self, call: _Call, future: Future) -> None:
+        """Report and close the response of a hedged request that lost.
+
+        Errors are reported to hooks as they occur, but `post_response` for
+        a successful response is left to the caller, see
+        :func:`send_request`, so it is fired here for unused responses.
+
+        Args:
+            call: State of the call.
+            future: Finished future of the request.
+        """
+        if future.cancelled() or future.exception() is not None:
+            return
+        response = future.result()
+        if call.event_log is not None:
+            fire(self.hooks, 'post_response',
+                 _find_event(call.event_log, response))
+        response.close()
+
+    def _send_once(self, call: _Call) -> requests.Response:
+        """Send request to the replicas in turn until one succeeds.
+
+        Args:
+            call: State of the call.
+
+        Returns:
+            The first successful response, see :func:`send_request`.
+        """
+        read = call.method == 'get'
+        candidates = self.endpoints.candidates(read=read)
+        for replica in candidates[:-1]:
             try:
-                response = self.get_task(task_id, "MINIMAL")
-            except Exception:
-                raise Exception(f"Failed to get task {task_id}")
+                return self._send_to(call, replica)
+            except requests.exceptions.HTTPError as exc:
+                if not _may_fail_over(exc, read):
+                    raise
+        return self._send_to(call, candidates[-1])
 
-            if response is not None:
-                if check_success(response):
-                    return response
+    def _send_to(
+        self, call: _Call, replica: Endpoint
+    ) -> requests.Response:
+        """Send request to all candidate paths of an endpoint on one replica.
+
+        Args:
+            call: State of the call.
+            replica: Replica to send the request to.
 
-                if max_time is not None and time.time() >= max_time:
-                    raise TimeoutError("last_response: {response.as_dict()}")
-            time.sleep(0.5)
+        Returns:
+            The first successful response, see :func:`send_request`.
+        """
+        paths = append_suffixes_to_url(
+            append_suffixes_to_url([replica.url], self.prefixes),
+            call.suffixes)
+        self.endpoints.acquire(replica)
+        start = time.monotonic()
+        try:
+            response = send_request(
+                paths=paths, method=call.method,
+                kwargs_requests=call.kwargs_requests, deadline=call.deadline,
+                hooks=self.hooks, endpoint=call.endpoint,
+                event_log=call.event_log, tracer=self.tracer,
+                parent_span=call.span, transport=self.transport,
+                **call.path_params)
+        except requests.exceptions.HTTPError as exc:
+            if _may_fail_over(exc, read=True):
+                self.endpoints.record_failure(replica)
+            else:
+                self.endpoints.record_success(
+                    replica, time.monotonic() - start)
+            raise
+        except TimeoutError:
+            # the caller's deadline ran out, which says nothing about the
+            # health of the replica
+            self.endpoints.release(replica)
+            raise
+        self.endpoints.record_success(replica, time.monotonic() - start)
+        return response
+
+    def _poller(self) -> TaskPoller:
+        """Poller of tasks submitted or waited for through the client."""
+        return self.poller if self.poller is not None else default_poller()
+
+    def _executor(self, name: str = "requests") -> ThreadPoolExecutor:
+        """Thread pool for requests sent in the background.
+
+        Args:
+            name: Name of the pool; each name has a pool of its own.
+        """
+        pool = self._pools.get(name)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(name)
+                if pool is None:
+                    pool = self._pools[name] = ThreadPoolExecutor(
+                        thread_name_prefix=f"tes-client-{name}")
+        return pool
 
     def _request_params(
         self, data: Optional[str] = None, params: Optional[Dict] = None
@@ -264,6 +1008,8 @@ class HTTPClient(object):
         """
         kwargs: Dict[str, Any] = {}
         kwargs['timeout'] = self.timeout
+        if self.connect_timeout is not None:
+            kwargs['timeout'] = (self.connect_timeout, self.timeout)
         kwargs['headers'] = {}
         kwargs['headers']['Content-type'] = 'application/json'
         if self.user is not None and self.password is not None:
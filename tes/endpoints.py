@@ -0,0 +1,150 @@
+"""Endpoint pool with latency-aware load balancing and failover."""
+
+import random
+import threading
+import time
+
+from attr import attrs, attrib
+from attr.validators import instance_of
+from typing import List, Optional
+
+
+@attrs
+class Endpoint(object):
+    """Health and latency state of a single TES base URL.
+
+    Attributes:
+        url: Base URL of the TES instance.
+        latency: Exponentially weighted moving average (EWMA) of observed
+            request latencies in seconds; `None` until the first success.
+        failures: Number of consecutive failed requests.
+        ejected_until: Point in time, as given by :func:`time.monotonic`,
+            until which the endpoint is ejected from the pool.
+        in_flight: Number of requests currently in flight.
+    """
+
+    url: str = attrib(validator=instance_of(str))
+    latency: Optional[float] = attrib(default=None)
+    failures: int = attrib(default=0)
+    ejected_until: float = attrib(default=0.0)
+    in_flight: int = attrib(default=0)
+
+    def is_healthy(self, now: Optional[float] = None) -> bool:
+        """Whether the endpoint is currently in the pool.
+
+        Args:
+            now: Current time, as given by :func:`time.monotonic`.
+
+        Returns:
+            `True` unless the endpoint is ejected.
+        """
+        if now is None:
+            now = time.monotonic()
+        return self.ejected_until <= now
+
+    def score(self) -> float:
+        """Load balancing score; lower is better.
+
+        Endpoints without latency observations score 0, so that they are
+        tried early.
+
+        Returns:
+            EWMA latency weighted by the number of requests in flight.
+        """
+        return (self.latency or 0.0) * (self.in_flight + 1)
+
+
+@attrs
+class EndpointPool(object):
+    """Pool of replica TES endpoints with passive health checks.
+
+    Reads are spread across healthy endpoints by picking the better of two
+    random endpoints by score ("power of two choices"), with the remaining
+    endpoints as failover candidates. Writes go to the healthy endpoints in
+    configured order. Endpoints failing `failure_threshold` requests in a row
+    are ejected for `cooldown` seconds (circuit breaker); after that, they
+    are tried again and ejected straight away if they fail once more.
+
+    Attributes:
+        urls: Base URLs of the TES replicas, primary first.
+        alpha: Smoothing factor of the latency EWMA.
+        failure_threshold: Consecutive failures before ejection.
+        cooldown: Ejection period in seconds.
+    """
+
+    urls: List[str] = attrib(validator=instance_of(list))
+    alpha: float = attrib(default=0.3, validator=instance_of(float))
+    failure_threshold: int = attrib(default=3, validator=instance_of(int))
+    cooldown: float = attrib(
+        default=30.0, validator=instance_of((int, float)))
+
+    def __attrs_post_init__(self):
+        self.endpoints: List[Endpoint] = [Endpoint(url) for url in self.urls]
+        self._lock = threading.Lock()
+
+    def candidates(self, read: bool = True) -> List[Endpoint]:
+        """Order endpoints for a request.
+
+        Args:
+            read: Whether the request is a read; reads are load balanced,
+                writes go to endpoints in configured order.
+
+        Returns:
+            All endpoints in the order in which they should be tried; ejected
+            endpoints come last, as a last resort.
+        """
+        now = time.monotonic()
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.is_healthy(now)]
+            ejected = sorted(
+                (e for e in self.endpoints if not e.is_healthy(now)),
+                key=lambda e: e.ejected_until)
+            if read and len(healthy) > 1:
+                first = min(random.sample(healthy, 2), key=Endpoint.score)
+                rest = sorted(
+                    (e for e in healthy if e is not first),
+                    key=Endpoint.score)
+                healthy = [first] + rest
+        return healthy + ejected
+
+    def acquire(self, endpoint: Endpoint) -> None:
+        """Mark a request to `endpoint` as in flight."""
+        with self._lock:
+            endpoint.in_flight += 1
+
+    def release(self, endpoint: Endpoint) -> None:
+        """Mark a request to `endpoint` as done, without any outcome.
+
+        Args:
+            endpoint: Endpoint the request was sent to.
+        """
+        with self._lock:
+            endpoint.in_flight = max(endpoint.in_flight - 1, 0)
+
+    def record_success(self, endpoint: Endpoint, latency: float) -> None:
+        """Record a successful request and update the latency EWMA.
+
+        Args:
+            endpoint: Endpoint that served the request.
+            latency: Request latency in seconds.
+        """
+        with self._lock:
+            endpoint.in_flight = max(endpoint.in_flight - 1, 0)
+            endpoint.failures = 0
+            endpoint.ejected_until = 0.0
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.alpha * (latency - endpoint.latency)
+
+    def record_failure(self, endpoint: Endpoint) -> None:
+        """Record a failed request, ejecting the endpoint if needed.
+
+        Args:
+            endpoint: Endpoint that failed to serve the request.
+        """
+        with self._lock:
+            endpoint.in_flight = max(endpoint.in_flight - 1, 0)
+            endpoint.failures += 1
+            if endpoint.failures >= self.failure_threshold:
+                endpoint.ejected_until = time.monotonic() + self.cooldown
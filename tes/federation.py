@@ -0,0 +1,387 @@
+"""Routing of tasks across several independent TES instances."""
+
+import re
+import requests
+import threading
+import time
+
+from attr import attrs, attrib
+from attr.validators import instance_of, optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from tes.client import HTTPClient
+from tes.futures import ACTIVE_STATES
+from tes.models import ListTasksResponse, ServiceInfo, Task
+from tes.utils import never_connected
+
+
+SEPARATOR = ":"
+
+
+def _check_name(inst, attribute, value) -> None:
+    """`attrs` validator for backend names."""
+    if not re.match(r"^[A-Za-z0-9_.-]+$", value):
+        raise ValueError(
+            f"Invalid backend name '{value}' - must only contain letters, "
+            "digits, '_', '.' and '-'"
+        )
+
+
+@attrs
+class Backend(object):
+    """Independent TES instance taking part in a federation.
+
+    Attributes:
+        name: Unique name of the backend; used as prefix of task IDs.
+        client: Client for the TES instance.
+        weight: Relative capacity of the backend; load is divided by weight
+            when comparing backends.
+        max_cpu_cores: Largest number of CPU cores a task may request.
+        max_ram_gb: Largest amount of RAM a task may request.
+        max_disk_gb: Largest amount of disk space a task may request.
+        zones: Zones the backend runs tasks in; tasks requesting zones are
+            only routed to backends sharing at least one of them.
+        preemptible: Whether the backend runs tasks on preemptible nodes;
+            tasks requesting otherwise are not routed to it.
+    """
+
+    name: str = attrib(validator=[instance_of(str), _check_name])
+    client: HTTPClient = attrib(validator=instance_of(HTTPClient))
+    weight: Union[int, float] = attrib(
+        default=1, validator=instance_of((int, float)))
+    max_cpu_cores: Optional[int] = attrib(
+        default=None, validator=optional(instance_of(int)))
+    max_ram_gb: Optional[Union[int, float]] = attrib(
+        default=None, validator=optional(instance_of((int, float))))
+    max_disk_gb: Optional[Union[int, float]] = attrib(
+        default=None, validator=optional(instance_of((int, float))))
+    zones: Optional[List[str]] = attrib(
+        default=None, validator=optional(instance_of(list)))
+    preemptible: Optional[bool] = attrib(
+        default=None, validator=optional(instance_of(bool)))
+
+    def accepts(self, task: Task, service_info: ServiceInfo) -> bool:
+        """Whether the backend can run a task at all.
+
+        Args:
+            task: Task to be run.
+            service_info: Service info of the backend.
+
+        Returns:
+            `False` if the task requests more resources than the backend
+            offers, zones or preemptibility the backend does not offer, or
+            strict backend parameters the backend does not support.
+        """
+        res = task.resources
+        if res is None:
+            return True
+        limits = (
+            (res.cpu_cores, self.max_cpu_cores),
+            (res.ram_gb, self.max_ram_gb),
+            (res.disk_gb, self.max_disk_gb),
+        )
+        for requested, limit in limits:
+            if requested is not None and limit is not None and \
+                    requested > limit:
+                return False
+        if res.zones and self.zones is not None and \
+                not set(res.zones) & set(self.zones):
+            return False
+        if res.preemptible is not None and self.preemptible is not None and \
+                res.preemptible != self.preemptible:
+            return False
+        if res.backend_parameters and res.backend_parameters_strict:
+            supported = service_info.tes_resources_backend_parameters or []
+            if not set(res.backend_parameters) <= set(supported):
+                return False
+        return True
+
+    def mismatches(self, task: Task, service_info: ServiceInfo) -> int:
+        """Count soft mismatches between a task and the backend.
+
+        Inputs and outputs whose URLs lie outside the storage locations
+        advertised by the backend, as well as non-strict backend parameters
+        the backend does not support, count as one mismatch each. As
+        `ServiceInfo.storage` need not be exhaustive, backends are never
+        excluded on these grounds, only ranked lower.
+
+        Args:
+            task: Task to be run.
+            service_info: Service info of the backend.
+
+        Returns:
+            Number of mismatches.
+        """
+        count = 0
+        storage = service_info.storage or []
+        if storage:
+            for item in (task.inputs or []) + (task.outputs or []):
+                if item.url is not None and \
+                        not any(item.url.startswith(s) for s in storage):
+                    count += 1
+        res = task.resources
+        if res is not None and res.backend_parameters:
+            supported = service_info.tes_resources_backend_parameters or []
+            count += len(set(res.backend_parameters) - set(supported))
+        return count
+
+
+@attrs
+class FederatedClient(object):
+    """Client routing tasks across several independent TES instances.
+
+    Each task is sent to the eligible backend (see `Backend.accepts()`) with
+    the fewest soft mismatches (see `Backend.mismatches()`) and, among those,
+    with the lowest load per unit of weight. Load is the number of queued,
+    initializing and running tasks, sampled through `list_tasks()` at most
+    every `sample_interval` seconds and counted up locally for each task
+    routed in between.
+
+    Backends that fail to answer while sampled, or that cannot be connected
+    to when creating a task, are skipped until their next sample; a task
+    that could not be sent to a backend at all is created on the next
+    backend in line instead.
+
+    Task IDs returned by `create_task()` have the form `<backend>:<id>`, and
+    are routed back to their backend by all other access methods.
+
+    Attributes:
+        backends: Backends taking part in the federation.
+        sample_interval: Seconds after which load samples are refreshed.
+        sample_limit: Largest number of tasks inspected per load sample.
+    """
+
+    backends: List[Backend] = attrib(validator=instance_of(list))
+    sample_interval: Union[int, float] = attrib(
+        default=30, validator=instance_of((int, float)))
+    sample_limit: int = attrib(default=2048, validator=instance_of(int))
+
+    def __attrs_post_init__(self):
+        names = [b.name for b in self.backends]
+        if not names:
+            raise ValueError("At least one backend is required")
+        if len(set(names)) != len(names):
+            raise ValueError("Backend names must be unique")
+        self._backends: Dict[str, Backend] = {
+            b.name: b for b in self.backends
+        }
+        self._service_info: Dict[str, ServiceInfo] = {}
+        self._load: Dict[str, Tuple[float, int]] = {}
+        self._down: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def create_task(self, task: Task) -> str:
+        """Route a task to a backend and create it there.
+
+        Args:
+            task: `tes.models.Task` instance.
+
+        Returns:
+            Federated task ID.
+
+        Raises:
+            ValueError: If no available backend can run the task.
+            requests.exceptions.RequestException: If the task could not be
+                created on the chosen backend, or no backend could be
+                connected to.
+        """
+        ranked = self._rank(task)
+        for backend in ranked:
+            try:
+                task_id = backend.client.create_task(task)
+                break
+            except requests.exceptions.RequestException as exc:
+                if not never_connected(exc) or backend is ranked[-1]:
+                    raise
+                with self._lock:
+                    self._down.add(backend.name)
+        with self._lock:
+            sampled_at, load = self._load[backend.name]
+            self._load[backend.name] = (sampled_at, load + 1)
+        return self.join_id(backend.name, task_id)
+
+    def get_task(self, task_id: str, view: str = "BASIC") -> Task:
+        """Access method for `GET /tasks/{id}` on the task's backend.
+
+        Args:
+            task_id: Federated task ID.
+            view: Task info verbosity. One of `MINIMAL`, `BASIC` and `FULL`.
+
+        Returns:
+            `tes.models.Task` instance with federated task ID.
+        """
+        backend, backend_id = self.split_id(task_id)
+        task = backend.client.get_task(backend_id, view)
+        task.id = task_id
+        return task
+
+    def cancel_task(self, task_id: str) -> None:
+        """Access method for `POST /tasks/{id}:cancel` on the task's backend.
+
+        Args:
+            task_id: Federated task ID.
+        """
+        backend, backend_id = self.split_id(task_id)
+        backend.client.cancel_task(backend_id)
+
+    def list_tasks(
+        self, backend: str, view: str = "MINIMAL",
+        page_size: Optional[int] = None, page_token: Optional[str] = None
+    ) -> ListTasksResponse:
+        """Access method for `GET /tasks` on one backend.
+
+        Args:
+            backend: Name of the backend.
+            view: Task info verbosity. One of `MINIMAL`, `BASIC` and `FULL`.
+            page_size: Number of tasks to return.
+            page_token: Token to retrieve the next page of tasks.
+
+        Returns:
+            `tes.models.ListTasksResponse` instance with federated task IDs.
+        """
+        response = self._get_backend(backend).client.list_tasks(
+            view=view, page_size=page_size, page_token=page_token)
+        for task in response.tasks or []:
+            task.id = self.join_id(backend, task.id)
+        return response
+
+    def wait(self, task_id: str, timeout=None) -> Task:
+        """Poll a task on its backend until it reaches a final state.
+
+        Args:
+            task_id: Federated task ID.
+            timeout: Time budget in seconds, see `HTTPClient.wait()`.
+
+        Returns:
+            `tes.models.Task` instance with federated task ID.
+        """
+        backend, backend_id = self.split_id(task_id)
+        task = backend.client.wait(backend_id, timeout=timeout)
+        task.id = task_id
+        return task
+
+    def route(self, task: Task) -> Backend:
+        """Choose the backend to run a task on.
+
+        Args:
+            task: Task to be run.
+
+        Returns:
+            Chosen backend.
+
+        Raises:
+            ValueError: If no available backend can run the task.
+        """
+        return self._rank(task)[0]
+
+    def join_id(self, backend: str, task_id: str) -> str:
+        """Compose a federated task ID.
+
+        Args:
+            backend: Name of the backend.
+            task_id: Task ID on the backend.
+
+        Returns:
+            Federated task ID.
+        """
+        return f"{backend}{SEPARATOR}{task_id}"
+
+    def split_id(self, task_id: str) -> Tuple[Backend, str]:
+        """Decompose a federated task ID.
+
+        Args:
+            task_id: Federated task ID.
+
+        Returns:
+            Tuple of backend and task ID on the backend.
+
+        Raises:
+            ValueError: If `task_id` does not refer to a known backend.
+        """
+        name, sep, backend_id = task_id.partition(SEPARATOR)
+        if not sep:
+            raise ValueError(f"Not a federated task ID: {task_id}")
+        return self._get_backend(name), backend_id
+
+    def _rank(self, task: Task) -> List[Backend]:
+        """Order the available backends that can run a task, best first.
+
+        Raises:
+            ValueError: If no available backend can run the task.
+        """
+        self._refresh()
+        with self._lock:
+            ranked = [
+                (
+                    b.mismatches(task, self._service_info[b.name]),
+                    self._load[b.name][1] / b.weight,
+                    index,
+                    b,
+                )
+                for index, b in enumerate(self.backends)
+                if b.name not in self._down and
+                b.accepts(task, self._service_info[b.name])
+            ]
+        if not ranked:
+            raise ValueError("No available backend can run the task")
+        return [item[-1] for item in sorted(ranked)]
+
+    def _get_backend(self, name: str) -> Backend:
+        try:
+            return self._backends[name]
+        except KeyError:
+            raise ValueError(f"Unknown backend: {name}")
+
+    def _refresh(self) -> None:
+        """Sample service info and load of backends with stale samples."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [
+                b for b in self.backends
+                if b.name not in self._load or
+                now - self._load[b.name][0] >= self.sample_interval
+            ]
+        if not stale:
+            return
+        with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+            futures = [executor.submit(self._sample, b) for b in stale]
+        with self._lock:
+            for backend, future in zip(stale, futures):
+                try:
+                    service_info, load = future.result()
+                except Exception:
+                    # skip the backend until its next sample
+                    self._down.add(backend.name)
+                    load = self._load.get(backend.name, (now, 0))[1]
+                else:
+                    self._down.discard(backend.name)
+                    self._service_info[backend.name] = service_info
+                self._load[backend.name] = (now, load)
+
+    def _sample(self, backend: Backend) -> Tuple[ServiceInfo, int]:
+        """Fetch service info and count active tasks of a backend.
+
+        Args:
+            backend: Backend to sample.
+
+        Returns:
+            Tuple of service info and number of active tasks.
+        """
+        service_info = self._service_info.get(backend.name)
+        if service_info is None:
+            service_info = backend.client.get_service_info()
+        load = 0
+        seen = 0
+        page_token: Optional[str] = None
+        while seen < self.sample_limit:
+            response = backend.client.list_tasks(
+                view="MINIMAL", page_size=min(self.sample_limit - seen, 256),
+                page_token=page_token)
+            tasks = response.tasks or []
+            seen += len(tasks)
+            load += sum(1 for t in tasks if t.state in ACTIVE_STATES)
+            page_token = response.next_page_token
+            if not tasks or not page_token:
+                break
+        return service_info, load
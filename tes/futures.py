@@ -0,0 +1,358 @@
+"""Futures of TES tasks, completed by a shared background poller."""
+
+import requests
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from tes.instrumentation import fire
+from tes.models import Task
+from tes.utils import TimeoutError
+
+
+ACTIVE_STATES = ["QUEUED", "INITIALIZING", "RUNNING", "PAUSED", "CANCELING"]
+FINAL_STATES = ["COMPLETE", "EXECUTOR_ERROR", "SYSTEM_ERROR", "CANCELED",
+                "PREEMPTED"]
+
+
+class TaskFuture(Future):
+    """Future of a TES task, resolved once the task reaches a final state.
+
+    The result is the task in `MINIMAL` view, whichever final state it
+    reached; check `Task.state` for success. If the task cannot be polled,
+    e.g. because it does not exist, the future raises the error of the last
+    poll instead.
+
+    Task futures are regular :class:`concurrent.futures.Future` objects:
+    they work with :func:`concurrent.futures.wait`,
+    :func:`concurrent.futures.as_completed` and :func:`asyncio.wrap_future`,
+    and call callbacks added with `add_done_callback()` once done. They are
+    created by `HTTPClient.submit()` or `TaskPoller.watch()`.
+
+    Args:
+        task_id: TES Task ID.
+        client: Client the task was created with.
+
+    Attributes:
+        task_id: TES Task ID.
+        client: Client the task was created with.
+        state: Last state the task was seen in; `None` until first polled.
+    """
+
+    def __init__(self, task_id: str, client: Any = None):
+        super().__init__()
+        self.task_id = task_id
+        self.client = client
+        self.state: Optional[str] = None
+
+    def running(self) -> bool:
+        """Whether the task was last seen running."""
+        return self.state == "RUNNING" and not self.done()
+
+    def cancel(self) -> bool:
+        """Cancel the task on the TES server and the future.
+
+        Returns:
+            `False` if the future is done already or the task could not be
+            cancelled on the server, e.g. because it is unreachable, else
+            `True`. Futures of tasks that could not be cancelled keep
+            waiting for the task.
+        """
+        if self.done():
+            return False
+        if self.client is not None:
+            try:
+                self.client.cancel_task(self.task_id)
+            except (requests.exceptions.RequestException, TimeoutError):
+                return False
+        if not super().cancel():  # pragma: no cover
+            return False  # completed concurrently
+        # no executor picks up the future; wake up waiters right away
+        self.set_running_or_notify_cancel()
+        return True
+
+
+class _Watch(object):
+    """Polling state of a task watched by a `TaskPoller`."""
+
+    def __init__(self, client: Any, task_id: str):
+        self.client = client
+        self.task_id = task_id
+        self.futures: List[TaskFuture] = []
+        self.due: float = 0.0
+        self.errors: int = 0
+
+
+class TaskPoller(object):
+    """Background poller completing `TaskFuture` objects.
+
+    A single daemon thread polls all watched tasks, each once per
+    `interval`, however many futures wait on them, and resolves their
+    futures once they reach a final state. The polling load thus depends on
+    the number of distinct tasks and the interval only, not on the number
+    of waiters. Watches are dropped once their tasks are done; the thread
+    exits when nothing is left to watch, and is restarted on demand.
+
+    Tasks due for a poll are refreshed in batches per client: if there are
+    at least `scan_threshold` of them, with a scan of up to
+    `max_scan_pages` pages of `list_tasks()` in `MINIMAL` view; tasks not
+    found in the scan, or all tasks of smaller batches, with concurrent
+    `get_task()` calls in `MINIMAL` view, up to `max_workers` at a time.
+
+    By default, all clients share one process-wide poller, see
+    `default_poller()`.
+
+    Polls that fail with a 4xx status code, e.g. because a task does not
+    exist, fail the task's futures right away; other errors only after
+    `max_errors` consecutive failures.
+
+    Each poll result is reported to the `task_state` hook of the client.
+
+    State changes pushed by the server, e.g. through
+    `tes.callbacks.CallbackListener`, are applied with `notify()`; polling
+    then serves as a fallback for missed notifications and can use a long
+    `interval`.
+
+    Args:
+        interval: Seconds between polls of a task.
+        max_workers: Largest number of concurrent polls.
+        max_errors: Consecutive failed polls after which a task's futures
+            fail.
+        scan_threshold: Smallest number of tasks of a client due for a poll
+            to refresh them with a list scan; list scans are not used if
+            `None`.
+        scan_page_size: Page size of list scans.
+        max_scan_pages: Largest number of pages per list scan.
+    """
+
+    def __init__(
+        self, interval: float = 0.5, max_workers: int = 8,
+        max_errors: int = 3, scan_threshold: Optional[int] = 32,
+        scan_page_size: int = 256, max_scan_pages: int = 4
+    ):
+        self.interval = interval
+        self.max_workers = max_workers
+        self.max_errors = max_errors
+        self.scan_threshold = scan_threshold
+        self.scan_page_size = scan_page_size
+        self.max_scan_pages = max_scan_pages
+        self._watches: Dict[Tuple[int, str], _Watch] = {}
+        self._by_task: Dict[str, List[_Watch]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def watch(
+        self, client: Any, task_id: str, future: Optional[TaskFuture] = None
+    ) -> TaskFuture:
+        """Watch a task until it reaches a final state.
+
+        The task is polled right away, then every `interval` seconds.
+
+        Args:
+            client: `HTTPClient` to poll the task with.
+            task_id: TES Task ID.
+            future: Future to resolve; a new one if `None`.
+
+        Returns:
+            Future resolved with the task in its final state.
+        """
+        if future is None:
+            future = TaskFuture(task_id, client)
+        key = (id(client), task_id)
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None:
+                watch = self._watches[key] = _Watch(client, task_id)
+                self._by_task.setdefault(task_id, []).append(watch)
+            watch.futures.append(future)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="tes-poller", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return future
+
+    def notify(self, task_id: str, state: str) -> bool:
+        """Apply a state change of a task reported by the server.
+
+        Futures of the task are resolved right away if `state` is final;
+        otherwise its next poll is postponed by `interval`.
+
+        Args:
+            task_id: TES Task ID.
+            state: New state of the task.
+
+        Returns:
+            Whether the task is being watched.
+        """
+        with self._lock:
+            watches = list(self._by_task.get(task_id, ()))
+        task = Task(id=task_id, state=state)
+        for watch in watches:
+            self._update(watch, task)
+        if watches and state in FINAL_STATES:
+            self._wakeup.set()
+        return bool(watches)
+
+    def watched(self) -> int:
+        """Number of distinct tasks being watched."""
+        with self._lock:
+            return len(self._watches)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            with self._lock:
+                for key in [
+                    k for k, w in self._watches.items()
+                    if all(f.done() for f in w.futures)
+                ]:
+                    watch = self._watches.pop(key)
+                    siblings = self._by_task[watch.task_id]
+                    siblings.remove(watch)
+                    if not siblings:
+                        del self._by_task[watch.task_id]
+                if not self._watches:
+                    self._thread = None
+                    return
+                due = [w for w in self._watches.values() if w.due <= now]
+                next_due = min(w.due for w in self._watches.values())
+            if due:
+                self._poll(due)
+                continue
+            self._wakeup.wait(max(next_due - now, 0))
+
+    def _poll(self, watches: List[_Watch]) -> None:
+        """Refresh tasks and update their futures."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="tes-poller")
+        if self.scan_threshold is not None:
+            by_client: Dict[int, List[_Watch]] = {}
+            for watch in watches:
+                by_client.setdefault(id(watch.client), []).append(watch)
+            watches = []
+            for batch in by_client.values():
+                if len(batch) >= self.scan_threshold:
+                    batch = self._scan(batch)
+                watches.extend(batch)
+        futures = [
+            (watch, self._pool.submit(
+                watch.client.get_task, watch.task_id, "MINIMAL"))
+            for watch in watches
+        ]
+        for watch, future in futures:
+            try:
+                self._update(watch, future.result())
+            except Exception as exc:
+                self._fail(watch, exc)
+
+    def _scan(self, watches: List[_Watch]) -> List[_Watch]:
+        """Refresh tasks of one client from a list scan.
+
+        Returns:
+            Watches of the tasks not found.
+        """
+        client = watches[0].client
+        pending = {watch.task_id: watch for watch in watches}
+        page_token = None
+        try:
+            for _ in range(self.max_scan_pages):
+                page = client.list_tasks(
+                    view="MINIMAL", page_size=self.scan_page_size,
+                    page_token=page_token)
+                for task in page.tasks or []:
+                    watch = pending.pop(task.id, None)
+                    if watch is not None:
+                        self._update(watch, task)
+                page_token = page.next_page_token
+                if not pending or not page_token:
+                    break
+        except Exception:
+            pass
+        return list(pending.values())
+
+    def _update(self, watch: _Watch, task: Task) -> None:
+        """Record a poll result and resolve futures if the task is done."""
+        watch.errors = 0
+        watch.due = time.monotonic() + self.interval
+        fire(watch.client.hooks, 'task_state', watch.task_id, task.state)
+        for future in list(watch.futures):
+            future.state = task.state
+            if task.state in FINAL_STATES and not future.done():
+                try:
+                    future.set_result(task)
+                except Exception:  # pragma: no cover
+                    pass  # cancelled concurrently
+
+    def _fail(self, watch: _Watch, exc: Exception) -> None:
+        """Record a failed poll and fail futures if it is not transient."""
+        watch.errors += 1
+        watch.due = time.monotonic() + self.interval
+        response = getattr(exc, "response", None)
+        permanent = (
+            isinstance(exc, requests.exceptions.HTTPError) and
+            response is not None and 400 <= response.status_code < 500
+        )
+        if not permanent and watch.errors < self.max_errors:
+            return
+        for future in list(watch.futures):
+            if not future.done():
+                try:
+                    future.set_exception(exc)
+                except Exception:  # pragma: no cover
+                    pass  # cancelled concurrently
+
+
+def watch_created(client: Any, future: TaskFuture, created: Future) -> None:
+    """Resolve a task future once its task has been created.
+
+    Callback for futures of task IDs, e.g. from
+    `tes.submission.SubmissionQueue.enqueue()`: sets the ID and client of
+    `future` and watches the task with the client's poller. If creating the
+    task failed, `future` fails with the same error; if `future` has been
+    cancelled meanwhile, the task is cancelled.
+
+    Args:
+        client: `HTTPClient` the task was created with.
+        future: Future to resolve, created without a task ID.
+        created: Done future of the task ID.
+    """
+    try:
+        task_id = created.result()
+    except BaseException as exc:
+        try:
+            future.set_exception(exc)
+        except Exception:  # pragma: no cover
+            pass  # cancelled meanwhile
+        return
+    future.task_id = task_id
+    future.client = client
+    if future.cancelled():
+        client.cancel_task(task_id)
+        return
+    client._poller().watch(client, task_id, future)
+
+
+_default_poller: Optional[TaskPoller] = None
+_default_lock = threading.Lock()
+
+
+def default_poller() -> TaskPoller:
+    """Process-wide poller shared by all clients by default.
+
+    Returns:
+        The poller, created on first use.
+    """
+    global _default_poller
+    if _default_poller is None:
+        with _default_lock:
+            if _default_poller is None:
+                _default_poller = TaskPoller()
+    return _default_poller
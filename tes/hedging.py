@@ -0,0 +1,130 @@
+"""Request hedging policy for idempotent calls."""
+
+import math
+import threading
+
+from attr import attrs, attrib
+from attr.validators import instance_of
+from collections import deque
+from typing import Deque, Dict, Union
+
+
+@attrs
+class HedgePolicy(object):
+    """Policy for hedging idempotent requests.
+
+    If a read has not returned after the `percentile`-th percentile of the
+    latencies recently observed for the same endpoint, a second request is
+    sent and the first successful response wins. Hedges are capped to a
+    `budget` fraction of all requests, so that slow servers are not
+    overloaded further.
+
+    Attributes:
+        percentile: Percentile of observed latencies after which to hedge.
+        budget: Largest fraction of requests that may be hedged.
+        default_delay: Hedge delay in seconds used until `min_samples`
+            latencies have been observed for an endpoint.
+        min_delay: Smallest hedge delay in seconds.
+        window: Number of recent latencies kept per endpoint.
+        min_samples: Number of latencies needed to derive the hedge delay.
+    """
+
+    percentile: Union[int, float] = attrib(
+        default=95, validator=instance_of((int, float)))
+    budget: float = attrib(default=0.05, validator=instance_of(float))
+    default_delay: Union[int, float] = attrib(
+        default=1.0, validator=instance_of((int, float)))
+    min_delay: Union[int, float] = attrib(
+        default=0.005, validator=instance_of((int, float)))
+    window: int = attrib(default=256, validator=instance_of(int))
+    min_samples: int = attrib(default=20, validator=instance_of(int))
+
+    @percentile.validator  # type: ignore
+    def __check_percentile(self, attribute, value):
+        if not 0 < value <= 100:
+            raise ValueError("percentile must be in (0, 100]")
+
+    def __attrs_post_init__(self):
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._delays: Dict[str, float] = {}
+        self._fresh: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.requests: int = 0
+        self.hedged: int = 0
+        self.wins: int = 0
+
+    def delay(self, key: str) -> float:
+        """Hedge delay for an endpoint.
+
+        Args:
+            key: Endpoint identifier.
+
+        Returns:
+            Seconds to wait for a response before sending a hedge.
+        """
+        with self._lock:
+            samples = self._latencies.get(key, ())
+            if len(samples) < self.min_samples:
+                return self.default_delay
+            # recompute the percentile lazily, every few samples
+            delay = self._delays.get(key)
+            if delay is None or self._fresh[key] >= 16:
+                ordered = sorted(samples)
+                rank = math.ceil(self.percentile / 100 * len(ordered)) - 1
+                delay = max(ordered[rank], self.min_delay)
+                self._delays[key] = delay
+                self._fresh[key] = 0
+            return delay
+
+    def record(self, key: str, latency: float) -> None:
+        """Record the latency of a response.
+
+        Args:
+            key: Endpoint identifier.
+            latency: Latency in seconds.
+        """
+        with self._lock:
+            samples = self._latencies.setdefault(
+                key, deque(maxlen=self.window))
+            samples.append(latency)
+            self._fresh[key] = self._fresh.get(key, 0) + 1
+
+    def admit(self) -> None:
+        """Count a request subject to hedging."""
+        with self._lock:
+            self.requests += 1
+
+    def try_hedge(self) -> bool:
+        """Take a hedge from the budget.
+
+        Returns:
+            `True` if a hedge may be sent.
+        """
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.requests:
+                return False
+            self.hedged += 1
+            return True
+
+    def record_win(self) -> None:
+        """Count a hedge that returned before the original request."""
+        with self._lock:
+            self.wins += 1
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Hedging metrics.
+
+        Returns:
+            Dictionary with the number of requests, hedges and hedge wins, as
+            well as the hedge rate (hedges per request) and the win rate
+            (wins per hedge).
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "wins": self.wins,
+                "hedge_rate": self.hedged / self.requests
+                if self.requests else 0.0,
+                "win_rate": self.wins / self.hedged if self.hedged else 0.0,
+            }
@@ -0,0 +1,267 @@
+"""Request lifecycle hooks and in-memory latency aggregation."""
+
+import bisect
+import threading
+
+from attr import attrs, attrib
+from typing import Any, Dict, List, Optional, Sequence
+
+
+# upper bounds of latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0,
+    7.5, 10.0,
+)
+
+
+@attrs
+class RequestEvent(object):
+    """Details of a single HTTP request attempt.
+
+    Attributes:
+        endpoint: Name of the client access method, e.g. `get_task`.
+        method: HTTP method.
+        path: Fully resolved URL, excluding query parameters.
+        attempt: Number of the attempt within the call, starting at 1; each
+            fallback path and replica tried counts as one attempt.
+        status_code: HTTP status code, if a response was received.
+        connect_time: Seconds taken to establish a new connection, `0.0` if
+            an open connection was reused; only set by transports timing
+            connection setup, e.g. `tes.transport.Urllib3Transport` and
+            `tes.transport.HttpxTransport`.
+        ttfb: Seconds until the response headers were received.
+        total: Seconds until the response body was received.
+        request_bytes: Size of the request body.
+        response_bytes: Size of the response body.
+        decode_time: Seconds taken to decode the response body into a model;
+            only set for the response returned to the caller.
+        error: Exception raised for the attempt, if any.
+        response: Response received, if any.
+    """
+
+    endpoint: str = attrib()
+    method: str = attrib()
+    path: str = attrib()
+    attempt: int = attrib()
+    status_code: Optional[int] = attrib(default=None)
+    connect_time: Optional[float] = attrib(default=None)
+    ttfb: Optional[float] = attrib(default=None)
+    total: Optional[float] = attrib(default=None)
+    request_bytes: int = attrib(default=0)
+    response_bytes: Optional[int] = attrib(default=None)
+    decode_time: Optional[float] = attrib(default=None)
+    error: Optional[Exception] = attrib(default=None)
+    response: Optional[Any] = attrib(default=None, repr=False, eq=False)
+
+
+class Hooks(object):
+    """Base class for request lifecycle hooks.
+
+    Subclasses override any of the methods below; all of them are called
+    synchronously from the thread sending the request, and should therefore
+    return quickly. Pass instances via `HTTPClient(hooks=[...])`.
+    """
+
+    def pre_request(self, event: RequestEvent) -> None:
+        """Called before each attempt is sent.
+
+        Args:
+            event: Attempt details; only endpoint, method, path, attempt and
+                request size are set.
+        """
+
+    def post_response(self, event: RequestEvent) -> None:
+        """Called for each response received, including fallback 404s.
+
+        For the response returned to the caller, this is called after the
+        response has been decoded.
+
+        Args:
+            event: Attempt details.
+        """
+
+    def on_error(self, event: RequestEvent) -> None:
+        """Called for each attempt that failed without a response, and for
+        responses that could not be decoded.
+
+        Args:
+            event: Attempt details, with `error` set.
+        """
+
+    def task_state(self, task_id: str, state: Optional[str]) -> None:
+        """Called for each task state observed while waiting for a task.
+
+        Args:
+            task_id: TES Task ID.
+            state: Task state reported by the server.
+        """
+
+    def record_cache(self, hit: bool, cache: str = "call") -> None:
+        """Called for each cache lookup, e.g. by `tes.cache.CallCache`.
+
+        Args:
+            hit: Whether the lookup was a hit.
+            cache: Name of the cache.
+        """
+
+
+def fire(hooks: Optional[Sequence[Hooks]], name: str, *args: Any) -> None:
+    """Call a hook on all hook objects.
+
+    Args:
+        hooks: Hook objects; nothing is called if empty or `None`.
+        name: Name of the hook, e.g. `pre_request`.
+        *args: Arguments to pass to the hook.
+    """
+    if hooks:
+        for hook in hooks:
+            getattr(hook, name)(*args)
+
+
+class Histogram(object):
+    """Histogram with fixed bucket bounds; not thread-safe.
+
+    Attributes:
+        bounds: Upper bucket bounds, in ascending order.
+        counts: Number of observations per bucket; the last bucket counts
+            observations above the largest bound.
+        count: Total number of observations.
+        sum: Sum of all observations.
+    """
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds: List[float] = list(bounds)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add an observation."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation within buckets.
+
+        Args:
+            q: Quantile, between 0 and 1.
+
+        Returns:
+            Estimated value, or `None` if there are no observations.
+            Observations above the largest bound are reported as that bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]  # pragma: no cover
+
+
+class LatencyAggregator(Hooks):
+    """In-memory aggregation of request events per endpoint.
+
+    Tracks, per client access method, the number of attempts and errors,
+    latency and decode time histograms, bytes moved, the number of calls
+    that needed fallbacks, and which paths served successful responses.
+
+    Args:
+        buckets: Upper bounds of histogram buckets, in seconds.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, endpoint: str) -> Dict[str, Any]:
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats[endpoint] = {
+                "attempts": 0,
+                "errors": 0,
+                "fallbacks": 0,
+                "status_codes": {},
+                "paths": {},
+                "request_bytes": 0,
+                "response_bytes": 0,
+                "latency": Histogram(self.buckets),
+                "decode_time": Histogram(self.buckets),
+            }
+        return stats
+
+    def pre_request(self, event: RequestEvent) -> None:
+        with self._lock:
+            stats = self._get(event.endpoint)
+            stats["attempts"] += 1
+            stats["request_bytes"] += event.request_bytes
+
+    def post_response(self, event: RequestEvent) -> None:
+        with self._lock:
+            stats = self._get(event.endpoint)
+            codes = stats["status_codes"]
+            codes[event.status_code] = codes.get(event.status_code, 0) + 1
+            stats["response_bytes"] += event.response_bytes or 0
+            if event.total is not None:
+                stats["latency"].observe(event.total)
+            if event.decode_time is not None:
+                stats["decode_time"].observe(event.decode_time)
+                stats["paths"][event.path] = \
+                    stats["paths"].get(event.path, 0) + 1
+                if event.attempt > 1:
+                    stats["fallbacks"] += 1
+
+    def on_error(self, event: RequestEvent) -> None:
+        with self._lock:
+            self._get(event.endpoint)["errors"] += 1
+
+    def quantile(self, endpoint: str, q: float) -> Optional[float]:
+        """Estimate a latency quantile of an endpoint.
+
+        Args:
+            endpoint: Name of the client access method.
+            q: Quantile, between 0 and 1.
+
+        Returns:
+            Estimated latency in seconds, or `None` without observations.
+        """
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                return None
+            return stats["latency"].quantile(q)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Summarize the aggregated events.
+
+        Returns:
+            Dictionary of summaries keyed by endpoint. Histograms are reduced
+            to count, mean and the 50th, 95th and 99th percentiles.
+        """
+        def summarize(histogram: Histogram) -> Dict[str, Any]:
+            return {
+                "count": histogram.count,
+                "mean": histogram.sum / histogram.count
+                if histogram.count else None,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99),
+            }
+
+        with self._lock:
+            return {
+                endpoint: {
+                    key: summarize(value) if isinstance(value, Histogram)
+                    else dict(value) if isinstance(value, dict) else value
+                    for key, value in stats.items()
+                }
+                for endpoint, stats in self._stats.items()
+            }
@@ -0,0 +1,242 @@
+"""Idempotent task creation backed by a local submission journal."""
+
+import json
+import os
+import requests
+import threading
+import time
+import uuid
+
+from attr import evolve
+from typing import Any, Dict, List, Optional
+
+from tes.cache import tagged_tasks
+from tes.models import Task
+from tes.utils import unmarshal
+
+
+# tag storing the idempotency key of a task
+IDEMPOTENCY_TAG = "tes-idempotency-key"
+
+
+def _definitive(exc: Exception) -> bool:
+    """Whether a failed create request certainly did not create a task.
+
+    404 responses are not, as `HTTPClient` falls back to other base paths
+    if a request to the first one fails without a response.
+    """
+    response = getattr(exc, "response", None)
+    return (
+        isinstance(exc, requests.exceptions.HTTPError) and
+        response is not None and 400 <= response.status_code < 500 and
+        response.status_code not in (404, 408, 429)
+    )
+
+
+class SubmissionJournal(object):
+    """Create tasks at most once per idempotency key.
+
+    Each task is created with an idempotency key, stored in its
+    `IDEMPOTENCY_TAG` tag, and recorded in an append-only JSON Lines
+    journal at `path`: once before it is sent, with the task, and once it
+    is known to be created, with its ID. When the outcome of a create
+    request is unknown, e.g. because it timed out, the server is asked for a
+    task with the key (with a `list_tasks()` call filtered by tag) before
+    the request is retried, so that retries never create duplicates.
+    Creating a task with a key already created returns the recorded ID
+    without any request.
+
+    After a crash, `recover()` resolves the tasks that were submitted but
+    not confirmed, from the journal, against the server.
+
+    Args:
+        client: `HTTPClient` to create and look up tasks with.
+        path: Path of the journal; created if missing.
+        max_attempts: Largest number of create requests per task.
+        retry_delay: Seconds to wait between attempts.
+        fsync: Flush journal records to disk with `os.fsync()`, so that they
+            survive an operating system crash, not only a process crash.
+    """
+
+    def __init__(
+        self, client: Any, path: str, max_attempts: int = 3,
+        retry_delay: float = 1.0, fsync: bool = False
+    ):
+        self.client = client
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        # key -> last record of the key
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn write
+                    self._apply(record)
+
+    def create_task(
+        self, task: Task, key: Optional[str] = None,
+        timeout_total: Optional[float] = None
+    ) -> str:
+        """Create a task unless it was created with the same key before.
+
+        Args:
+            task: `tes.models.Task` instance.
+            key: Idempotency key; a random one if `None`. Pass a key derived
+                from the caller's own state, e.g. a pipeline step, to avoid
+                duplicates when the caller itself is rerun.
+            timeout_total: Time budget in seconds for each create request,
+                see `HTTPClient.create_task()`.
+
+        Returns:
+            Task ID.
+
+        Raises:
+            TypeError: If `task` is not a `tes.models.Task` instance.
+            requests.exceptions.RequestException: If the task could not be
+                created; the error of the last attempt.
+        """
+        if not isinstance(task, Task):
+            raise TypeError("Expected Task instance")
+        key = key or uuid.uuid4().hex
+        task_id = self.task_id(key)
+        if task_id is not None:
+            return task_id
+        # submitted before, e.g. by a run that crashed
+        unknown = key in self.pending()
+        tagged = evolve(task, tags=dict(task.tags or {}, **{
+            IDEMPOTENCY_TAG: key}))
+        self._append({"event": "submitted", "key": key,
+                      "task": json.loads(tagged.as_json())})
+        return self._create(key, tagged, timeout_total, lookup=unknown)
+
+    def find(self, key: str) -> Optional[str]:
+        """Look up the task with an idempotency key on the server.
+
+        All pages of tasks listed with the key are looked through, see
+        `tes.cache.tagged_tasks()`.
+
+        Args:
+            key: Idempotency key.
+
+        Returns:
+            Task ID, or `None` if there is no such task.
+        """
+        for task in tagged_tasks(self.client, IDEMPOTENCY_TAG, key):
+            return task.id
+        return None
+
+    def task_id(self, key: str) -> Optional[str]:
+        """ID of the task created with an idempotency key, if confirmed."""
+        with self._lock:
+            return self._entries.get(key, {}).get("id")
+
+    def pending(self) -> List[str]:
+        """Keys of tasks submitted but neither confirmed nor failed."""
+        with self._lock:
+            return [
+                key for key, record in self._entries.items()
+                if record["event"] == "submitted"
+            ]
+
+    def recover(self, resubmit: bool = True) -> Dict[str, Optional[str]]:
+        """Resolve pending tasks against the server, e.g. after a crash.
+
+        Tasks found on the server are recorded as created; the others are
+        created again from the journal if `resubmit` is set.
+
+        Args:
+            resubmit: Create pending tasks not found on the server.
+
+        Returns:
+            Task IDs by key of the pending tasks; `None` for tasks neither
+            found nor created, which stay pending unless their creation
+            failed definitively.
+        """
+        result: Dict[str, Optional[str]] = {}
+        for key in self.pending():
+            try:
+                task_id = self.find(key)
+            except requests.exceptions.RequestException:
+                result[key] = None
+                continue
+            if task_id is not None:
+                self._append({"event": "created", "key": key, "id": task_id})
+            elif resubmit:
+                with self._lock:
+                    doc = self._entries[key]["task"]
+                try:
+                    task_id = self._create(key, unmarshal(doc, Task))
+                except requests.exceptions.RequestException:
+                    task_id = None
+            result[key] = task_id
+        return result
+
+    def _create(
+        self, key: str, task: Task, timeout_total: Optional[float] = None,
+        lookup: bool = False
+    ) -> str:
+        """Send create requests, checking for the task before retrying.
+
+        A create request is only retried once a lookup has found no task
+        with the key; if the lookup fails too, the next attempt starts with
+        another lookup. Errors other than request errors are raised right
+        away, leaving the key pending for `recover()`.
+
+        Args:
+            key: Idempotency key.
+            task: Task tagged with `key`.
+            timeout_total: Time budget in seconds for each create request.
+            lookup: Check for the task before the first attempt too.
+        """
+        error: Exception = ValueError("max_attempts must be at least 1")
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(self.retry_delay)
+            if attempt or lookup:
+                # only send the task again if it is certainly not there
+                try:
+                    task_id = self.find(key)
+                except requests.exceptions.RequestException as exc:
+                    error = exc
+                    continue
+                if task_id is not None:
+                    break
+            try:
+                task_id = self.client.create_task(
+                    task, timeout_total=timeout_total)
+                break
+            except requests.exceptions.RequestException as exc:
+                if _definitive(exc):
+                    self._append(
+                        {"event": "failed", "key": key, "error": str(exc)})
+                    raise
+                error = exc
+        else:
+            raise error
+        self._append({"event": "created", "key": key, "id": task_id})
+        return task_id
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        """Write a record to the journal."""
+        record = dict(record, time=time.time())
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._apply(record)
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        """Update the state of a key from a journal record."""
+        previous = self._entries.get(record["key"], {})
+        if "task" not in record and "task" in previous:
+            record = dict(record, task=previous["task"])
+        self._entries[record["key"]] = record
@@ -0,0 +1,227 @@
+"""Client metrics registry with Prometheus text exposition."""
+
+import threading
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from tes.futures import ACTIVE_STATES, FINAL_STATES
+from tes.instrumentation import DEFAULT_BUCKETS, Histogram, Hooks, RequestEvent
+
+
+# number of finished task IDs remembered to count each task only once
+FINISHED_MEMORY = 4096
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels) -> str:
+    """Format labels for the Prometheus exposition format."""
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace("\n", "\\n")
+         .replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value for the Prometheus exposition format."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry(Hooks):
+    """Registry of metrics about client activity.
+
+    Register the registry as hook of one or more clients, e.g.
+    `HTTPClient(url, hooks=[registry])`; it then tracks:
+
+    - `tes_client_requests_total`: Attempts by endpoint, method and status
+      code (`error` if no response was received).
+    - `tes_client_request_duration_seconds`: Histogram of attempt latencies
+      by endpoint.
+    - `tes_client_retries_total`: Attempts beyond the first of a call, i.e.,
+      fallback paths and failovers, by endpoint.
+    - `tes_client_cache_requests_total`: Cache lookups by cache and result
+      (`hit` or `miss`), as reported via `record_cache()`.
+    - `tes_client_open_requests`: Requests currently in flight.
+    - `tes_client_waited_tasks`: Tasks being waited on, by last seen state.
+    - `tes_client_finished_tasks_total`: Tasks seen reaching a final state
+      while waited on, by state; each task is counted once, even if its
+      final state is reported several times, e.g. by a callback and a poll.
+
+    Args:
+        buckets: Upper bounds of histogram buckets, in seconds.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[Labels, float]] = {
+            "tes_client_requests_total": {},
+            "tes_client_retries_total": {},
+            "tes_client_cache_requests_total": {},
+            "tes_client_finished_tasks_total": {},
+        }
+        self._histograms: Dict[Labels, Histogram] = {}
+        self._open_requests: int = 0
+        self._task_states: Dict[str, str] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _inc(self, name: str, labels: Labels, value: float = 1) -> None:
+        counter = self._counters[name]
+        counter[labels] = counter.get(labels, 0) + value
+
+    def pre_request(self, event: RequestEvent) -> None:
+        with self._lock:
+            self._open_requests += 1
+            if event.attempt > 1:
+                self._inc("tes_client_retries_total",
+                          (("endpoint", event.endpoint),))
+
+    def post_response(self, event: RequestEvent) -> None:
+        self._finish(event, str(event.status_code))
+
+    def on_error(self, event: RequestEvent) -> None:
+        self._finish(event, "error" if event.status_code is None
+                     else str(event.status_code))
+
+    def _finish(self, event: RequestEvent, status: str) -> None:
+        with self._lock:
+            self._open_requests = max(self._open_requests - 1, 0)
+            self._inc("tes_client_requests_total", (
+                ("endpoint", event.endpoint),
+                ("method", event.method.upper()),
+                ("status", status),
+            ))
+            if event.total is not None:
+                labels = (("endpoint", event.endpoint),)
+                histogram = self._histograms.get(labels)
+                if histogram is None:
+                    histogram = self._histograms[labels] = \
+                        Histogram(self.buckets)
+                histogram.observe(event.total)
+
+    def task_state(self, task_id: str, state: Optional[str]) -> None:
+        with self._lock:
+            if state in ACTIVE_STATES:
+                self._task_states[task_id] = state  # type: ignore
+            elif state in FINAL_STATES:
+                self._task_states.pop(task_id, None)
+                if task_id in self._finished:
+                    return
+                self._finished[task_id] = None
+                if len(self._finished) > FINISHED_MEMORY:
+                    self._finished.popitem(last=False)
+                self._inc("tes_client_finished_tasks_total",
+                          (("state", str(state)),))
+
+    def record_cache(self, hit: bool, cache: str = "call") -> None:
+        """Record a cache lookup.
+
+        Args:
+            hit: Whether the lookup was a hit.
+            cache: Name of the cache.
+        """
+        with self._lock:
+            self._inc("tes_client_cache_requests_total", (
+                ("cache", cache), ("result", "hit" if hit else "miss"),
+            ))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            Metrics in exposition format, version 0.0.4.
+        """
+        helps = {
+            "tes_client_requests_total": "TES API request attempts.",
+            "tes_client_retries_total":
+                "TES API request attempts beyond the first of a call.",
+            "tes_client_cache_requests_total": "Client cache lookups.",
+            "tes_client_finished_tasks_total":
+                "Tasks seen reaching a final state while waited on.",
+        }
+        lines: List[str] = []
+        with self._lock:
+            for name, counter in self._counters.items():
+                lines.append(f"# HELP {name} {helps[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(counter.items()):
+                    lines.append(
+                        f"{name}{_format_labels(labels)} "
+                        f"{_format_value(value)}")
+
+            name = "tes_client_request_duration_seconds"
+            lines.append(f"# HELP {name} TES API request attempt latency.")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                bounds = histogram.bounds + [float("inf")]
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    bucket = labels + (("le", _format_value(float(bound))),)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(bucket)} {cumulative}")
+                lines.append(
+                    f"{name}_sum{_format_labels(labels)} "
+                    f"{_format_value(histogram.sum)}")
+                lines.append(
+                    f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+            name = "tes_client_open_requests"
+            lines.append(f"# HELP {name} TES API requests in flight.")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {self._open_requests}")
+
+            name = "tes_client_waited_tasks"
+            lines.append(f"# HELP {name} Tasks waited on, by last seen state.")
+            lines.append(f"# TYPE {name} gauge")
+            for state in ACTIVE_STATES:
+                count = sum(
+                    1 for s in self._task_states.values() if s == state)
+                lines.append(
+                    f"{name}{_format_labels((('state', state),))} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(
+        self, port: int = 0, addr: str = "127.0.0.1"
+    ) -> ThreadingHTTPServer:
+        """Serve metrics over HTTP from a background thread.
+
+        Metrics are served on every path, e.g. `/metrics`. Call `shutdown()`
+        on the returned server to stop serving.
+
+        Args:
+            port: Port to listen on; a free port is chosen if 0.
+            addr: Address to listen on.
+
+        Returns:
+            The running server; its port is in `server_address[1]`.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((addr, port), Handler)
+        server.daemon_threads = True
+        thread = threading.Thread(
+            target=server.serve_forever, name="tes-metrics", daemon=True)
+        thread.start()
+        return server
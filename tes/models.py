@@ -582,6 +582,12 @@ class ListTasksRequest(Base):
     view: Optional[str] = attrib(
         default=None, validator=optional(in_(["MINIMAL", "BASIC", "FULL"]))
     )
+    tag_key: Optional[List[str]] = attrib(
+        default=None, converter=strconv, validator=optional(list_of(str))
+    )
+    tag_value: Optional[List[str]] = attrib(
+        default=None, converter=strconv, validator=optional(list_of(str))
+    )
 
 
 @attrs
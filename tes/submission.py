@@ -0,0 +1,163 @@
+"""Queue creating tasks in the background."""
+
+import queue
+import threading
+
+from concurrent.futures import Future
+from typing import Any, List, Optional, Tuple, Union
+
+from tes.models import Task
+
+
+# queued task, or its JSON representation, and future of its ID
+_Item = Tuple[Union[Task, str], Future]
+
+
+class SubmissionQueue(object):
+    """Write-behind queue for `HTTPClient.create_task()`.
+
+    `enqueue()` returns a future of the task ID right away; a pool of
+    `max_workers` background threads creates the queued tasks, in order,
+    with up to `max_workers` requests in flight. Producers thus never wait
+    for the server, unless more than `max_queue_size` tasks are waiting to
+    be sent: `enqueue()` then blocks until there is room again
+    (backpressure).
+
+    The workers send requests through the client's transport. To reuse
+    connections across requests, give the client a pooling transport with
+    at least `max_workers` connections, e.g.
+    `tes.transport.SessionTransport(pool_maxsize=max_workers)`.
+
+    Use the queue as a context manager, or call `shutdown()` when done, to
+    send all queued tasks before the workers stop::
+
+        with SubmissionQueue(client) as submissions:
+            futures = [submissions.enqueue(task) for task in tasks]
+        task_ids = [future.result() for future in futures]
+
+    Args:
+        client: `HTTPClient` to create tasks with.
+        max_workers: Number of worker threads, i.e., largest number of
+            concurrent requests.
+        max_queue_size: Largest number of tasks waiting to be sent.
+
+    Raises:
+        ValueError: If `max_workers` or `max_queue_size` is smaller than 1.
+    """
+
+    def __init__(
+        self, client: Any, max_workers: int = 8, max_queue_size: int = 1000
+    ):
+        if max_workers < 1 or max_queue_size < 1:
+            raise ValueError(
+                "max_workers and max_queue_size must be at least 1")
+        self.client = client
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._queue: "queue.Queue[Optional[_Item]]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+        for index in range(max_workers):
+            thread = threading.Thread(
+                target=self._work, name=f"tes-submit-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def enqueue(
+        self, task: Union[Task, str], timeout: Optional[float] = None
+    ) -> Future:
+        """Queue a task for creation.
+
+        Args:
+            task: `tes.models.Task` instance, or its JSON representation,
+                e.g. rendered from a `tes.template.TaskTemplate`.
+            timeout: Seconds to wait for room in the queue if it is full;
+                wait indefinitely if `None`.
+
+        Returns:
+            Future of the task ID, failing with the error raised by
+            `HTTPClient.create_task()` if the task cannot be created.
+
+        Raises:
+            TypeError: If `task` is neither a `tes.models.Task` instance nor
+                a string.
+            queue.Full: If there is no room in the queue after `timeout`.
+            RuntimeError: If the queue has been shut down.
+        """
+        if not isinstance(task, (Task, str)):
+            raise TypeError("Expected Task instance or JSON string")
+        if not self._slots.acquire(timeout=timeout):
+            raise queue.Full("Submission queue is full")
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                self._slots.release()
+                raise RuntimeError("Submission queue has been shut down")
+            self._queue.put((task, future))
+        return future
+
+    def pending(self) -> int:
+        """Number of tasks waiting to be sent."""
+        return self._queue.qsize()
+
+    def flush(self) -> None:
+        """Wait until all tasks queued so far have been sent."""
+        self._queue.join()
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """Stop accepting tasks and stop the workers once the queue is empty.
+
+        Args:
+            wait: Wait until all queued tasks have been sent.
+            cancel_pending: Cancel the futures of queued tasks not sent yet,
+                instead of sending them.
+        """
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                if cancel_pending:
+                    while True:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        self._release(item)
+                for _ in self._threads:
+                    self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            task, future = item
+            self._slots.release()
+            if future.set_running_or_notify_cancel():
+                try:
+                    if isinstance(task, str):
+                        task_id = self.client.create_task_json(task)
+                    else:
+                        task_id = self.client.create_task(task)
+                    future.set_result(task_id)
+                except BaseException as exc:
+                    future.set_exception(exc)
+            self._queue.task_done()
+
+    def _release(self, item: Optional[_Item]) -> None:
+        """Cancel a task taken off the queue without sending it."""
+        if item is not None:
+            self._slots.release()
+            item[1].cancel()
+        self._queue.task_done()
+
+    def __enter__(self) -> "SubmissionQueue":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
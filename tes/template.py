@@ -0,0 +1,96 @@
+"""Task templates with placeholders, serialized once."""
+
+import json
+import re
+
+from typing import Any, FrozenSet, List, Mapping
+
+from tes.models import Task
+from tes.utils import unmarshal
+
+
+# placeholder in string fields of a template, e.g. `{{sample}}`
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+class TaskTemplate(object):
+    """Task with placeholders, for creating many similar tasks cheaply.
+
+    Placeholders like `{{name}}` may appear anywhere in the string fields of
+    the template task, e.g. in executor commands, environment variables or
+    input and output URLs and paths. The template is validated and
+    serialized to JSON once; `render()` then only fills in the JSON-escaped
+    parameter values between the constant fragments of the serialized
+    template, instead of building, validating and serializing a `Task` for
+    each set of parameters::
+
+        template = TaskTemplate(Task(
+            name="align-{{sample}}",
+            executors=[Executor(
+                image="aligner", command=["align", "/data/{{sample}}.fq"])],
+        ))
+        body = template.render({"sample": "S1"})
+
+    Parameter values are converted with `str()`. As only strings are
+    substituted, rendered tasks are valid whenever the template is.
+
+    Args:
+        task: Template `tes.models.Task` instance.
+
+    Attributes:
+        names: Names of the placeholders.
+
+    Raises:
+        TypeError: If `task` is not a `tes.models.Task` instance.
+    """
+
+    def __init__(self, task: Task):
+        if not isinstance(task, Task):
+            raise TypeError("Expected Task instance")
+        body = task.as_json()
+        self._fragments: List[str] = []
+        self._placeholders: List[str] = []
+        start = 0
+        for match in PLACEHOLDER.finditer(body):
+            self._fragments.append(body[start:match.start()])
+            self._placeholders.append(match.group(1))
+            start = match.end()
+        self._fragments.append(body[start:])
+        self.names: FrozenSet[str] = frozenset(self._placeholders)
+
+    def render(self, params: Mapping[str, Any]) -> str:
+        """Fill in placeholders.
+
+        Args:
+            params: Values by placeholder name; other keys are ignored.
+
+        Returns:
+            JSON representation of the task, e.g. for
+            `HTTPClient.create_task_json()`.
+
+        Raises:
+            KeyError: If a placeholder has no value.
+        """
+        parts = [self._fragments[0]]
+        for name, fragment in zip(self._placeholders, self._fragments[1:]):
+            try:
+                value = params[name]
+            except KeyError:
+                raise KeyError(f"Missing value for placeholder: {name}")
+            parts.append(json.dumps(str(value))[1:-1])
+            parts.append(fragment)
+        return "".join(parts)
+
+    def task(self, params: Mapping[str, Any]) -> Task:
+        """Fill in placeholders and build the task.
+
+        Args:
+            params: Values by placeholder name.
+
+        Returns:
+            `tes.models.Task` instance.
+
+        Raises:
+            KeyError: If a placeholder has no value.
+        """
+        return unmarshal(self.render(params), Task)
@@ -0,0 +1,682 @@
+"""Fake TES server and fixtures for testing code built on py-tes."""
+
+import json
+import os
+import random
+import requests
+import threading
+import time
+import uuid
+
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import BaseRequestHandler
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, quote, urlparse
+
+from tes.futures import FINAL_STATES
+from tes.models import (Executor, ExecutorLog, Input, Output, Resources,
+                        Task, TaskLog)
+from tes.transport import Transport, build_response
+
+
+# tag requesting the final state a task should reach on a fake server
+FINAL_STATE_TAG = "fake-tes-final-state"
+# tag with a URL a fake server posts state changes of a task to
+CALLBACK_TAG = "fake-tes-callback-url"
+
+
+def make_task(
+    n_inputs: int = 1, n_outputs: int = 1, n_executors: int = 1,
+    log_bytes: int = 0, with_logs: bool = True, state: Optional[str] = None
+) -> Task:
+    """Generate a realistic task of configurable size.
+
+    Args:
+        n_inputs: Number of inputs.
+        n_outputs: Number of outputs.
+        n_executors: Number of executors.
+        log_bytes: Size of the stdout and stderr of each executor log.
+        with_logs: Whether to include a task log with one executor log per
+            executor.
+        state: Task state.
+
+    Returns:
+        `tes.models.Task` instance.
+    """
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    logs = None
+    if with_logs:
+        logs = [TaskLog(
+            start_time=start,
+            end_time=start + timedelta(minutes=10),
+            metadata={"host": "worker-1"},
+            logs=[
+                ExecutorLog(
+                    start_time=start,
+                    end_time=start + timedelta(minutes=1),
+                    stdout="o" * log_bytes,
+                    stderr="e" * log_bytes,
+                    exit_code=0,
+                )
+                for _ in range(n_executors)
+            ],
+            system_logs=["scheduled on worker-1"],
+        )]
+    return Task(
+        id=None if state is None else uuid.uuid4().hex,
+        state=state,
+        name="generated task",
+        description="Task generated by tes.testing.make_task",
+        inputs=[
+            Input(url=f"s3://bucket/inputs/sample_{i}.fastq.gz",
+                  path=f"/data/inputs/sample_{i}.fastq.gz")
+            for i in range(n_inputs)
+        ],
+        outputs=[
+            Output(url=f"s3://bucket/outputs/result_{i}.bam",
+                   path=f"/data/outputs/result_{i}.bam")
+            for i in range(n_outputs)
+        ],
+        resources=Resources(cpu_cores=4, ram_gb=8.0, disk_gb=40.0),
+        executors=[
+            Executor(
+                image="quay.io/biocontainers/samtools:1.17",
+                command=["samtools", "sort", "-o",
+                         f"/data/outputs/result_{i}.bam",
+                         f"/data/inputs/sample_{i}.fastq.gz"],
+                workdir="/data",
+                env={"STEP": str(i)},
+            )
+            for i in range(n_executors)
+        ],
+        tags={"project": "benchmark"},
+        logs=logs,
+        creation_time=start if state is not None else None,
+    )
+
+
+class FakeTES(object):
+    """In-memory implementation of the TES 1.1 API.
+
+    Tasks progress through `QUEUED`, `INITIALIZING` and `RUNNING` to their
+    final state based on wall-clock time since creation (`state_durations`).
+    The final state is `COMPLETE`, unless a task's tags request another one
+    via `FINAL_STATE_TAG`. Errors can be injected with `inject_error()` or
+    randomly with `error_rate`.
+
+    State changes of tasks tagged with a URL in `CALLBACK_TAG` are posted
+    to that URL as they happen, as JSON objects with the task's `id` and
+    `state`, e.g. to a `tes.callbacks.CallbackListener`.
+
+    The API is independent of any transport: `handle()` answers a request
+    given as method, URL and body. `FakeTESServer` serves it over HTTP.
+
+    Args:
+        prefix: Base path to serve the API under; requests to other paths,
+            e.g. other base paths probed by `HTTPClient`, return 404.
+        latency: Seconds to wait before answering each request.
+        jitter: Largest additional random latency in seconds.
+        page_size: Default page size of `GET /tasks`.
+        max_page_size: Largest page size of `GET /tasks`.
+        state_durations: Seconds that tasks spend in each non-final state.
+        error_rate: Fraction of requests answered with a random status code
+            from `error_statuses`.
+        error_statuses: Status codes used for random errors.
+        seed: Seed for the random number generator.
+        tag_filters: Apply the `tag_key` and `tag_value` filters of
+            `GET /tasks`; TES 1.0 servers ignore them.
+    """
+
+    def __init__(
+        self, prefix: str = "/ga4gh/tes/v1", latency: float = 0.0,
+        jitter: float = 0.0, page_size: int = 256,
+        max_page_size: int = 2048,
+        state_durations: Optional[Dict[str, float]] = None,
+        error_rate: float = 0.0,
+        error_statuses: Tuple[int, ...] = (429, 503),
+        seed: Optional[int] = None, tag_filters: bool = True
+    ):
+        self.prefix = "/" + prefix.strip("/") if prefix.strip("/") else ""
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.state_durations = {
+            "QUEUED": 0.0, "INITIALIZING": 0.0, "RUNNING": 0.0,
+        }
+        self.state_durations.update(state_durations or {})
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.random = random.Random(seed)
+        self.tag_filters = tag_filters
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.order: List[str] = []
+        self.requests: Dict[Tuple[str, str], int] = {}
+        self.callbacks = 0
+        self._created: Dict[str, float] = {}
+        self._notified: Dict[str, str] = {}
+        self._errors: Deque[Tuple[int, Optional[str], Optional[str]]] = \
+            deque()
+        self._lock = threading.RLock()
+
+    def add_task(self, task: Union[Task, Dict[str, Any]]) -> str:
+        """Store a task as is, e.g. to prepare listings.
+
+        Tasks without state are treated like newly created tasks.
+
+        Args:
+            task: Task to store; an ID is assigned if it has none.
+
+        Returns:
+            Task ID.
+        """
+        doc = json.loads(task.as_json()) if isinstance(task, Task) \
+            else dict(task)
+        doc["id"] = doc.get("id") or uuid.uuid4().hex
+        doc.setdefault("creation_time", _now())
+        callbacks = False
+        with self._lock:
+            if doc["id"] not in self.tasks:
+                self.order.append(doc["id"])
+            self.tasks[doc["id"]] = doc
+            if doc.get("state") is None:
+                doc["state"] = "QUEUED"
+                self._created[doc["id"]] = time.monotonic()
+                callbacks = bool((doc.get("tags") or {}).get(CALLBACK_TAG))
+        if callbacks:
+            self._schedule_callbacks(doc["id"])
+        return doc["id"]
+
+    def inject_error(
+        self, status: int, count: int = 1, route: Optional[str] = None,
+        method: Optional[str] = None
+    ) -> None:
+        """Answer the next matching requests with an error.
+
+        Args:
+            status: Status code to return, e.g. 429 or 503.
+            count: Number of requests to fail.
+            route: Route to fail, e.g. `/tasks` or `/tasks/{id}`; any route
+                if `None`.
+            method: HTTP method to fail; any method if `None`.
+        """
+        with self._lock:
+            for _ in range(count):
+                self._errors.append((status, route, method))
+
+    def handle(
+        self, method: str, url: str, body: Optional[bytes] = None
+    ) -> Tuple[int, Dict[str, str], Any]:
+        """Answer a request.
+
+        Args:
+            method: HTTP method.
+            url: Request path, including any query string.
+            body: Request body.
+
+        Returns:
+            Tuple of status code, response headers and JSON-compatible
+            response body.
+        """
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        path = parsed.path
+        if not path.startswith(self.prefix + "/"):
+            return 404, {}, {"message": "Not found"}
+        path = path[len(self.prefix):]
+        route = _route(path)
+        with self._lock:
+            key = (method, route)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            error = self._take_error(method, route)
+        if error is not None:
+            headers = {"Retry-After": "1"} if error == 429 else {}
+            return error, headers, {"message": "Injected error"}
+
+        if route == "/service-info" and method == "GET":
+            return 200, {}, self.service_info()
+        if route == "/tasks" and method == "POST":
+            return self._create(body)
+        if route == "/tasks" and method == "GET":
+            return self._list(query)
+        if route == "/tasks/{id}" and method == "GET":
+            return self._get(path[len("/tasks/"):], query)
+        if route == "/tasks/{id}:cancel" and method == "POST":
+            return self._cancel(path[len("/tasks/"):-len(":cancel")])
+        return 404, {}, {"message": "Not found"}
+
+    def service_info(self) -> Dict[str, Any]:
+        """Service info document of the fake server."""
+        return {
+            "id": "org.ga4gh.tes.fake",
+            "name": "Fake TES",
+            "type": {"group": "org.ga4gh", "artifact": "tes",
+                     "version": "1.1.0"},
+            "organization": {"name": "py-tes",
+                             "url": "https://github.com/ohsu-comp-bio/py-tes"},
+            "version": "1.1.0",
+            "storage": ["file:///", "s3://"],
+        }
+
+    def _take_error(self, method: str, route: str) -> Optional[int]:
+        for index, (status, err_route, err_method) in enumerate(self._errors):
+            if err_route in (None, route) and err_method in (None, method):
+                del self._errors[index]
+                return status
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self.random.choice(self.error_statuses)
+        return None
+
+    def _create(self, body: Optional[bytes]) -> Tuple[int, Dict, Any]:
+        try:
+            doc = json.loads(body or b"")
+        except ValueError:
+            return 400, {}, {"message": "Invalid JSON"}
+        if not isinstance(doc, dict) or not doc.get("executors"):
+            return 400, {}, {"message": "Task must have executors"}
+        for field in ("id", "state", "logs", "creation_time"):
+            doc.pop(field, None)
+        return 200, {}, {"id": self.add_task(doc)}
+
+    def _list(self, query: Dict[str, List[str]]) -> Tuple[int, Dict, Any]:
+        view = query.get("view", ["MINIMAL"])[0]
+        try:
+            start = int(query.get("page_token", ["0"])[0])
+            size = int(query.get("page_size", [self.page_size])[0])
+        except ValueError:
+            return 400, {}, {"message": "Invalid page token or size"}
+        size = max(1, min(size, self.max_page_size))
+        name_prefix = query.get("name_prefix", [""])[0]
+        tags = list(zip(query.get("tag_key", []), query.get("tag_value", [])))
+        tag_keys = query.get("tag_key", [])[len(tags):]
+        if not self.tag_filters:
+            tags, tag_keys = [], []
+        with self._lock:
+            docs = [
+                self._refresh(task_id) for task_id in reversed(self.order)
+            ]
+        docs = [
+            d for d in docs
+            if (d.get("name") or "").startswith(name_prefix)
+            and all((d.get("tags") or {}).get(k) == v for k, v in tags)
+            and all(k in (d.get("tags") or {}) for k in tag_keys)
+        ]
+        response: Dict[str, Any] = {
+            "tasks": [_view(d, view) for d in docs[start:start + size]],
+        }
+        if start + size < len(docs):
+            response["next_page_token"] = str(start + size)
+        return 200, {}, response
+
+    def _get(
+        self, task_id: str, query: Dict[str, List[str]]
+    ) -> Tuple[int, Dict, Any]:
+        with self._lock:
+            if task_id not in self.tasks:
+                return 404, {}, {"message": f"Task {task_id} not found"}
+            doc = self._refresh(task_id)
+        return 200, {}, _view(doc, query.get("view", ["MINIMAL"])[0])
+
+    def _cancel(self, task_id: str) -> Tuple[int, Dict, Any]:
+        with self._lock:
+            if task_id not in self.tasks:
+                return 404, {}, {"message": f"Task {task_id} not found"}
+            doc = self._refresh(task_id)
+            if doc["state"] not in FINAL_STATES:
+                doc["state"] = "CANCELED"
+                self._created.pop(task_id, None)
+        self._callback(task_id)
+        return 200, {}, {}
+
+    def _schedule_callbacks(self, task_id: str) -> None:
+        """Post the states of a task in the background as they change."""
+        delays = [0.0]
+        for state in ("QUEUED", "INITIALIZING", "RUNNING"):
+            if self.state_durations[state]:
+                # fire just after the state changed
+                delays.append(
+                    delays[-1] + self.state_durations[state] + 0.001)
+        for delay in delays:
+            timer = threading.Timer(delay, self._callback, (task_id,))
+            timer.daemon = True
+            timer.start()
+
+    def _callback(self, task_id: str) -> None:
+        """Post the state of a task to its callback URL if it changed."""
+        with self._lock:
+            doc = self._refresh(task_id)
+            url = (doc.get("tags") or {}).get(CALLBACK_TAG)
+            if not url or self._notified.get(task_id) == doc["state"]:
+                return
+            self._notified[task_id] = doc["state"]
+            self.callbacks += 1
+        try:
+            requests.post(
+                url, json={"id": task_id, "state": doc["state"]}, timeout=5)
+        except requests.exceptions.RequestException:
+            pass
+
+    def _refresh(self, task_id: str) -> Dict[str, Any]:
+        """Advance the state of a task according to its age."""
+        doc = self.tasks[task_id]
+        created = self._created.get(task_id)
+        if created is None:
+            return doc
+        age = time.monotonic() - created
+        state = None
+        for candidate in ("QUEUED", "INITIALIZING", "RUNNING"):
+            age -= self.state_durations[candidate]
+            if age < 0:
+                state = candidate
+                break
+        if state is None:
+            state = (doc.get("tags") or {}).get(FINAL_STATE_TAG, "COMPLETE")
+            del self._created[task_id]
+            doc["logs"] = [{
+                "start_time": doc["creation_time"],
+                "end_time": _now(),
+                "logs": [
+                    {"exit_code": 0 if state == "COMPLETE" else 1,
+                     "stdout": "", "stderr": ""}
+                    for _ in doc.get("executors") or []
+                ],
+            }]
+        doc["state"] = state
+        return doc
+
+
+class FakeTESServer(object):
+    """Threaded local HTTP server serving a `FakeTES` API.
+
+    Use as a context manager, or call `start()` and `stop()`::
+
+        with FakeTESServer(FakeTES(latency=0.01)) as server:
+            client = tes.HTTPClient(server.url)
+
+    Args:
+        api: API to serve; a default `FakeTES` if `None`.
+        host: Address to listen on.
+        port: Port to listen on; a free port is chosen if 0.
+        http2: Serve HTTP/2 without TLS instead of HTTP/1.1, for clients
+            with prior knowledge of HTTP/2 support (h2c), answering the
+            streams of a connection concurrently. Requires the `h2` package.
+        unix_socket: Listen on a Unix domain socket at this path instead of
+            `host` and `port`; `url` is then an `http+unix` URL. The socket
+            file is removed on `stop()`.
+
+    Attributes:
+        url: Base URL of the server.
+        connections: Number of connections accepted so far.
+
+    Raises:
+        ImportError: If `http2` is set and `h2` is not installed.
+    """
+
+    def __init__(
+        self, api: Optional[FakeTES] = None, host: str = "127.0.0.1",
+        port: int = 0, http2: bool = False,
+        unix_socket: Optional[str] = None
+    ):
+        self.api = api or FakeTES()
+        self.connections = 0
+        self.unix_socket = unix_socket
+        handler = _h2_handler(self.api) if http2 else _handler(self.api)
+        base: type = ThreadingHTTPServer
+        if unix_socket is not None:
+            # not available on Windows
+            from socketserver import ThreadingUnixStreamServer
+            base = ThreadingUnixStreamServer
+            handler = type(
+                "Handler", (handler,), {"disable_nagle_algorithm": False})
+        fake = self
+
+        class Server(base):  # type: ignore
+            daemon_threads = True
+
+            def process_request(self, request, client_address):
+                fake.connections += 1
+                super().process_request(request, client_address)
+
+        if unix_socket is not None:
+            self.server = Server(unix_socket, handler)
+            self.url = "http+unix://" + quote(unix_socket, safe="")
+        else:
+            self.server = Server((host, port), handler)
+            self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FakeTESServer":
+        """Start serving from a background thread."""
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="fake-tes", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+        if self.unix_socket is not None and \
+                os.path.exists(self.unix_socket):
+            os.unlink(self.unix_socket)
+
+    def __enter__(self) -> "FakeTESServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+
+class InMemoryTransport(Transport):
+    """Transport answering requests from a `FakeTES` API in memory.
+
+    Requests go straight to `FakeTES.handle()`, without sockets or threads,
+    for fast tests of code using `HTTPClient`. Hosts in URLs are ignored::
+
+        api = FakeTES()
+        client = tes.HTTPClient("http://fake", transport=InMemoryTransport(api))
+
+    Args:
+        api: API to answer requests; a default `FakeTES` if `None`.
+    """
+
+    def __init__(self, api: Optional[FakeTES] = None):
+        self.api = api or FakeTES()
+
+    def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        prepared = requests.models.PreparedRequest()
+        prepared.prepare_url(url, kwargs.get("params"))
+        url = prepared.url  # type: ignore
+        parsed = urlparse(url)
+        data = kwargs.get("data")
+        start = time.monotonic()
+        status, headers, payload = self.api.handle(
+            method.upper(),
+            parsed.path + ("?" + parsed.query if parsed.query else ""),
+            data.encode() if isinstance(data, str) else data)
+        headers = dict(headers, **{"Content-Type": "application/json"})
+        return build_response(
+            status, json.dumps(payload).encode(), url, headers=headers,
+            elapsed=time.monotonic() - start)
+
+
+def _handler(api: FakeTES) -> type:
+    """Build a request handler class serving `api`."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body are written separately; avoid delayed ACKs on
+        # kept-alive connections
+        disable_nagle_algorithm = True
+
+        def _respond(self, method: str) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+            status, headers, payload = api.handle(method, self.path, body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            self._respond("GET")
+
+        def do_POST(self) -> None:
+            self._respond("POST")
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return Handler
+
+
+def _h2_handler(api: FakeTES) -> type:
+    """Build a request handler class serving `api` over HTTP/2 (h2c)."""
+    try:
+        import h2.config
+        import h2.connection
+        import h2.events
+    except ImportError:
+        raise ImportError("Serving HTTP/2 requires the 'h2' package")
+
+    class Handler(BaseRequestHandler):
+
+        def setup(self) -> None:
+            self.conn = h2.connection.H2Connection(
+                config=h2.config.H2Configuration(
+                    client_side=False, header_encoding="utf-8"))
+            self.lock = threading.Lock()
+            self.streams: Dict[int, Tuple[Dict[str, str], bytearray]] = {}
+            # response bodies waiting for flow control windows to open
+            self.pending: Dict[int, bytes] = {}
+            self.pool = ThreadPoolExecutor(
+                max_workers=128, thread_name_prefix="fake-tes-h2")
+
+        def handle(self) -> None:
+            with self.lock:
+                self.conn.initiate_connection()
+                self.request.sendall(self.conn.data_to_send())
+            while True:
+                try:
+                    data = self.request.recv(65535)
+                except OSError:
+                    return
+                if not data:
+                    return
+                with self.lock:
+                    for event in self.conn.receive_data(data):
+                        if not self._on_event(event):
+                            return
+                    self.request.sendall(self.conn.data_to_send())
+
+        def finish(self) -> None:
+            self.pool.shutdown(wait=False)
+
+        def _on_event(self, event: Any) -> bool:
+            if isinstance(event, h2.events.RequestReceived):
+                self.streams[event.stream_id] = \
+                    (dict(event.headers), bytearray())
+            elif isinstance(event, h2.events.DataReceived):
+                self.streams[event.stream_id][1].extend(event.data)
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                headers, body = self.streams.pop(event.stream_id)
+                self.pool.submit(
+                    self._respond, event.stream_id, headers, bytes(body))
+            elif isinstance(event, h2.events.WindowUpdated):
+                for stream_id in list(self.pending):
+                    self._send_body(stream_id)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                return False
+            return True
+
+        def _respond(
+            self, stream_id: int, headers: Dict[str, str], body: bytes
+        ) -> None:
+            status, extra, payload = api.handle(
+                headers[":method"], headers[":path"], body or None)
+            data = json.dumps(payload).encode()
+            with self.lock:
+                self.conn.send_headers(stream_id, [
+                    (":status", str(status)),
+                    ("content-type", "application/json"),
+                    ("content-length", str(len(data))),
+                ] + [(k.lower(), v) for k, v in extra.items()])
+                self.pending[stream_id] = data
+                self._send_body(stream_id)
+                try:
+                    self.request.sendall(self.conn.data_to_send())
+                except OSError:
+                    pass
+
+        def _send_body(self, stream_id: int) -> None:
+            """Send as much of a pending body as flow control allows."""
+            data = self.pending[stream_id]
+            while data:
+                size = min(self.conn.local_flow_control_window(stream_id),
+                           self.conn.max_outbound_frame_size, len(data))
+                if size <= 0:
+                    self.pending[stream_id] = data
+                    return
+                self.conn.send_data(stream_id, data[:size])
+                data = data[size:]
+            self.conn.end_stream(stream_id)
+            del self.pending[stream_id]
+
+    return Handler
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _route(path: str) -> str:
+    """Map a request path to its route template."""
+    if path.startswith("/tasks/") and path != "/tasks/":
+        if path.endswith(":cancel"):
+            return "/tasks/{id}:cancel"
+        return "/tasks/{id}"
+    return path.rstrip("/") or "/"
+
+
+def _view(doc: Dict[str, Any], view: str) -> Dict[str, Any]:
+    """Reduce a task document to a view."""
+    if view == "MINIMAL":
+        return {"id": doc["id"], "state": doc["state"]}
+    if view == "FULL":
+        return doc
+    basic = dict(doc)
+    if "inputs" in basic:
+        basic["inputs"] = [
+            {k: v for k, v in i.items() if k != "content"}
+            for i in basic["inputs"]
+        ]
+    if "logs" in basic:
+        basic["logs"] = [
+            dict(
+                {k: v for k, v in log.items() if k != "system_logs"},
+                logs=[
+                    {k: v for k, v in e.items()
+                     if k not in ("stdout", "stderr")}
+                    for e in log.get("logs") or []
+                ],
+            )
+            for log in basic["logs"]
+        ]
+    return basic
@@ -0,0 +1,123 @@
+"""Pluggable tracing of client calls."""
+
+from typing import Any, Dict, Optional
+
+
+class Span(object):
+    """Span of a traced operation; this base implementation does nothing.
+
+    Spans are context managers that end themselves on exit, recording any
+    exception raised within.
+    """
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set an attribute on the span.
+
+        Args:
+            key: Attribute name.
+            value: Attribute value.
+        """
+
+    def record_exception(self, exc: BaseException) -> None:
+        """Record an exception raised during the span.
+
+        Args:
+            exc: Exception raised.
+        """
+
+    def end(self) -> None:
+        """End the span."""
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.record_exception(exc)
+        self.end()
+
+
+class Tracer(object):
+    """Tracer creating spans; this base implementation does nothing.
+
+    Subclass and override `start_span()` to adapt another tracing system,
+    and pass an instance via `HTTPClient(tracer=...)`. The client creates a
+    span per access method call (`tes.<method>`), with child spans for each
+    request attempt (`tes.attempt`), decoding the response body as JSON
+    (`tes.decode.json`) and unmarshalling it into a model
+    (`tes.decode.unmarshal`).
+    """
+
+    def start_span(
+        self, name: str, attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[Span] = None
+    ) -> Span:
+        """Start a span.
+
+        Args:
+            name: Span name.
+            attributes: Initial span attributes.
+            parent: Parent span; parents are passed explicitly, as attempts
+                may run in other threads than their calls.
+
+        Returns:
+            The started span.
+        """
+        return NOOP_SPAN
+
+
+NOOP_SPAN = Span()
+NOOP_TRACER = Tracer()
+
+
+class _OpenTelemetrySpan(Span):
+    """Wrapper around an OpenTelemetry span."""
+
+    def __init__(self, span: Any):
+        self.span = span
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.span.set_attribute(key, value)
+
+    def record_exception(self, exc: BaseException) -> None:
+        from opentelemetry.trace import Status, StatusCode
+        self.span.record_exception(exc)
+        self.span.set_status(Status(StatusCode.ERROR, str(exc)))
+
+    def end(self) -> None:
+        self.span.end()
+
+
+class OpenTelemetryTracer(Tracer):
+    """Adapter emitting spans through OpenTelemetry.
+
+    Requires the `opentelemetry-api` package, e.g. installed with
+    `pip install py-tes[opentelemetry]`.
+
+    Args:
+        tracer: OpenTelemetry tracer to use; defaults to the tracer named
+            `tes` of the global tracer provider.
+
+    Raises:
+        ImportError: If `opentelemetry-api` is not installed.
+    """
+
+    def __init__(self, tracer: Any = None):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError(
+                "OpenTelemetryTracer requires the 'opentelemetry-api' package"
+            )
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("tes")
+
+    def start_span(
+        self, name: str, attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[Span] = None
+    ) -> Span:
+        context = None
+        if isinstance(parent, _OpenTelemetrySpan):
+            context = self._trace.set_span_in_context(parent.span)
+        return _OpenTelemetrySpan(self.tracer.start_span(
+            name, context=context, attributes=attributes))
@@ -0,0 +1,615 @@
+"""Pluggable HTTP transports used by `HTTPClient`."""
+
+import base64
+import gzip
+import io
+import json
+import requests
+import socket
+import threading
+import time
+import urllib3
+
+from datetime import timedelta
+from requests.structures import CaseInsensitiveDict
+from typing import Any, Dict, IO, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlparse
+
+from tes.utils import ReplayError
+
+
+class Transport(object):
+    """Transport sending HTTP requests on behalf of a client.
+
+    Transports take the keyword arguments of :func:`requests.request`
+    (`timeout`, `headers`, `auth`, `data` and `params`), and return
+    :class:`requests.Response` objects or raise
+    :class:`requests.exceptions.RequestException`, so that all transports
+    can be used interchangeably. Pass an instance via
+    `HTTPClient(transport=...)`.
+
+    Transports that can time connection setup store it in the
+    `connect_time` attribute of responses (see `build_response()`), which
+    is reported to hooks as `tes.instrumentation.RequestEvent.connect_time`.
+    """
+
+    def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        """Send a request.
+
+        Args:
+            method: HTTP method, e.g. `get`.
+            url: Fully qualified URL.
+            **kwargs: Keyword arguments as for :func:`requests.request`.
+
+        Returns:
+            The response.
+
+        Raises:
+            requests.exceptions.RequestException: If no response was
+                received.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release resources held by the transport."""
+
+
+class RequestsTransport(Transport):
+    """Transport using the module-level functions of :mod:`requests`.
+
+    A new connection is made for each request. This is the default.
+    """
+
+    def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        return getattr(requests, method)(url, **kwargs)
+
+
+DEFAULT_TRANSPORT = RequestsTransport()
+
+
+def _request_url(url: str, params: Optional[Dict[str, Any]]) -> str:
+    """URL of a request, including its encoded query parameters."""
+    prepared = requests.models.PreparedRequest()
+    prepared.prepare_url(url, params)
+    return prepared.url  # type: ignore
+
+
+def _request_body(data: Any) -> Optional[str]:
+    if isinstance(data, bytes):
+        return data.decode()
+    return data
+
+
+def _split_timeout(timeout: Any) -> Tuple[Optional[float], Optional[float]]:
+    """Split a :mod:`requests` timeout into connect and read timeouts."""
+    if isinstance(timeout, tuple):
+        return timeout[0], timeout[1]
+    return timeout, timeout
+
+
+def _request_headers(kwargs: Dict[str, Any]) -> Dict[str, str]:
+    """Request headers, including basic authentication from `auth`."""
+    headers = dict(kwargs.get("headers") or {})
+    auth = kwargs.get("auth")
+    if auth is not None:
+        credentials = base64.b64encode(f"{auth[0]}:{auth[1]}".encode())
+        headers["Authorization"] = f"Basic {credentials.decode()}"
+    return headers
+
+
+def build_response(
+    status_code: int, content: bytes, url: str,
+    headers: Optional[Dict[str, str]] = None, reason: Optional[str] = None,
+    elapsed: float = 0.0, connect_time: Optional[float] = None
+) -> requests.Response:
+    """Build a :class:`requests.Response`, e.g. in custom transports.
+
+    Args:
+        status_code: HTTP status code.
+        content: Response body.
+        url: Request URL.
+        headers: Response headers.
+        reason: Reason phrase.
+        elapsed: Seconds between sending the request and receiving the
+            response headers.
+        connect_time: Seconds taken to establish a new connection for the
+            request, `0.0` if an open connection was reused, or `None` if
+            unknown.
+
+    Returns:
+        The response.
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = reason  # type: ignore
+    response.headers = CaseInsensitiveDict(headers or {})
+    response._content = content
+    response.raw = io.BytesIO(content)
+    response.encoding = requests.utils.get_encoding_from_headers(
+        response.headers)
+    response.url = url
+    response.elapsed = timedelta(seconds=elapsed)
+    response.connect_time = connect_time  # type: ignore
+    return response
+
+
+class SessionTransport(Transport):
+    """Transport using a :class:`requests.Session`.
+
+    Connections are kept alive and reused across requests, which saves a
+    TCP (and TLS) handshake per request.
+
+    Args:
+        session: Session to use; a new session if `None`.
+        pool_connections: Number of hosts to keep connection pools for.
+        pool_maxsize: Number of connections to keep per host; should be at
+            least the number of concurrent requests.
+    """
+
+    def __init__(
+        self, session: Optional[requests.Session] = None,
+        pool_connections: int = 10, pool_maxsize: int = 10
+    ):
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        return self.session.request(method, url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+# seconds taken by the last connection established in the current thread
+_connect_time = threading.local()
+
+
+class _TimedConnection(object):
+    """Mixin for :mod:`urllib3` connections timing connection setup."""
+
+    def connect(self) -> None:
+        start = time.monotonic()
+        super().connect()  # type: ignore
+        _connect_time.value = time.monotonic() - start
+
+
+class _HTTPConnection(_TimedConnection, urllib3.connection.HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_TimedConnection, urllib3.connection.HTTPSConnection):
+    pass
+
+
+class _HTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+
+class _HTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+
+class Urllib3Transport(Transport):
+    """Transport using :mod:`urllib3` directly.
+
+    Skips the per-request overhead of :mod:`requests` (hooks, cookie and
+    redirect handling) while keeping connections alive. Redirects are not
+    followed. Connection setup, including the TLS handshake, is timed.
+
+    Args:
+        maxsize: Number of connections to keep per host; should be at least
+            the number of concurrent requests.
+        **kwargs: Keyword arguments for :class:`urllib3.PoolManager`, e.g.
+            `ca_certs`.
+    """
+
+    def __init__(self, maxsize: int = 10, **kwargs: Any):
+        self.pool = urllib3.PoolManager(
+            maxsize=maxsize, retries=False, **kwargs)
+        self.pool.pool_classes_by_scheme = {
+            "http": _HTTPConnectionPool, "https": _HTTPSConnectionPool}
+
+    def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        exceptions = urllib3.exceptions
+        connect, read = _split_timeout(kwargs.get("timeout"))
+        url = _request_url(url, kwargs.get("params"))
+        data = kwargs.get("data")
+        _connect_time.value = 0.0
+        start = time.monotonic()
+        try:
+            response = self._urlopen(
+                method.upper(), url, headers=_request_headers(kwargs),
+                body=data.encode() if isinstance(data, str) else data,
+                timeout=urllib3.Timeout(connect=connect, read=read),
+                redirect=False)
+        except exceptions.NewConnectionError as exc:
+            raise requests.exceptions.ConnectionError(exc)
+        except exceptions.ConnectTimeoutError as exc:
+            raise requests.exceptions.ConnectTimeout(exc)
+        except exceptions.ReadTimeoutError as exc:
+            raise requests.exceptions.ReadTimeout(exc)
+        except exceptions.SSLError as exc:
+            raise requests.exceptions.SSLError(exc)
+        except exceptions.HTTPError as exc:
+            raise requests.exceptions.ConnectionError(exc)
+        return build_response(
+            response.status, response.data, url, headers=response.headers,
+            reason=response.reason, elapsed=time.monotonic() - start,
+            connect_time=_connect_time.value)
+
+    def _urlopen(
+        self, method: str, url: str, **kwargs: Any
+    ) -> urllib3.response.HTTPResponse:
+        return self.pool.request(method, url, **kwargs)
+
+    def close(self) -> None:
+        self.pool.clear()
+
+
+class _UnixHTTPConnection(_HTTPConnection):
+    """HTTP connection over a Unix domain socket."""
+
+    def __init__(self, *args: Any, socket_path: str, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)  # type: ignore
+        try:
+            sock.connect(self.socket_path)
+        except socket.timeout as exc:
+            sock.close()
+            raise urllib3.exceptions.ConnectTimeoutError(
+                self, f"Connection to {self.socket_path} timed out") from exc
+        except OSError as exc:
+            sock.close()
+            raise urllib3.exceptions.NewConnectionError(
+                self, f"Failed to connect to {self.socket_path}: {exc}"
+            ) from exc
+        return sock
+
+
+class _UnixHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    """Connection pool of HTTP connections over a Unix domain socket.
+
+    The socket path is passed on to each new connection as an extra
+    connection keyword argument.
+    """
+
+    ConnectionCls = _UnixHTTPConnection
+
+    def __init__(self, socket_path: str, **kwargs: Any):
+        super().__init__("localhost", socket_path=socket_path, **kwargs)
+
+
+class UnixSocketTransport(Urllib3Transport):
+    """Transport for `http+unix://` URLs, via :mod:`urllib3`.
+
+    Talks HTTP over Unix domain sockets, e.g. to a TES server on the same
+    host, skipping the TCP stack. The socket path is given percent-encoded
+    as the host of the URL, e.g. `http+unix://%2Fvar%2Frun%2Ftes.sock` for
+    `/var/run/tes.sock`. `HTTPClient` uses this transport by default for
+    such URLs. Other URLs are passed on to :mod:`urllib3` as usual.
+
+    Args:
+        maxsize: Number of connections to keep per socket.
+        **kwargs: Keyword arguments for :class:`urllib3.PoolManager`.
+    """
+
+    def __init__(self, maxsize: int = 10, **kwargs: Any):
+        super().__init__(maxsize=maxsize, **kwargs)
+        self.maxsize = maxsize
+        self.unix_pools: Dict[str, _UnixHTTPConnectionPool] = {}
+        self._lock = threading.Lock()
+
+    def _urlopen(
+        self, method: str, url: str, **kwargs: Any
+    ) -> urllib3.response.HTTPResponse:
+        parsed = urlparse(url)
+        if parsed.scheme != "http+unix":
+            return super()._urlopen(method, url, **kwargs)
+        socket_path = unquote(parsed.netloc)
+        with self._lock:
+            pool = self.unix_pools.get(socket_path)
+            if pool is None:
+                pool = self.unix_pools[socket_path] = \
+                    _UnixHTTPConnectionPool(
+                        socket_path, maxsize=self.maxsize, retries=False)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        return pool.request(method, path, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            for pool in self.unix_pools.values():
+                pool.close()
+            self.unix_pools.clear()
+        super().close()
+
+
+class HttpxTransport(Transport):
+    """Transport using :mod:`httpx`, optionally over HTTP/2.
+
+    Over HTTP/2, concurrent requests to a host are multiplexed over a single
+    connection instead of each needing a connection of its own, e.g. for
+    many concurrent `get_task()` polls through one gateway.
+
+    Over HTTP/2, requests to the same origin open their streams one at a
+    time: `httpcore` assigns stream IDs before taking the connection's write
+    lock, so concurrent requests could otherwise send their headers out of
+    order, which servers reject as a protocol error. Requests to other
+    origins, and to origins speaking HTTP/1.1, are not held up.
+
+    Connection setup, including the TLS handshake, is timed through the
+    `trace` extension of :mod:`httpx`.
+
+    Requires the `httpx` package, and `h2` for HTTP/2 (`httpx[http2]`),
+    e.g. installed with `pip install py-tes[http2]`.
+
+    Args:
+        http2: Negotiate HTTP/2 with servers supporting it, via TLS ALPN for
+            `https` URLs; `http` URLs keep using HTTP/1.1.
+        http2_prior_knowledge: Speak HTTP/2 right away, without negotiation,
+            also over `http` URLs (h2c), e.g. to a local gateway or sidecar
+            known to support it. Implies `http2`.
+        max_connections: Largest number of connections in the pool; no
+            limit if `None`.
+        max_keepalive_connections: Largest number of idle connections kept
+            alive in the pool; no limit if `None`.
+        **kwargs: Keyword arguments for :class:`httpx.Client`, e.g.
+            `verify` or `limits`.
+
+    Raises:
+        ImportError: If `httpx` (or `h2`, for HTTP/2) is not installed.
+    """
+
+    def __init__(
+        self, http2: bool = False, http2_prior_knowledge: bool = False,
+        max_connections: Optional[int] = 100,
+        max_keepalive_connections: Optional[int] = 20, **kwargs: Any
+    ):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError(
+                "HttpxTransport requires the 'httpx' package")
+        self._httpx = httpx
+        if http2_prior_knowledge:
+            http2 = True
+            kwargs["http1"] = False
+        kwargs.setdefault("limits", httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections))
+        self.client = httpx.Client(http2=http2, **kwargs)
+        self.http2 = http2
+        self.http2_prior_knowledge = http2_prior_knowledge
+        # origin -> lock held from sending a request until its headers have
+        # been sent, for origins that may speak HTTP/2
+        self._opening: Dict[Tuple[str, str], threading.Lock] = {}
+        # origins that negotiated HTTP/1.1
+        self._http1: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def _opening_lock(
+        self, origin: Tuple[str, str]
+    ) -> Optional[threading.Lock]:
+        """Lock for opening streams to an origin, if it may speak HTTP/2."""
+        scheme = origin[0]
+        if not self.http2 or (
+                scheme != "https" and not self.http2_prior_knowledge):
+            return None
+        with self._lock:
+            if origin in self._http1:
+                return None
+            return self._opening.setdefault(origin, threading.Lock())
+
+    def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        httpx = self._httpx
+        connect, read = _split_timeout(kwargs.get("timeout"))
+        parsed = urlparse(url)
+        origin = (parsed.scheme, parsed.netloc)
+        opening = self._opening_lock(origin)
+        held = [False]
+        times: Dict[str, float] = {}
+
+        def trace(name: str, info: Dict[str, Any]) -> None:
+            if name.startswith(("connection.connect_",
+                                "connection.start_tls.")):
+                # connection setup: TCP or Unix socket connect, TLS handshake
+                phase = name.rsplit(".", 1)[-1]
+                if phase == "complete" or "started" not in times:
+                    times[phase] = time.monotonic()
+            elif held[0] and name.endswith("send_request_headers.complete"):
+                held[0] = False
+                opening.release()  # type: ignore
+
+        if opening is not None:
+            opening.acquire()
+            held[0] = True
+        try:
+            response = self.client.request(
+                method.upper(), url, params=kwargs.get("params"),
+                headers=_request_headers(kwargs), content=kwargs.get("data"),
+                timeout=httpx.Timeout(read, connect=connect),
+                extensions={"trace": trace})
+        except (httpx.ConnectTimeout, httpx.PoolTimeout) as exc:
+            raise requests.exceptions.ConnectTimeout(exc)
+        except httpx.TimeoutException as exc:
+            raise requests.exceptions.ReadTimeout(exc)
+        except httpx.TransportError as exc:
+            raise requests.exceptions.ConnectionError(exc)
+        finally:
+            if held[0]:
+                held[0] = False
+                opening.release()  # type: ignore
+        if opening is not None and response.http_version != "HTTP/2":
+            with self._lock:
+                self._http1.add(origin)
+        return build_response(
+            response.status_code, response.content, str(response.url),
+            headers=dict(response.headers), reason=response.reason_phrase,
+            elapsed=response.elapsed.total_seconds(),
+            connect_time=times.get("complete", 0.0) -
+            times.get("started", 0.0))
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    """Open a recording, compressed with gzip if `path` ends in `.gz`."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")  # type: ignore
+    return open(path, mode, encoding="utf-8")
+
+
+class RecordingTransport(Transport):
+    """Transport recording all exchanges of another transport to a file.
+
+    Each request is appended to `path` as one line of JSON with the method,
+    URL, request body, and either the status code, headers, body and
+    latency of the response, or the type and message of the exception
+    raised. Files ending in `.gz` are compressed. Replay recordings with
+    `ReplayTransport`.
+
+    Credentials are not recorded, as headers of requests are left out.
+
+    Args:
+        path: File to append to.
+        transport: Transport to record; `RequestsTransport` if `None`.
+    """
+
+    def __init__(self, path: str, transport: Optional[Transport] = None):
+        self.path = path
+        self.transport = transport or DEFAULT_TRANSPORT
+        self._file = _open(path, "a")
+        self._lock = threading.Lock()
+
+    def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        record: Dict[str, Any] = {
+            "method": method.lower(),
+            "url": _request_url(url, kwargs.get("params")),
+            "body": _request_body(kwargs.get("data")),
+        }
+        start = time.monotonic()
+        try:
+            response = self.transport.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as exc:
+            record["elapsed"] = time.monotonic() - start
+            record["error"] = type(exc).__name__
+            record["message"] = str(exc)
+            self._write(record)
+            raise
+        record["elapsed"] = time.monotonic() - start
+        record["status"] = response.status_code
+        record["reason"] = response.reason
+        # the content is recorded decoded
+        record["headers"] = {
+            k: v for k, v in response.headers.items()
+            if k.lower() not in ("content-encoding", "transfer-encoding")
+        }
+        try:
+            record["content"] = response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            record["content_base64"] = \
+                base64.b64encode(response.content).decode()
+        self._write(record)
+        return response
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+        self.transport.close()
+
+
+class ReplayTransport(Transport):
+    """Transport answering requests from a recording.
+
+    Requests are matched to recorded exchanges by method, URL (including
+    query parameters) and body. Repeated requests get the recorded responses
+    in order; once these are used up, the last one is returned again, e.g.
+    to benchmark the same calls many times over.
+
+    Args:
+        path: Recording made with `RecordingTransport`.
+        speed: Replay the recorded latency of each response divided by
+            `speed`, e.g. `1` for the original timing or `10` for a ten
+            times faster replay. Responses are returned immediately if
+            `None`.
+
+    Raises:
+        ValueError: If `speed` is not positive.
+    """
+
+    def __init__(self, path: str, speed: Optional[float] = None):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive")
+        self.path = path
+        self.speed = speed
+        self._exchanges: Dict[Tuple[str, str, Optional[str]],
+                              List[Dict[str, Any]]] = {}
+        self._served: Dict[Tuple[str, str, Optional[str]], int] = {}
+        self._lock = threading.Lock()
+        with _open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                key = (record["method"], record["url"], record["body"])
+                self._exchanges.setdefault(key, []).append(record)
+
+    def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        key = (
+            method.lower(), _request_url(url, kwargs.get("params")),
+            _request_body(kwargs.get("data")),
+        )
+        with self._lock:
+            records = self._exchanges.get(key)
+            if not records:
+                raise ReplayError(
+                    f"No recorded response for {method.upper()} {key[1]}")
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+        record = records[min(index, len(records) - 1)]
+        if self.speed is not None:
+            time.sleep(record["elapsed"] / self.speed)
+        if "error" in record:
+            exc_type = getattr(requests.exceptions, record["error"], None)
+            if not (isinstance(exc_type, type) and issubclass(
+                    exc_type, requests.exceptions.RequestException)):
+                exc_type = requests.exceptions.RequestException
+            raise exc_type(record["message"])
+        if "content_base64" in record:
+            content = base64.b64decode(record["content_base64"])
+        else:
+            content = record.get("content", "").encode("utf-8")
+        return build_response(
+            record["status"], content, key[1], headers=record.get("headers"),
+            reason=record.get("reason"), elapsed=record["elapsed"])
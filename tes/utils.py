@@ -2,6 +2,9 @@
 
 import json
 import re
+import requests
+import sys
+import urllib3
 
 from typing import Any, Dict, Type
 
@@ -37,6 +40,52 @@ class TimeoutError(Exception):
         Exception.__init__(self, *args, **kwargs)
 
 
+class NoResponseError(requests.exceptions.HTTPError):
+    """Raised when none of the paths of an endpoint returned a response.
+
+    Attributes:
+        exceptions: Exceptions raised by :mod:`requests`, keyed by path.
+    """
+    def __init__(self, *args, exceptions=None, **kwargs):
+        requests.exceptions.HTTPError.__init__(self, *args, **kwargs)
+        self.exceptions: Dict[str, Exception] = exceptions or {}
+
+
+class ReplayError(requests.exceptions.ConnectionError):
+    """Raised when a replayed request has no recorded response."""
+
+
+def never_connected(exc: Exception) -> bool:
+    """Whether a request failed before a connection was established.
+
+    Only then is it certain that the server did not receive the request:
+    :mod:`requests` also raises `ConnectionError` if the connection is
+    aborted after the request was sent.
+
+    Args:
+        exc: Exception raised for the request; for `NoResponseError`, all
+            exceptions raised for its paths are checked.
+
+    Returns:
+        `True` if the connection timed out or could not be established.
+    """
+    if isinstance(exc, NoResponseError):
+        return bool(exc.exceptions) and all(
+            never_connected(e) for e in exc.exceptions.values())
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(exc, requests.exceptions.ConnectionError):
+        return False
+    cause = exc.args[0] if exc.args else None
+    if isinstance(cause, urllib3.exceptions.MaxRetryError):
+        cause = cause.reason
+    if isinstance(cause, urllib3.exceptions.NewConnectionError):
+        return True
+    # raised by `tes.transport.HttpxTransport`
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(cause, httpx.ConnectError)
+
+
 def unmarshal(j: Any, o: Type, convert_camel_case=True) -> Any:
     """Unmarshal a JSON string to a TES model.
 
@@ -0,0 +1,267 @@
+"""Runner for workflows of TES tasks with dependencies."""
+
+import json
+import os
+import queue
+import time
+
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from tes.models import Task
+from tes.utils import TimeoutError
+
+
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+COMPLETE = "COMPLETE"
+FAILED = "FAILED"
+SKIPPED = "SKIPPED"
+
+
+class Node(object):
+    """Task of a workflow and its progress.
+
+    Attributes:
+        name: Name of the node, unique within its workflow.
+        task: Task to create.
+        parents: Names of the nodes that must complete first.
+        retries: Number of times to create the task again if it fails.
+        status: `PENDING`, `RUNNING`, `COMPLETE`, `FAILED` or `SKIPPED`
+            (after a parent failed).
+        task_id: ID of the last task created for the node.
+        attempts: Number of tasks created for the node.
+        result: Last task in its final state, in `MINIMAL` view.
+        error: Error raised while creating or polling the last task.
+    """
+
+    def __init__(
+        self, name: str, task: Task, parents: List[str], retries: int
+    ):
+        self.name = name
+        self.task = task
+        self.parents = parents
+        self.retries = retries
+        self.status = PENDING
+        self.task_id: Optional[str] = None
+        self.attempts = 0
+        self.result: Optional[Task] = None
+        self.error: Optional[BaseException] = None
+
+
+class Workflow(object):
+    """Directed acyclic graph of tasks, run with bounded parallelism.
+
+    Nodes are added with their dependencies, parents first::
+
+        workflow = Workflow(client, max_parallel=16, state_path="run.json")
+        workflow.add("align", align_task)
+        workflow.add("call", call_task, after=["align"], retries=2)
+        workflow.run()
+
+    `run()` creates the task of a node as soon as all of its parents have
+    completed, with up to `max_parallel` tasks in flight; completion is
+    observed through the client's shared poller (see `HTTPClient.poller`).
+    A node whose task does not complete, i.e., ends in another final state
+    or cannot be created or polled, is retried up to `retries` times, then
+    fails; its descendants are skipped, while independent nodes proceed.
+
+    If `state_path` is set, the progress of all nodes is saved there after
+    each change. Running the same workflow again with the same state path
+    resumes it: completed nodes are not run again, tasks still running are
+    watched instead of created again, and failed and skipped nodes are
+    retried.
+
+    Args:
+        client: `HTTPClient` to create and poll tasks with.
+        max_parallel: Largest number of tasks in flight.
+        state_path: Path of the state file; progress is not saved if
+            `None`.
+
+    Attributes:
+        nodes: Nodes by name, in the order they were added.
+    """
+
+    def __init__(
+        self, client: Any, max_parallel: int = 8,
+        state_path: Optional[str] = None
+    ):
+        if max_parallel < 1:
+            raise ValueError("max_parallel must be at least 1")
+        self.client = client
+        self.max_parallel = max_parallel
+        self.state_path = state_path
+        self.nodes: Dict[str, Node] = {}
+        self._children: Dict[str, List[Node]] = {}
+        self._waiting: Dict[str, int] = {}
+        self._ready: Deque[Node] = deque()
+
+    def add(
+        self, name: str, task: Task, after: Iterable[str] = (),
+        retries: int = 0
+    ) -> Node:
+        """Add a node.
+
+        Args:
+            name: Name of the node.
+            task: `tes.models.Task` instance to create for the node.
+            after: Names of the nodes that must complete first; they must
+                have been added already.
+            retries: Number of times to create the task again if it fails.
+
+        Returns:
+            The node.
+
+        Raises:
+            TypeError: If `task` is not a `tes.models.Task` instance.
+            ValueError: If a node with the same name exists, or a parent
+                does not.
+        """
+        if not isinstance(task, Task):
+            raise TypeError("Expected Task instance")
+        if name in self.nodes:
+            raise ValueError(f"Duplicate node: {name}")
+        parents = list(after)
+        for parent in parents:
+            if parent not in self.nodes:
+                raise ValueError(f"Unknown parent node: {parent}")
+        node = self.nodes[name] = Node(name, task, parents, retries)
+        self._children[name] = []
+        for parent in parents:
+            self._children[parent].append(node)
+        return node
+
+    def run(self, timeout: Optional[float] = None) -> bool:
+        """Run the workflow until all nodes have completed, failed or been
+        skipped.
+
+        Args:
+            timeout: Time budget in seconds; no limit if `None`. Tasks still
+                running when it is exceeded are left running, and are
+                resumed by the next run if `state_path` is set.
+
+        Returns:
+            Whether all nodes have completed.
+
+        Raises:
+            tes.utils.TimeoutError: If the workflow has not finished before
+                `timeout` has passed.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        done: "queue.Queue[Tuple[Node, Future]]" = queue.Queue()
+        self._load()
+        running = 0
+        for node in self.nodes.values():
+            if node.status in (FAILED, SKIPPED):
+                node.status = PENDING
+                node.attempts = 0
+            elif node.status == RUNNING:
+                # resume a task left running
+                self._watch(node, done)
+                running += 1
+        self._waiting = {
+            node.name: sum(
+                self.nodes[parent].status != COMPLETE
+                for parent in node.parents)
+            for node in self.nodes.values()
+        }
+        self._ready = deque(
+            node for node in self.nodes.values()
+            if node.status == PENDING and not self._waiting[node.name])
+        while True:
+            while self._ready and running < self.max_parallel:
+                self._submit(self._ready.popleft(), done)
+                running += 1
+            if not running:
+                break
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Workflow not finished; {running} tasks running")
+            try:
+                node, future = done.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            running -= 1
+            self._finish(node, future)
+        return all(node.status == COMPLETE for node in self.nodes.values())
+
+    def _submit(self, node: Node, done: "queue.Queue") -> None:
+        """Create the task of a node and watch it."""
+        node.status = RUNNING
+        node.attempts += 1
+        node.error = None
+        try:
+            node.task_id = self.client.create_task(node.task)
+        except Exception as exc:
+            future: Future = Future()
+            future.set_exception(exc)
+            done.put((node, future))
+            return
+        self._save()
+        self._watch(node, done)
+
+    def _watch(self, node: Node, done: "queue.Queue") -> None:
+        future = self.client._poller().watch(self.client, node.task_id)
+        future.add_done_callback(lambda future: done.put((node, future)))
+
+    def _finish(self, node: Node, future: Future) -> None:
+        """Record the outcome of a node's task."""
+        try:
+            node.result = future.result()
+        except Exception as exc:
+            node.result = None
+            node.error = exc
+        if node.result is not None and node.result.state == COMPLETE:
+            node.status = COMPLETE
+            for child in self._children[node.name]:
+                self._waiting[child.name] -= 1
+                if not self._waiting[child.name] and child.status == PENDING:
+                    self._ready.append(child)
+        elif node.attempts <= node.retries:
+            node.status = PENDING
+            self._ready.append(node)
+        else:
+            node.status = FAILED
+            self._skip(node)
+        self._save()
+
+    def _skip(self, failed: Node) -> None:
+        """Skip the pending descendants of a failed node."""
+        stack = list(self._children[failed.name])
+        while stack:
+            node = stack.pop()
+            if node.status == PENDING:
+                node.status = SKIPPED
+                stack.extend(self._children[node.name])
+
+    def _load(self) -> None:
+        """Restore progress from the state file."""
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return
+        with open(self.state_path) as f:
+            state = json.load(f)
+        for name, saved in state.get("nodes", {}).items():
+            node = self.nodes.get(name)
+            if node is None or node.status != PENDING:
+                continue
+            node.status = saved["status"]
+            node.task_id = saved["task_id"]
+            node.attempts = saved["attempts"]
+
+    def _save(self) -> None:
+        """Save progress to the state file, atomically."""
+        if self.state_path is None:
+            return
+        state = {"nodes": {
+            node.name: {"status": node.status, "task_id": node.task_id,
+                        "attempts": node.attempts}
+            for node in self.nodes.values()
+        }}
+        temp = self.state_path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(state, f)
+        os.replace(temp, self.state_path)
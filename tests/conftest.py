@@ -0,0 +1,43 @@
+import pytest
+
+from tes.client import HTTPClient
+from tes.models import Executor, Task
+from tes.testing import FakeTES, InMemoryTransport
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "fake_api(**kwargs): keyword arguments for the FakeTES "
+        "instance of the fake_api fixture")
+
+
+@pytest.fixture
+def build_task():
+    """Factory of small tasks, e.g. `build_task("false", name="x")`.
+
+    Positional arguments are the executor's command (`echo hello` if none
+    are given); keyword arguments are passed on to `Task`.
+    """
+    def build(*command, **kwargs):
+        command = list(command) or ["echo", "hello"]
+        return Task(executors=[Executor(image="alpine", command=command)],
+                    **kwargs)
+    return build
+
+
+@pytest.fixture
+def task(build_task):
+    return build_task()
+
+
+@pytest.fixture
+def fake_api(request):
+    """In-memory fake TES API, configured with the `fake_api` marker."""
+    marker = request.node.get_closest_marker("fake_api")
+    return FakeTES(**(marker.kwargs if marker else {}))
+
+
+@pytest.fixture
+def fake_client(fake_api):
+    """Client talking to `fake_api` in memory."""
+    return HTTPClient("http://fake", transport=InMemoryTransport(fake_api))
@@ -0,0 +1,134 @@
+import pytest
+import requests
+import time
+
+from concurrent.futures import wait
+
+from tes.admission import ADMISSION_TAG, AdmissionController
+from tes.futures import TaskPoller
+from tes.models import Task
+
+
+@pytest.fixture
+def fake_client(fake_client):
+    fake_client.poller = TaskPoller(interval=0.02)
+    return fake_client
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 0.1})
+def test_max_in_flight(build_task, fake_api, fake_client):
+    with AdmissionController(fake_client, max_in_flight=5) as admission:
+        futures = [admission.submit(build_task()) for _ in range(20)]
+        peak = 0
+        while not all(f.done() for f in futures):
+            peak = max(peak, admission.in_flight())
+            assert len(fake_api.tasks) - sum(f.done() for f in futures) <= 5
+            time.sleep(0.01)
+    assert peak == 5
+    assert all(f.result().state == "COMPLETE" for f in futures)
+    assert all(f.task_id in fake_api.tasks for f in futures)
+    assert admission.in_flight() == 0 and admission.pending() == 0
+    with pytest.raises(RuntimeError):
+        admission.submit(build_task())
+    with pytest.raises(TypeError):
+        admission.submit("task")  # type: ignore
+    with pytest.raises(ValueError):
+        AdmissionController(fake_client, max_in_flight=0)
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 0.1})
+def test_priorities(build_task, fake_api, fake_client):
+    admission = AdmissionController(fake_client, max_in_flight=1)
+    order = []
+    first = admission.submit(build_task(name="first"))
+    _wait_for(lambda: admission.in_flight() == 1)
+    futures = [first] + [
+        admission.submit(build_task(name=name), priority=priority)
+        for name, priority in [("low", 0), ("high", 10), ("medium", 5),
+                               ("dropped", 10), ("low2", 0)]
+    ]
+    for future in futures:
+        future.add_done_callback(
+            lambda f: order.append(
+                f.task_id and fake_api.tasks[f.task_id]["name"]))
+    assert futures[4].cancel()
+    assert admission.pending() == 5
+    admission.shutdown()
+    wait(futures, timeout=5)
+    assert order == [None, "first", "high", "medium", "low", "low2"]
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 60})
+def test_cancel(build_task, fake_api, fake_client):
+    admission = AdmissionController(fake_client, max_in_flight=1)
+    running = admission.submit(build_task())
+    _wait_for(lambda: running.task_id is not None)
+    pending = admission.submit(build_task())
+    assert running.cancel()
+    _wait_for(lambda: pending.task_id is not None)
+    assert fake_api.tasks[running.task_id]["state"] == "CANCELED"
+    dropped = admission.submit(build_task())
+    admission.shutdown(cancel_pending=True)
+    assert dropped.cancelled()
+    assert pending.cancel()
+    assert len(fake_api.tasks) == 2
+
+
+def test_create_error(build_task, fake_api, fake_client):
+    fake_api.inject_error(400, route="/tasks", method="POST")
+    with AdmissionController(fake_client, max_in_flight=1) as admission:
+        failed = admission.submit(build_task())
+        created = admission.submit(build_task())
+        with pytest.raises(requests.exceptions.HTTPError):
+            failed.result(timeout=5)
+        assert created.result(timeout=5).state == "COMPLETE"
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 60})
+def test_reconcile(build_task, fake_api, fake_client):
+    # tasks of other clients do not count
+    for _ in range(5):
+        fake_api.add_task(build_task())
+    tags = {ADMISSION_TAG: "run-1"}
+    others = [fake_api.add_task(build_task(tags=tags)) for _ in range(3)]
+    fake_api.add_task(Task(state="COMPLETE", tags=tags))
+    admission = AdmissionController(
+        fake_client, max_in_flight=3, client_id="run-1",
+        reconcile_interval=0.05, scan_page_size=2)
+    # no counts while idle
+    time.sleep(0.1)
+    assert ("GET", "/tasks") not in fake_api.requests
+    future = admission.submit(build_task())
+    _wait_for(lambda: admission.server_in_flight == 3)
+    # failed counts keep the last one
+    counts = fake_api.requests[("GET", "/tasks")]
+    fake_api.inject_error(400, route="/tasks", method="GET")
+    _wait_for(lambda: fake_api.requests[("GET", "/tasks")] > counts)
+    time.sleep(0.1)
+    assert future.task_id is None
+    assert admission.reconcile() == 3
+    for task_id in others:
+        fake_client.cancel_task(task_id)
+    _wait_for(lambda: future.task_id is not None)
+    assert fake_api.tasks[future.task_id]["tags"] == tags
+    admission.shutdown()
+    assert future.cancel()
+
+
+@pytest.mark.fake_api(latency=0.1, state_durations={"RUNNING": 60})
+def test_cancel_while_creating(build_task, fake_api, fake_client):
+    with AdmissionController(fake_client, max_in_flight=1) as admission:
+        future = admission.submit(build_task())
+        _wait_for(lambda: admission.in_flight() == 1)
+        assert future.cancel()
+        assert admission.in_flight() == 0
+        _wait_for(lambda: future.task_id is not None)
+        _wait_for(lambda: fake_api.tasks[future.task_id]["state"] ==
+                  "CANCELED")
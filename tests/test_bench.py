@@ -0,0 +1,86 @@
+import json
+import pytest
+
+from tes.bench import Workload, format_report, main, percentile
+from tes.client import HTTPClient
+from tes.testing import FakeTES, FakeTESServer
+
+
+def test_percentile():
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile([], 0.5) is None
+    assert percentile(samples, 0.5) == 50
+    assert percentile(samples, 0.99) == 99
+    assert percentile(samples, 0.999) == 100
+    assert percentile(samples, 0) == 1
+
+
+def test_workload():
+    api = FakeTES()
+    api.inject_error(500, route="/tasks", method="GET")
+    with FakeTESServer(api) as server:
+        cli = HTTPClient(server.url)
+        workload = Workload(cli, create_rate=20, poll_rate=50, list_rate=0,
+                            concurrency=2)
+        report = workload.run(0.5)
+    create = report["endpoints"]["create_task"]
+    assert create["requests"] == 10
+    assert create["throughput"] > 0
+    assert create["latency"]["p50"] <= create["latency"]["max"]
+    assert report["endpoints"]["list_tasks"]["requests"] == 0
+    # polls only start once tasks were created
+    polls = report["endpoints"]["get_task"]
+    assert polls["requests"] + polls["skipped"] == 25
+    assert api.requests[("GET", "/tasks")] == 1
+
+    text = format_report(report)
+    assert "create_task" in text
+    assert "list_tasks" not in text
+
+    api = FakeTES(prefix="/v1")
+    api.inject_error(503, route="/tasks/{id}", count=1000)
+    with FakeTESServer(api) as server:
+        cli = HTTPClient([server.url, server.url])
+        report = Workload(cli, poll_rate=20, concurrency=1).run(0.3)
+    assert report["endpoints"]["get_task"]["errors"] > 0
+    assert f"{server.url}, {server.url}" in format_report(report)
+
+
+def test_main(capsys, tmp_path):
+    output = tmp_path / "report.json"
+    assert main(["--fake", "-d", "0.3", "--format", "json",
+                 "-o", str(output)]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report == json.loads(output.read_text())
+    assert set(report["endpoints"]) == {
+        "create_task", "get_task", "list_tasks"}
+
+    assert main(["--fake", "-d", "0.1", "--list-rate", "0",
+                 "--transport", "session"]) == 0
+    out = capsys.readouterr().out
+    assert "p999" in out
+    assert "(SessionTransport)" in out
+
+    assert main(["--fake", "--fake-unix", "-d", "0.1"]) == 0
+    assert "(UnixSocketTransport)" in capsys.readouterr().out
+
+
+def test_main_no_service_info(capsys):
+    api = FakeTES()
+    api.inject_error(404, route="/service-info")
+    with FakeTESServer(api) as server:
+        assert main([server.url, "-d", "0.1", "--list-rate", "0"]) == 0
+    assert "get_task" in capsys.readouterr().out
+    assert api.requests[("GET", "/service-info")] == 1
+
+
+def test_main_h2c(capsys):
+    pytest.importorskip("h2")
+    pytest.importorskip("httpx")
+    # the fake server speaks h2c without --fake-http2
+    assert main(["--fake", "-d", "0.1", "--transport", "httpx-h2c"]) == 0
+    out = capsys.readouterr().out
+    assert "(HttpxTransport)" in out
+    row = next(line for line in out.splitlines()
+               if line.startswith("create_task")).split()
+    assert int(row[1]) > 0 and row[2] == "0"
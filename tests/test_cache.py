@@ -0,0 +1,97 @@
+import pytest
+import requests
+
+from tes.cache import CACHE_TAG, CallCache, task_key
+from tes.metrics import MetricsRegistry
+from tes.testing import FINAL_STATE_TAG
+
+
+def test_task_key(build_task, task):
+    key = task_key(task)
+    assert len(key) == 64
+    assert task_key(build_task(name="rerun", tags={"run": "2"}, id="x")) \
+        == key
+    assert task_key(build_task("false")) != key
+
+
+def test_call_cache(fake_api, fake_client, build_task, task):
+    registry = MetricsRegistry()
+    fake_client.hooks.append(registry)
+    cache = CallCache(fake_client)
+    task_id = cache.create_task(build_task(tags={"run": "1"}))
+    assert fake_api.tasks[task_id]["tags"] == {
+        "run": "1", CACHE_TAG: task_key(task)}
+    assert cache.create_task(build_task(name="rerun")) == task_id
+    sent = sum(fake_api.requests.values())
+    # known to be complete now, no requests needed
+    assert cache.create_task(task) == task_id
+    assert sum(fake_api.requests.values()) == sent
+    assert len(fake_api.tasks) == 1
+
+    # tasks created by another run are found on the server
+    other = CallCache(fake_client)
+    assert other.create_task(task) == task_id
+    assert other.lookup(task_key(task)) == task_id
+    assert CallCache(fake_client, server_lookup=False).lookup(task) is None
+    assert other.create_task(build_task("false")) != task_id
+    assert len(fake_api.tasks) == 2
+
+    text = registry.render()
+    assert 'tes_client_cache_requests_total{cache="call",result="hit"} 3' \
+        in text
+    assert 'tes_client_cache_requests_total{cache="call",result="miss"} 2' \
+        in text
+    with pytest.raises(TypeError):
+        cache.create_task("task")  # type: ignore
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 60})
+def test_incomplete_tasks(fake_client, task):
+    cache = CallCache(fake_client)
+    running = cache.create_task(task)
+    assert cache.lookup(task) is None
+    fake_client.cancel_task(running)
+    assert cache.create_task(task) != running
+
+
+@pytest.mark.fake_api(page_size=1)
+def test_failed_tasks(fake_client, build_task):
+    cache = CallCache(fake_client)
+    failed = build_task(tags={FINAL_STATE_TAG: "EXECUTOR_ERROR"})
+    ids = [cache.create_task(failed) for _ in range(2)]
+    assert ids[0] != ids[1]
+    assert CallCache(fake_client).lookup(failed) is None
+    assert CallCache(fake_client, max_scan_pages=1).lookup(failed) is None
+
+
+def test_list_tasks_tags(fake_api, fake_client, build_task):
+    fake_api.add_task(build_task(tags={"a": "1", "b": "2"}, state="COMPLETE"))
+    fake_api.add_task(build_task(tags={"a": "2"}, state="COMPLETE"))
+    assert len(fake_client.list_tasks(tag_key=["a"]).tasks) == 2
+    assert len(fake_client.list_tasks(tag_key=["a"], tag_value=["1"]).tasks) \
+        == 1
+    assert fake_client.list_tasks(tag_key=["a", "b"], tag_value=["2"]).tasks \
+        == []
+
+
+@pytest.mark.fake_api(tag_filters=False)
+def test_unfiltered_server(fake_api, fake_client, build_task, task):
+    # TES 1.0 servers ignore tag filters and list all tasks
+    fake_api.add_task(build_task("other", state="COMPLETE"))
+    assert CallCache(fake_client).lookup(task) is None
+    task_id = CallCache(fake_client).create_task(task)
+    assert CallCache(fake_client).lookup(task) == task_id
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 60})
+def test_purged_task(fake_api, fake_client, task):
+    cache = CallCache(fake_client)
+    task_id = cache.create_task(task)
+    del fake_api.tasks[task_id]
+    fake_api.order.remove(task_id)
+    assert cache.lookup(task) is None
+    task_id = cache.create_task(task)
+    assert task_id in fake_api.tasks
+    fake_api.inject_error(400, route="/tasks/{id}", method="GET")
+    with pytest.raises(requests.exceptions.HTTPError):
+        cache.lookup(task)
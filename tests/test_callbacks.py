@@ -0,0 +1,79 @@
+import requests
+import time
+
+from concurrent.futures import wait
+
+from tes.callbacks import CallbackListener
+from tes.client import HTTPClient
+from tes.futures import TaskPoller
+from tes.models import Executor, Task
+from tes.testing import (CALLBACK_TAG, FINAL_STATE_TAG, FakeTES,
+                         InMemoryTransport)
+
+
+def _task(**tags):
+    return Task(executors=[Executor(image="alpine", command=["true"])],
+                tags=tags)
+
+
+def test_callbacks():
+    api = FakeTES(state_durations={"QUEUED": 0.05, "RUNNING": 0.2})
+    with CallbackListener(fallback_interval=60) as listener:
+        cli = HTTPClient("http://fake", transport=InMemoryTransport(api),
+                         poller=listener.poller)
+        start = time.monotonic()
+        futures = [cli.submit(_task(**{CALLBACK_TAG: listener.url}))
+                   for _ in range(20)]
+        futures.append(cli.submit(_task(**{
+            CALLBACK_TAG: listener.url, FINAL_STATE_TAG: "EXECUTOR_ERROR",
+        })))
+        done, _ = wait(futures, timeout=5)
+        elapsed = time.monotonic() - start
+        assert len(done) == 21
+        assert all(f.result().state == "COMPLETE" for f in futures[:-1])
+        assert futures[-1].result().state == "EXECUTOR_ERROR"
+        assert elapsed < 2
+        # at most one poll per task, when first watched
+        assert api.requests[("GET", "/tasks/{id}")] <= 21
+        assert 21 <= listener.received <= api.callbacks
+
+        canceled = cli.submit(_task(**{CALLBACK_TAG: listener.url}))
+        cli.cancel_task(canceled.task_id)
+        assert canceled.result(timeout=5).state == "CANCELED"
+
+
+def test_fallback_polling():
+    api = FakeTES(state_durations={"RUNNING": 0.1})
+    with CallbackListener(fallback_interval=0.05) as listener:
+        cli = HTTPClient("http://fake", transport=InMemoryTransport(api),
+                         poller=listener.poller)
+        assert cli.submit(_task()).result(timeout=5).state == "COMPLETE"
+        assert listener.received == 0
+
+
+def test_notifications():
+    api = FakeTES()
+    api.add_task({"id": "1", "state": "QUEUED"})
+    cli = HTTPClient("http://fake", transport=InMemoryTransport(api))
+    poller = TaskPoller(interval=60)
+    with CallbackListener(poller) as listener:
+        assert listener.poller is poller
+        future = poller.watch(cli, "1")
+        while future.state is None:  # first poll
+            time.sleep(0.01)
+        assert requests.post(listener.url, json=[
+            {"id": "2", "state": "COMPLETE"},
+            {"id": "1", "state": "RUNNING"},
+        ]).status_code == 204
+        assert future.state == "RUNNING" and not future.done()
+        assert not poller.notify("2", "COMPLETE")
+        assert requests.post(
+            listener.url, json={"id": "1", "state": "COMPLETE"}
+        ).status_code == 204
+        assert future.result(timeout=5).state == "COMPLETE"
+        assert listener.received == 3
+
+        for body in (b"{", b'{"id": "1"}', b'[{"id": 1, "state": "x"}]'):
+            assert requests.post(listener.url, data=body).status_code == 400
+        assert requests.post(
+            listener.url + "/other", json={}).status_code == 404
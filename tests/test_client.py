@@ -1,18 +1,24 @@
 import pytest
 import requests
 import requests_mock
+import threading
+import time
+import urllib3
 import uuid
 
-from tes.client import append_suffixes_to_url, HTTPClient, send_request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from tes.client import (append_suffixes_to_url, cap_timeout, HTTPClient,
+                        probe_paths, send_request)
+from tes.hedging import HedgePolicy
+from tes.instrumentation import Hooks
 from tes.models import Task, Executor
+from tes.testing import InMemoryTransport
 from tes.utils import TimeoutError
 
 
-@pytest.fixture
-def task():
-    return Task(executors=[Executor(image="alpine", command=["echo", "hello"])])
-
-
 @pytest.fixture
 def mock_id():
     return str(uuid.uuid4())
@@ -214,6 +220,10 @@ def test_request_params():
     assert vals["data"] == '{"json": "string"}'
     assert vals["params"] == {"query_param": "value"}
 
+    cli = HTTPClient(url="http://fakehost:8000", timeout=5, connect_timeout=2)
+    vals = cli._request_params()
+    assert vals["timeout"] == (2, 5)
+
 
 def test_append_suffixes_to_url():
     urls = ["http://example.com", "http://example.com/"]
@@ -314,3 +324,339 @@ def test_send_request():
         with pytest.raises(requests.HTTPError):
             send_request(paths=paths)
         assert m.last_request.url == f"{mock_url}/suffix/foo"
+
+
+def test_cap_timeout():
+    assert cap_timeout(None, 2) == 2
+    assert cap_timeout(5, 2) == 2
+    assert cap_timeout(1, 2) == 1
+    assert cap_timeout((3, 10), 5) == (3, 5)
+
+
+def test_send_request_deadline():
+    mock_url = "http://example.com"
+    mock_urls = append_suffixes_to_url([mock_url], ["/suffix", "/"])
+
+    # deadline already passed
+    with requests_mock.Mocker() as m:
+        m.get(requests_mock.ANY, status_code=200)
+        with pytest.raises(TimeoutError):
+            send_request(paths=mock_urls, deadline=time.monotonic() - 1)
+        assert m.call_count == 0
+
+    # per-attempt timeout capped to remaining budget
+    with requests_mock.Mocker() as m:
+        m.get(requests_mock.ANY, status_code=200)
+        send_request(paths=mock_urls, kwargs_requests={"timeout": (10, 10)},
+                     deadline=time.monotonic() + 2)
+        connect, read = m.last_request.timeout
+        assert connect <= 2 and read <= 2
+
+    # budget spent on failing fallbacks
+    def slow_timeout(request, context):
+        time.sleep(0.2)
+        raise requests.exceptions.ReadTimeout
+
+    with requests_mock.Mocker() as m:
+        m.get(requests_mock.ANY, text=slow_timeout)
+        with pytest.raises(TimeoutError):
+            send_request(paths=mock_urls, deadline=time.monotonic() + 0.3)
+        assert m.call_count == 2
+
+
+def test_timeout_total(mock_id, mock_url):
+    cli = HTTPClient(mock_url, timeout=5, connect_timeout=1, timeout_total=2)
+    with requests_mock.Mocker() as m:
+        m.get(
+            f"{mock_url}/ga4gh/tes/v1/tasks/{mock_id}",
+            status_code=200,
+            json={"id": mock_id, "state": "RUNNING"},
+        )
+        cli.get_task(mock_id)
+        connect, read = m.last_request.timeout
+        assert connect <= 1 and read <= 2
+
+        cli.get_task(mock_id, timeout_total=0.5)
+        assert m.last_request.timeout[1] <= 0.5
+
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            cli.wait(mock_id)
+        assert time.monotonic() - start < 3
+
+    with pytest.raises(TypeError):
+        HTTPClient(mock_url, timeout_total="2")  # type: ignore
+
+
+@pytest.fixture
+def local_server():
+    """Threaded local HTTP server answering `GET` requests from a route map.
+
+    Routes map paths to `(status_code, body, delay)` tuples; unknown paths
+    return 404. Used instead of `requests_mock` where requests are sent from
+    several threads at once.
+    """
+    routes = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, body, delay = routes.get(
+                self.path.split("?")[0], (404, "", 0))
+            time.sleep(delay)
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.routes = routes
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_probe_paths(local_server):
+    routes = local_server.routes
+    paths = append_suffixes_to_url([local_server.url], ["/a", "/b", "/c"])
+
+    # preference order is respected even if later paths answer first
+    routes.update({"/a": (200, "a", 0.2), "/b": (200, "b", 0),
+                   "/c": (200, "c", 0)})
+    start = time.monotonic()
+    index, response = probe_paths(paths=paths)
+    assert index == 0
+    assert response.text == "a"
+    assert time.monotonic() - start < 0.4
+
+    # 404 falls through to the next path
+    routes.update({"/a": (404, "", 0), "/b": (404, "", 0.1)})
+    index, response = probe_paths(paths=paths)
+    assert index == 2
+    assert response.text == "c"
+
+    # first non-404 status code is decisive
+    routes.update({"/b": (500, "", 0)})
+    with pytest.raises(requests.HTTPError):
+        probe_paths(paths=paths)
+
+    # only 404s
+    routes.clear()
+    with pytest.raises(requests.HTTPError):
+        probe_paths(paths=paths)
+
+    # no response at all
+    with pytest.raises(requests.HTTPError):
+        probe_paths(paths=["http://127.0.0.1:1/a", "http://127.0.0.1:1/b"])
+
+    # deadline
+    routes.update({"/a": (200, "a", 0.5)})
+    with pytest.raises(TimeoutError):
+        probe_paths(paths=paths[:1], deadline=time.monotonic() + 0.05)
+
+
+def test_discover(local_server):
+    routes = local_server.routes
+    routes.update({
+        "/v1/service-info": (200, "{}", 0.1),
+        "/service-info": (200, "{}", 0),
+        "/v1/tasks/foo": (200, '{"id": "foo", "state": "RUNNING"}', 0),
+        "/tasks/foo": (200, '{"id": "foo", "state": "RUNNING"}', 0),
+    })
+    cli = HTTPClient(local_server.url, discovery=True)
+    assert cli.get_task("foo").state == "RUNNING"
+    assert cli.urls == [f"{local_server.url}/v1"]
+
+    # service info unavailable: keep all base paths
+    routes.pop("/v1/service-info")
+    routes.pop("/service-info")
+    cli = HTTPClient(local_server.url, discovery=True)
+    assert cli.get_task("foo").state == "RUNNING"
+    assert len(cli.urls) == 3
+
+
+def test_replicas(mock_id):
+    urls = ["http://replica1:8000", "http://replica2:8000/"]
+    cli = HTTPClient(urls, timeout=5)
+    assert cli.url == ["http://replica1:8000", "http://replica2:8000"]
+    assert [e.url for e in cli.endpoints.endpoints] == cli.url
+    assert cli.urls[0] == "http://replica1:8000/ga4gh/tes/v1"
+
+    with pytest.raises(TypeError):
+        HTTPClient(url=[], timeout=5)
+    with pytest.raises(ValueError):
+        HTTPClient(url=["http://replica1:8000", "ftp://replica2"])
+
+    task_json = {"id": mock_id, "state": "RUNNING"}
+    with requests_mock.Mocker() as m:
+        # reads fail over on missing responses and server errors
+        m.get(f"{urls[0]}/ga4gh/tes/v1/tasks/{mock_id}", status_code=503)
+        m.get(f"{urls[1]}ga4gh/tes/v1/tasks/{mock_id}", json=task_json)
+        for _ in range(4):
+            assert cli.get_task(mock_id).id == mock_id
+        replica1 = cli.endpoints.endpoints[0]
+        assert not replica1.is_healthy()
+
+        # client errors do not fail over
+        m.get(f"{urls[1]}ga4gh/tes/v1/tasks/{mock_id}", status_code=400)
+        with pytest.raises(requests.HTTPError):
+            cli.get_task(mock_id)
+
+    cli = HTTPClient(urls, timeout=5)
+    with requests_mock.Mocker() as m:
+        # writes fail over only if no connection could be made
+        m.post(requests_mock.ANY, exc=requests.exceptions.ConnectTimeout)
+        m.post(f"{urls[1]}ga4gh/tes/v1/tasks", json={"id": mock_id})
+        task = Task(executors=[Executor(image="alpine", command=["true"])])
+        assert cli.create_task(task) == mock_id
+
+        # not if the connection was aborted after sending the request
+        aborted = requests.exceptions.ConnectionError(
+            urllib3.exceptions.ProtocolError("Connection aborted."))
+        m.post(requests_mock.ANY, exc=aborted)
+        with pytest.raises(requests.HTTPError):
+            cli.create_task(task)
+        assert m.call_count == 4 + 3
+
+        m.post(requests_mock.ANY, exc=requests.exceptions.ReadTimeout)
+        with pytest.raises(requests.HTTPError):
+            cli.create_task(task)
+        assert m.call_count == 4 + 3 + 3
+
+        m.post(requests_mock.ANY, status_code=503)
+        with pytest.raises(requests.HTTPError):
+            cli.create_task(task)
+
+
+def test_replicas_deadline(local_server):
+    local_server.routes.update({
+        "/a/ga4gh/tes/v1/tasks/foo": (200, '{"id": "foo"}', 0.2),
+        "/b/ga4gh/tes/v1/tasks/foo": (200, '{"id": "foo"}', 0.2),
+    })
+    cli = HTTPClient([f"{local_server.url}/a", f"{local_server.url}/b"])
+    # short budgets of the caller do not eject healthy replicas
+    for _ in range(4):
+        with pytest.raises(TimeoutError):
+            cli.get_task("foo", timeout_total=0.05)
+    for endpoint in cli.endpoints.endpoints:
+        assert endpoint.is_healthy()
+        assert endpoint.failures == 0
+        assert endpoint.in_flight == 0
+    assert cli.get_task("foo", timeout_total=5).id == "foo"
+
+
+def test_hedging(local_server):
+    body = '{"id": "foo", "state": "RUNNING"}'
+    local_server.routes.update({
+        "/slow/ga4gh/tes/v1/tasks/foo": (200, body, 0.5),
+        "/fast/ga4gh/tes/v1/tasks/foo": (200, body, 0),
+        "/fast/ga4gh/tes/v1/tasks/bar": (500, "", 0),
+        "/slow/ga4gh/tes/v1/tasks/bar": (500, "", 0.2),
+    })
+    policy = HedgePolicy(default_delay=0.05, budget=1.0)
+    cli = HTTPClient([f"{local_server.url}/slow", f"{local_server.url}/fast"],
+                     hedging=policy)
+    slow, fast = cli.endpoints.endpoints
+
+    # hedge wins against slow replica
+    with mock.patch.object(cli.endpoints, "candidates",
+                           side_effect=[[slow, fast], [fast, slow]]):
+        start = time.monotonic()
+        assert cli.get_task("foo").state == "RUNNING"
+        assert time.monotonic() - start < 0.4
+    assert policy.stats()["wins"] == 1
+
+    # fast response needs no hedge
+    with mock.patch.object(cli.endpoints, "candidates",
+                           side_effect=[[fast, slow]]):
+        cli.get_task("foo")
+    assert policy.stats()["hedged"] == 1
+    assert policy.stats()["requests"] == 2
+
+    # no hedge if budget is used up
+    policy.budget = 0.0
+    with mock.patch.object(cli.endpoints, "candidates",
+                           side_effect=[[slow, fast]]):
+        cli.get_task("foo")
+    assert policy.stats()["hedged"] == 1
+
+    # errors of both requests are reported
+    policy.budget = 1.0
+    with mock.patch.object(cli.endpoints, "candidates",
+                           side_effect=[[slow], [fast]]):
+        with pytest.raises(requests.HTTPError):
+            cli.get_task("bar")
+    assert policy.stats()["hedged"] == 2
+
+    # deadline covers hedges
+    with mock.patch.object(cli.endpoints, "candidates",
+                           side_effect=[[slow], [slow]]):
+        with pytest.raises(TimeoutError):
+            cli.get_task("foo", timeout_total=0.2)
+
+    # writes are never hedged
+    with requests_mock.Mocker() as m:
+        m.post(requests_mock.ANY, json={"id": "foo"})
+        cli.create_task(Task(executors=[Executor(image="a", command=["b"])]))
+        assert m.call_count == 1
+
+
+def test_hedging_busy_pool(fake_api, task):
+    fake_api.latency = 0.05
+    task_id = fake_api.add_task(task)
+    policy = HedgePolicy(default_delay=0.15, budget=1.0)
+    cli = HTTPClient("http://fake", transport=InMemoryTransport(fake_api),
+                     hedging=policy)
+    # more callers than workers: requests queue up for the pool
+    cli._pools["requests"] = ThreadPoolExecutor(max_workers=2)
+    with ThreadPoolExecutor(max_workers=8) as callers:
+        for result in callers.map(cli.get_task, [task_id] * 16):
+            assert result.id == task_id
+    # waiting for a worker does not count as a slow response
+    assert policy.stats()["hedged"] == 0
+
+    # the deadline covers the wait for a worker
+    cli._pools["requests"] = ThreadPoolExecutor(max_workers=1)
+    cli._pools["requests"].submit(time.sleep, 0.3)
+    with pytest.raises(TimeoutError):
+        cli.get_task(task_id, timeout_total=0.1)
+
+
+def test_hedging_hooks(local_server):
+    body = '{"id": "foo", "state": "RUNNING"}'
+    local_server.routes.update({
+        "/slow/ga4gh/tes/v1/tasks/foo": (200, body, 0.2),
+        "/fast/ga4gh/tes/v1/tasks/foo": (200, body, 0),
+    })
+    calls = {"pre_request": 0, "post_response": 0, "on_error": 0}
+    finished = threading.Semaphore(0)
+
+    class Counter(Hooks):
+        def pre_request(self, event):
+            calls["pre_request"] += 1
+
+        def post_response(self, event):
+            calls["post_response"] += 1
+            finished.release()
+
+        def on_error(self, event):
+            calls["on_error"] += 1
+            finished.release()
+
+    policy = HedgePolicy(default_delay=0.05, budget=1.0)
+    cli = HTTPClient([f"{local_server.url}/slow", f"{local_server.url}/fast"],
+                     hedging=policy, hooks=[Counter()])
+    slow, fast = cli.endpoints.endpoints
+    with mock.patch.object(cli.endpoints, "candidates",
+                           side_effect=[[slow, fast], [fast, slow]]):
+        assert cli.get_task("foo").state == "RUNNING"
+    assert policy.stats()["wins"] == 1
+    # the hedge that lost is reported once it returns
+    for _ in range(2):
+        assert finished.acquire(timeout=5)
+    assert calls == {"pre_request": 2, "post_response": 2, "on_error": 0}
@@ -0,0 +1,70 @@
+import pytest
+import time
+
+from tes.endpoints import Endpoint, EndpointPool
+
+
+@pytest.fixture
+def pool():
+    return EndpointPool(["http://a", "http://b", "http://c"],
+                        failure_threshold=2, cooldown=0.2)
+
+
+def test_endpoint():
+    endpoint = Endpoint("http://a")
+    assert endpoint.is_healthy()
+    assert endpoint.score() == 0
+    endpoint.latency = 0.5
+    endpoint.in_flight = 1
+    assert endpoint.score() == 1.0
+    endpoint.ejected_until = time.monotonic() + 10
+    assert not endpoint.is_healthy()
+
+
+def test_candidates_write(pool):
+    assert [e.url for e in pool.candidates(read=False)] == \
+        ["http://a", "http://b", "http://c"]
+
+
+def test_candidates_read(pool):
+    a, b, c = pool.endpoints
+    for endpoint, latency in ((a, 1.0), (b, 0.01), (c, 0.5)):
+        pool.acquire(endpoint)
+        pool.record_success(endpoint, latency)
+    firsts = [pool.candidates()[0].url for _ in range(100)]
+    # the slowest replica never wins a power-of-two-choices draw
+    assert "http://a" not in firsts
+    assert firsts.count("http://b") > firsts.count("http://c")
+    assert len(pool.candidates()) == 3
+
+
+def test_ewma(pool):
+    a = pool.endpoints[0]
+    pool.acquire(a)
+    pool.record_success(a, 1.0)
+    assert a.latency == 1.0
+    assert a.in_flight == 0
+    pool.acquire(a)
+    pool.record_success(a, 0.0)
+    assert a.latency == pytest.approx(0.7)
+
+
+def test_circuit_breaker(pool):
+    a = pool.endpoints[0]
+    pool.record_failure(a)
+    assert a.is_healthy()
+    pool.record_failure(a)
+    assert not a.is_healthy()
+    assert pool.candidates(read=False)[-1] is a
+    assert pool.candidates(read=True)[-1] is a
+
+    # re-admitted after cool-down, ejected again on next failure
+    time.sleep(0.25)
+    assert a.is_healthy()
+    pool.record_failure(a)
+    assert not a.is_healthy()
+
+    # success resets failure count
+    pool.record_success(a, 0.1)
+    assert a.is_healthy()
+    assert a.failures == 0
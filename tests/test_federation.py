@@ -0,0 +1,169 @@
+import pytest
+import requests
+import socket
+
+from unittest import mock
+
+from tes.client import HTTPClient
+from tes.federation import Backend, FederatedClient
+from tes.models import Input, ListTasksResponse, Resources, ServiceInfo, Task
+from tes.testing import FakeTES, InMemoryTransport
+
+
+def make_backend(name, states, storage=None, params=None, **kwargs):
+    client = HTTPClient(f"http://{name}:8000")
+    client.get_service_info = mock.Mock(return_value=ServiceInfo(
+        storage=storage, tes_resources_backend_parameters=params))
+    client.list_tasks = mock.Mock(return_value=ListTasksResponse(
+        tasks=[Task(id=str(i), state=s) for i, s in enumerate(states)]))
+    client.create_task = mock.Mock(return_value="id")
+    client.get_task = mock.Mock(
+        side_effect=lambda task_id, view: Task(id=task_id, state="RUNNING"))
+    client.wait = mock.Mock(
+        side_effect=lambda task_id, timeout: Task(id=task_id, state="COMPLETE"))
+    client.cancel_task = mock.Mock(return_value=None)
+    return Backend(name, client, **kwargs)
+
+
+def test_backend_validation():
+    with pytest.raises(ValueError):
+        Backend("a:b", HTTPClient("http://a:8000"))
+    with pytest.raises(ValueError):
+        FederatedClient([])
+    with pytest.raises(ValueError):
+        FederatedClient([make_backend("a", []), make_backend("a", [])])
+
+
+def test_route_by_load(task):
+    busy = make_backend("busy", ["RUNNING", "QUEUED", "COMPLETE"])
+    idle = make_backend("idle", ["COMPLETE", "RUNNING"])
+    fed = FederatedClient([busy, idle])
+    assert fed.create_task(task) == "idle:id"
+    # locally counted submissions spread bursts before the next sample
+    assert fed.create_task(task) == "busy:id"
+    assert idle.client.list_tasks.call_count == 1
+
+    # weights scale capacity
+    big = make_backend("big", ["RUNNING"] * 4, weight=8)
+    fed = FederatedClient([busy, big])
+    assert fed.route(task) is big
+
+
+def test_route_by_resources(task):
+    small = make_backend("small", [], max_cpu_cores=2, max_ram_gb=4,
+                         zones=["us-east"], preemptible=True)
+    large = make_backend("large", ["RUNNING"] * 10, max_disk_gb=100,
+                         params=["VmSize"])
+    fed = FederatedClient([small, large])
+    assert fed.route(task) is small
+
+    task.resources = Resources(cpu_cores=8)
+    assert fed.route(task) is large
+    task.resources = Resources(zones=["eu-west"])
+    assert fed.route(task) is large
+    task.resources = Resources(preemptible=False)
+    assert fed.route(task) is large
+    task.resources = Resources(
+        backend_parameters={"VmSize": "big"}, backend_parameters_strict=True)
+    assert fed.route(task) is large
+    # non-strict backend parameters only rank backends
+    task.resources = Resources(backend_parameters={"VmSize": "big"})
+    assert fed.route(task) is large
+
+    task.resources = Resources(disk_gb=1000, cpu_cores=8)
+    with pytest.raises(ValueError):
+        fed.route(task)
+
+
+def test_route_by_storage(task):
+    s3 = make_backend("s3", ["RUNNING"] * 10, storage=["s3://bucket/"])
+    local = make_backend("local", [], storage=["file:///data/"])
+    fed = FederatedClient([local, s3])
+    task.inputs = [Input(url="s3://bucket/in.txt", path="/in.txt")]
+    assert fed.route(task) is s3
+
+
+def test_route_sampling_pages(task):
+    backend = make_backend("a", [])
+    backend.client.list_tasks = mock.Mock(side_effect=[
+        ListTasksResponse(tasks=[Task(id="1", state="RUNNING")],
+                          next_page_token="next"),
+        ListTasksResponse(tasks=[Task(id="2", state="QUEUED")]),
+    ])
+    fed = FederatedClient([backend], sample_interval=0)
+    fed.route(task)
+    assert fed._load["a"][1] == 2
+    assert backend.client.get_service_info.call_count == 1
+
+    backend.client.list_tasks = mock.Mock(return_value=ListTasksResponse(
+        tasks=[Task(id="1", state="RUNNING")], next_page_token="next"))
+    fed = FederatedClient([backend], sample_limit=3)
+    fed.route(task)
+    assert backend.client.list_tasks.call_count == 3
+
+
+def test_task_id_routing():
+    a = make_backend("a", [])
+    b = make_backend("b", ["RUNNING"])
+    fed = FederatedClient([a, b])
+
+    assert fed.get_task("b:x:1", "MINIMAL").id == "b:x:1"
+    b.client.get_task.assert_called_with("x:1", "MINIMAL")
+
+    assert fed.wait("a:1").state == "COMPLETE"
+    a.client.wait.assert_called_with("1", timeout=None)
+
+    fed.cancel_task("a:1")
+    a.client.cancel_task.assert_called_with("1")
+
+    response = fed.list_tasks("b")
+    assert response.tasks[0].id == "b:0"
+
+    with pytest.raises(ValueError):
+        fed.get_task("c:1")
+    with pytest.raises(ValueError):
+        fed.get_task("1")
+
+
+def test_backend_down(task):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    api = FakeTES()
+    up = Backend("up", HTTPClient(
+        "http://fake", transport=InMemoryTransport(api)))
+    down = Backend("down", HTTPClient(f"http://127.0.0.1:{port}"))
+    fed = FederatedClient([down, up])
+    with mock.patch.object(down.client, "get_service_info",
+                           wraps=down.client.get_service_info) as sample:
+        task_id = fed.create_task(task)
+        assert task_id.startswith("up:")
+        assert fed.create_task(task).startswith("up:")
+        # not sampled again before the next sample is due
+        assert sample.call_count == 1
+    assert len(api.tasks) == 2
+    with pytest.raises(ValueError):
+        FederatedClient([down]).create_task(task)
+
+
+def test_create_fail_over(task):
+    first = make_backend("first", [])
+    second = make_backend("second", ["RUNNING"])
+    fed = FederatedClient([first, second])
+    first.client.create_task.side_effect = \
+        requests.exceptions.ConnectTimeout()
+    assert fed.create_task(task) == "second:id"
+    # skipped until the next sample
+    assert fed.create_task(task) == "second:id"
+    assert first.client.create_task.call_count == 1
+
+    # tasks possibly created already are not created again
+    fed = FederatedClient([first, second])
+    first.client.create_task.side_effect = requests.exceptions.ReadTimeout()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        fed.create_task(task)
+    second.client.create_task.side_effect = \
+        requests.exceptions.ConnectTimeout()
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        FederatedClient([second]).create_task(task)
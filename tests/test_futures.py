@@ -0,0 +1,145 @@
+import asyncio
+import pytest
+import requests
+
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+from tes.client import HTTPClient
+from tes.futures import TaskFuture, TaskPoller, default_poller
+from tes.instrumentation import Hooks
+from tes.testing import FINAL_STATE_TAG
+from tes.utils import TimeoutError
+
+
+@pytest.mark.fake_api(state_durations={"QUEUED": 0.1, "RUNNING": 0.1})
+def test_submit(build_task, fake_api, fake_client):
+    states = []
+
+    class StateHooks(Hooks):
+        def task_state(self, task_id, state):
+            states.append(state)
+
+    fake_client.hooks.append(StateHooks())
+    futures = [fake_client.submit(build_task()) for _ in range(20)]
+    futures.append(fake_client.submit(
+        build_task(tags={FINAL_STATE_TAG: "SYSTEM_ERROR"})))
+    done = []
+    futures[0].add_done_callback(done.append)
+    assert not futures[0].done()
+
+    completed = list(as_completed(futures, timeout=5))
+    assert len(completed) == 21
+    assert done == [futures[0]]
+    assert futures[0].result().state == "COMPLETE"
+    assert futures[0].result().id == futures[0].task_id
+    assert futures[-1].result().state == "SYSTEM_ERROR"
+    assert futures[0].state == "COMPLETE"
+    assert not futures[0].running()
+    assert {"QUEUED", "COMPLETE"} <= set(states)
+    # each task is polled about once per interval, not once per waiter
+    polls = fake_api.requests[("GET", "/tasks/{id}")]
+    assert polls <= 21 * 3
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 0.3})
+def test_shared_watch(build_task, fake_api, fake_client):
+    task_id = fake_client.create_task(build_task())
+    poller = TaskPoller(interval=0.05)
+    futures = [poller.watch(fake_client, task_id) for _ in range(50)]
+    assert poller.watched() == 1
+    wait(futures, timeout=5)
+    assert all(f.result().state == "COMPLETE" for f in futures)
+    assert fake_api.requests[("GET", "/tasks/{id}")] < 20
+
+
+def test_wrap_future(build_task, fake_client):
+    async def main():
+        return await asyncio.wrap_future(fake_client.submit(build_task()))
+
+    assert asyncio.run(main()).state == "COMPLETE"
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 60})
+def test_cancel(build_task, fake_api, fake_client):
+    future = fake_client.submit(build_task())
+    other = TaskPoller().watch(fake_client, future.task_id)
+    callbacks = []
+    future.add_done_callback(callbacks.append)
+    assert future.cancel()
+    assert future.cancelled()
+    assert callbacks == [future]
+    assert not future.cancel()
+    assert other.result(timeout=5).state == "CANCELED"
+    assert TaskFuture("1").cancel()
+
+    # errors of the cancel request are not raised
+    future = fake_client.submit(build_task())
+    fake_api.inject_error(500, route="/tasks/{id}:cancel")
+    assert not future.cancel()
+    assert not future.done()
+    assert future.cancel()
+    assert future.cancelled()
+
+
+def test_poll_errors(build_task, fake_api, fake_client):
+    poller = TaskPoller(interval=0.01, max_errors=2)
+    with pytest.raises(requests.exceptions.HTTPError) as exc:
+        poller.watch(fake_client, "missing").result(timeout=5)
+    assert exc.value.response.status_code == 404
+
+    task_id = fake_client.create_task(build_task())
+    fake_api.inject_error(503, route="/tasks/{id}")
+    future = poller.watch(fake_client, task_id)
+    assert future.result(timeout=5).state == "COMPLETE"
+    fake_api.inject_error(503, route="/tasks/{id}", count=2)
+    with pytest.raises(requests.exceptions.HTTPError):
+        poller.watch(fake_client, task_id).result(timeout=5)
+
+
+def test_default_poller(fake_client):
+    assert default_poller() is default_poller()
+    assert fake_client._poller() is default_poller()
+    poller = TaskPoller()
+    assert HTTPClient("http://fake", poller=poller)._poller() is poller
+    with pytest.raises(TypeError):
+        HTTPClient("http://fake", poller="poller")  # type: ignore
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 0.2})
+def test_list_scan(build_task, fake_api, fake_client):
+    ids = [fake_client.create_task(build_task()) for _ in range(40)]
+    fake_api.add_task(build_task(state="COMPLETE"))
+    poller = TaskPoller(interval=0.05, scan_threshold=10,
+                        scan_page_size=16, max_scan_pages=2)
+    futures = [poller.watch(fake_client, task_id) for task_id in ids]
+    futures.append(poller.watch(fake_client, "missing"))
+    wait(futures, timeout=5)
+    assert all(f.result().state == "COMPLETE" for f in futures[:-1])
+    with pytest.raises(requests.exceptions.HTTPError):
+        futures[-1].result()
+    assert fake_api.requests[("GET", "/tasks")] > 0
+    # tasks beyond the scanned pages are polled individually
+    assert fake_api.requests[("GET", "/tasks/{id}")] > 0
+
+    fake_api.inject_error(503, route="/tasks")
+    futures = [poller.watch(fake_client, task_id) for task_id in ids]
+    assert all(f.result(timeout=5).state == "COMPLETE" for f in futures)
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 0.5})
+def test_wait_shared(build_task, fake_api, fake_client):
+    task_id = fake_client.create_task(build_task())
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        results = list(pool.map(
+            lambda _: fake_client.wait(task_id, timeout=5), range(50)))
+    assert all(task.state == "COMPLETE" for task in results)
+    assert fake_api.requests[("GET", "/tasks/{id}")] < 10
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 60})
+def test_wait_timeout(build_task, fake_client):
+    task_id = fake_client.create_task(build_task())
+    with pytest.raises(TimeoutError, match="RUNNING"):
+        fake_client.wait(task_id, timeout=0.2)
+    with pytest.raises(Exception, match="Failed to get task missing"):
+        fake_client.wait("missing", timeout=5)
@@ -0,0 +1,50 @@
+import pytest
+
+from tes.hedging import HedgePolicy
+
+
+def test_hedge_policy_validation():
+    with pytest.raises(ValueError):
+        HedgePolicy(percentile=0)
+    with pytest.raises(ValueError):
+        HedgePolicy(percentile=101)
+    with pytest.raises(TypeError):
+        HedgePolicy(budget=1)  # type: ignore
+
+
+def test_delay():
+    policy = HedgePolicy(percentile=90, default_delay=2, min_samples=10,
+                         window=20, min_delay=0.05)
+    assert policy.delay("a") == 2
+    for i in range(1, 11):
+        policy.record("a", i / 10)
+    assert policy.delay("a") == pytest.approx(0.9)
+    assert policy.delay("b") == 2
+
+    # delay is recomputed every 16 samples only
+    for _ in range(15):
+        policy.record("a", 0.01)
+    assert policy.delay("a") == pytest.approx(0.9)
+    policy.record("a", 0.01)
+    assert policy.delay("a") == pytest.approx(0.8)
+    for _ in range(20):
+        policy.record("a", 0.01)
+    assert policy.delay("a") == pytest.approx(0.05)
+
+
+def test_budget():
+    policy = HedgePolicy(budget=0.25)
+    assert not policy.try_hedge()
+    for _ in range(4):
+        policy.admit()
+    assert policy.try_hedge()
+    assert not policy.try_hedge()
+    policy.record_win()
+    assert policy.stats() == {
+        "requests": 4,
+        "hedged": 1,
+        "wins": 1,
+        "hedge_rate": 0.25,
+        "win_rate": 1.0,
+    }
+    assert HedgePolicy().stats()["hedge_rate"] == 0.0
@@ -0,0 +1,114 @@
+import pytest
+import requests
+import requests_mock
+
+from tes.client import HTTPClient
+from tes.instrumentation import (Histogram, Hooks, LatencyAggregator,
+                                 RequestEvent)
+from tes.models import Executor, Task
+from tes.utils import UnmarshalError
+
+
+class Recorder(Hooks):
+    def __init__(self):
+        self.events = []
+
+    def pre_request(self, event):
+        self.events.append(("pre_request", event.path, event.attempt))
+
+    def post_response(self, event):
+        self.events.append(("post_response", event.path, event.status_code,
+                            event.decode_time is not None))
+
+    def on_error(self, event):
+        self.events.append(("on_error", event.path, type(event.error)))
+
+
+def test_histogram():
+    histogram = Histogram([1, 2, 4])
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 3, 10):
+        histogram.observe(value)
+    assert histogram.count == 5
+    assert histogram.sum == 16.5
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.quantile(0.2) == 1.0
+    assert histogram.quantile(0.5) == pytest.approx(1.75)
+    assert histogram.quantile(1.0) == 4
+
+
+def test_aggregator():
+    agg = LatencyAggregator()
+    assert agg.quantile("get_task", 0.5) is None
+    event = RequestEvent("get_task", "get", "http://a/tasks/1", 1,
+                         request_bytes=10)
+    agg.pre_request(event)
+    event.status_code = 200
+    event.total = 0.02
+    event.response_bytes = 100
+    event.decode_time = 0.001
+    agg.post_response(event)
+    event = RequestEvent("get_task", "get", "http://a/v1/tasks/1", 2)
+    agg.pre_request(event)
+    event.error = requests.exceptions.ConnectionError()
+    agg.on_error(event)
+
+    assert agg.quantile("get_task", 0.5) == pytest.approx(0.0175)
+    snapshot = agg.snapshot()["get_task"]
+    assert snapshot["attempts"] == 2
+    assert snapshot["errors"] == 1
+    assert snapshot["fallbacks"] == 0
+    assert snapshot["status_codes"] == {200: 1}
+    assert snapshot["paths"] == {"http://a/tasks/1": 1}
+    assert snapshot["request_bytes"] == 10
+    assert snapshot["response_bytes"] == 100
+    assert snapshot["latency"]["count"] == 1
+    assert snapshot["latency"]["mean"] == 0.02
+    assert snapshot["decode_time"]["p99"] is not None
+    assert LatencyAggregator().snapshot() == {}
+
+
+def test_client_hooks():
+    url = "http://fakehost:8000"
+    recorder = Recorder()
+    agg = LatencyAggregator()
+    cli = HTTPClient(url, hooks=[recorder, agg])
+    with requests_mock.Mocker() as m:
+        m.get(f"{url}/ga4gh/tes/v1/tasks/1", status_code=404)
+        m.get(f"{url}/v1/tasks/1", exc=requests.exceptions.ConnectTimeout)
+        m.get(f"{url}/tasks/1", json={"id": "1", "state": "RUNNING"})
+        cli.get_task("1")
+        assert recorder.events == [
+            ("pre_request", f"{url}/ga4gh/tes/v1/tasks/1", 1),
+            ("post_response", f"{url}/ga4gh/tes/v1/tasks/1", 404, False),
+            ("pre_request", f"{url}/v1/tasks/1", 2),
+            ("on_error", f"{url}/v1/tasks/1",
+             requests.exceptions.ConnectTimeout),
+            ("pre_request", f"{url}/tasks/1", 3),
+            ("post_response", f"{url}/tasks/1", 200, True),
+        ]
+        assert agg.snapshot()["get_task"]["fallbacks"] == 1
+
+        recorder.events.clear()
+        m.get(f"{url}/ga4gh/tes/v1/tasks/2", status_code=500)
+        with pytest.raises(requests.HTTPError):
+            cli.get_task("2")
+        assert recorder.events[-1] == \
+            ("post_response", f"{url}/ga4gh/tes/v1/tasks/2", 500, False)
+
+        recorder.events.clear()
+        m.get(f"{url}/ga4gh/tes/v1/tasks/3", json={"state": "bogus"})
+        with pytest.raises(UnmarshalError):
+            cli.get_task("3")
+        assert recorder.events[-1] == \
+            ("on_error", f"{url}/ga4gh/tes/v1/tasks/3", UnmarshalError)
+
+        m.post(f"{url}/ga4gh/tes/v1/tasks", json={"id": "4"})
+        task = Task(executors=[Executor(image="alpine", command=["true"])])
+        cli.create_task(task)
+        assert agg.snapshot()["create_task"]["request_bytes"] == \
+            len(task.as_json())
+
+        m.post(f"{url}/ga4gh/tes/v1/tasks/4:cancel", json={})
+        cli.cancel_task("4")
+        assert agg.snapshot()["cancel_task"]["status_codes"] == {200: 1}
@@ -0,0 +1,159 @@
+import json
+import pytest
+import requests
+
+from tes.client import HTTPClient
+from tes.journal import IDEMPOTENCY_TAG, SubmissionJournal
+from tes.testing import InMemoryTransport
+
+
+class LossyTransport(InMemoryTransport):
+    """Loses responses of create requests, fails list requests, or fails
+    all requests."""
+
+    def __init__(self, api):
+        super().__init__(api)
+        self.lose = 0
+        self.fail_lists = 0
+        self.down = False
+
+    def request(self, method, url, **kwargs):
+        if self.down:
+            raise requests.exceptions.ConnectionError("down")
+        if method == "get" and url.endswith("/tasks") and self.fail_lists:
+            self.fail_lists -= 1
+            raise requests.exceptions.ConnectionError("list failed")
+        response = super().request(method, url, **kwargs)
+        if method == "post" and url.endswith("/tasks") and self.lose:
+            self.lose -= 1
+            raise requests.exceptions.ReadTimeout("lost")
+        return response
+
+
+def _journal(api, path, **kwargs):
+    transport = LossyTransport(api)
+    cli = HTTPClient("http://fake", transport=transport)
+    return transport, SubmissionJournal(cli, str(path), retry_delay=0,
+                                        **kwargs)
+
+
+def test_create_task(tmp_path, fake_api, build_task):
+    path = tmp_path / "journal.jsonl"
+    transport, journal = _journal(fake_api, path)
+    task_id = journal.create_task(build_task(), key="step-1")
+    assert fake_api.tasks[task_id]["tags"] == {IDEMPOTENCY_TAG: "step-1"}
+    assert journal.create_task(build_task(), key="step-1") == task_id
+    assert journal.task_id("step-1") == task_id
+
+    # lost responses are resolved by key instead of creating duplicates
+    transport.lose = 1
+    lost_id = journal.create_task(build_task())
+    assert lost_id != task_id
+    assert len(fake_api.tasks) == 2
+
+    # a rerun reads the journal
+    _, rerun = _journal(fake_api, path)
+    assert rerun.create_task(build_task(), key="step-1") == task_id
+    assert len(fake_api.tasks) == 2
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["event"] for r in records] == [
+        "submitted", "created", "submitted", "created"]
+    with pytest.raises(TypeError):
+        journal.create_task("task")  # type: ignore
+
+
+def test_errors(tmp_path, fake_api, build_task):
+    transport, journal = _journal(fake_api, tmp_path / "journal.jsonl")
+    fake_api.inject_error(400, route="/tasks", method="POST")
+    with pytest.raises(requests.exceptions.HTTPError):
+        journal.create_task(build_task(), key="invalid")
+    assert journal.pending() == []
+    assert journal.create_task(build_task(), key="invalid") in fake_api.tasks
+
+    transport.down = True
+    with pytest.raises(requests.exceptions.RequestException):
+        journal.create_task(build_task(), key="down")
+    assert journal.pending() == ["down"]
+    journal.max_attempts = 0
+    with pytest.raises(ValueError):
+        journal.create_task(build_task(), key="none")
+
+
+def test_recover(tmp_path, fake_api, build_task):
+    path = tmp_path / "journal.jsonl"
+    transport, journal = _journal(fake_api, path, max_attempts=1)
+    transport.lose = 1
+    with pytest.raises(requests.exceptions.RequestException):
+        journal.create_task(build_task(), key="created")
+    transport.down = True
+    with pytest.raises(requests.exceptions.RequestException):
+        journal.create_task(build_task("false"), key="lost")
+    with pytest.raises(requests.exceptions.RequestException):
+        journal.create_task(build_task("false"), key="failing")
+    assert len(fake_api.tasks) == 1
+    with open(path, "a") as f:
+        f.write('{"event": "subm')  # torn write
+
+    # restart
+    transport, journal = _journal(fake_api, path, max_attempts=1, fsync=True)
+    assert journal.pending() == ["created", "lost", "failing"]
+    assert journal.recover(resubmit=False) == {
+        "created": list(fake_api.tasks)[0], "lost": None, "failing": None}
+    fake_api.inject_error(400, route="/tasks", method="POST", count=1)
+    recovered = journal.recover()
+    assert recovered["failing"] is not None
+    assert recovered["lost"] is None
+    assert fake_api.tasks[recovered["failing"]]["executors"][0]["command"] == [
+        "false"]
+    assert journal.pending() == []
+
+    # a rerun with the key of a pending task checks the server first
+    transport.down = True
+    with pytest.raises(requests.exceptions.RequestException):
+        journal.create_task(build_task(), key="rerun")
+    transport.down = False
+    journal.client.create_task(build_task(tags={IDEMPOTENCY_TAG: "rerun"}))
+    tasks = len(fake_api.tasks)
+    assert journal.create_task(build_task(), key="rerun") in fake_api.tasks
+    assert len(fake_api.tasks) == tasks
+
+
+def test_lookup_errors(tmp_path, fake_api, build_task):
+    # the create response is lost and so is the first lookup
+    path = tmp_path / "journal.jsonl"
+    transport, journal = _journal(fake_api, path)
+    transport.lose = 1
+    # list requests fail on each of the three base paths
+    transport.fail_lists = 3
+    task_id = journal.create_task(build_task(), key="step-1")
+    assert list(fake_api.tasks) == [task_id]
+
+    # no lookup succeeds: the task stays pending instead of being duplicated
+    transport.lose = 1
+    transport.fail_lists = 6
+    with pytest.raises(requests.exceptions.RequestException):
+        journal.create_task(build_task(), key="step-2")
+    assert len(fake_api.tasks) == 2
+    assert journal.pending() == ["step-2"]
+    transport.fail_lists = 3
+    assert journal.recover() == {"step-2": None}
+    assert journal.pending() == ["step-2"]
+    assert len(fake_api.tasks) == 2
+    task_id = journal.recover()["step-2"]
+    assert journal.task_id("step-2") == task_id
+    assert len(fake_api.tasks) == 2
+
+
+@pytest.mark.fake_api(tag_filters=False, page_size=1)
+def test_unfiltered_server(tmp_path, fake_api, build_task):
+    # TES 1.0 servers ignore tag filters and list all tasks
+    other = fake_api.add_task(build_task("other"))
+    transport, journal = _journal(fake_api, tmp_path / "journal.jsonl")
+    assert journal.find("never-submitted") is None
+    transport.lose = 1
+    task_id = journal.create_task(build_task(), key="step-1")
+    assert task_id != other
+    fake_api.add_task(build_task("newer"))
+    # found on a later page
+    assert journal.find("step-1") == task_id
+    assert len(fake_api.tasks) == 3
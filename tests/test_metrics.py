@@ -0,0 +1,115 @@
+import requests
+import requests_mock
+import time
+
+from unittest import mock
+
+from tes.client import HTTPClient
+from tes.hedging import HedgePolicy
+from tes.metrics import MetricsRegistry
+from tes.testing import FakeTES, InMemoryTransport
+
+
+def test_metrics_registry():
+    url = "http://fakehost:8000"
+    registry = MetricsRegistry(buckets=[0.1, 1])
+    cli = HTTPClient(url, hooks=[registry])
+    with requests_mock.Mocker() as m:
+        m.get(f"{url}/ga4gh/tes/v1/tasks/1", status_code=404)
+        m.get(f"{url}/v1/tasks/1", exc=requests.exceptions.ConnectTimeout)
+        m.get(f"{url}/tasks/1", [
+            {"json": {"id": "1", "state": "RUNNING"}},
+            {"json": {"id": "1", "state": "COMPLETE"}},
+        ])
+        cli.get_task("1")
+        cli.wait("1", timeout=5)
+    registry.record_cache(True)
+    registry.record_cache(False)
+    registry.record_cache(False, cache='my"cache')
+    registry.task_state("2", "QUEUED")
+
+    text = registry.render()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert "# TYPE tes_client_requests_total counter" in lines
+    assert 'tes_client_requests_total{endpoint="get_task",method="GET",status="200"} 2' in lines
+    assert 'tes_client_requests_total{endpoint="get_task",method="GET",status="404"} 2' in lines
+    assert 'tes_client_requests_total{endpoint="get_task",method="GET",status="error"} 2' in lines
+    assert 'tes_client_retries_total{endpoint="get_task"} 4' in lines
+    assert 'tes_client_cache_requests_total{cache="call",result="hit"} 1' in lines
+    assert 'tes_client_cache_requests_total{cache="my\\"cache",result="miss"} 1' in lines
+    assert 'tes_client_finished_tasks_total{state="COMPLETE"} 1' in lines
+    assert "# TYPE tes_client_request_duration_seconds histogram" in lines
+    assert 'tes_client_request_duration_seconds_bucket{endpoint="get_task",le="+Inf"} 6' in lines
+    assert 'tes_client_request_duration_seconds_count{endpoint="get_task"} 6' in lines
+    assert "tes_client_open_requests 0" in lines
+    assert 'tes_client_waited_tasks{state="QUEUED"} 1' in lines
+    assert 'tes_client_waited_tasks{state="RUNNING"} 0' in lines
+
+
+def test_finished_tasks():
+    registry = MetricsRegistry()
+    registry.task_state("1", "RUNNING")
+    # reported by a callback and by a poll racing with it
+    registry.task_state("1", "COMPLETE")
+    registry.task_state("1", "COMPLETE")
+    registry.task_state("2", "UNKNOWN")
+    registry.task_state("3", None)
+    registry.task_state("4", "PAUSED")
+    lines = registry.render().splitlines()
+    assert 'tes_client_finished_tasks_total{state="COMPLETE"} 1' in lines
+    assert not any('state="UNKNOWN"' in line or 'state="None"' in line
+                   for line in lines)
+    assert 'tes_client_waited_tasks{state="RUNNING"} 0' in lines
+    assert 'tes_client_waited_tasks{state="PAUSED"} 1' in lines
+
+    # finished tasks are remembered up to a limit
+    with mock.patch("tes.metrics.FINISHED_MEMORY", 2):
+        for task_id in ["5", "6", "7", "5"]:
+            registry.task_state(task_id, "CANCELED")
+    lines = registry.render().splitlines()
+    assert 'tes_client_finished_tasks_total{state="CANCELED"} 4' in lines
+
+
+def test_metrics_hedging(build_task):
+    api = FakeTES(latency=0.02, jitter=0.02)
+    task_id = api.add_task(build_task())
+    registry = MetricsRegistry()
+    policy = HedgePolicy(default_delay=0.01, budget=1.0)
+    cli = HTTPClient("http://fake", transport=InMemoryTransport(api),
+                     hooks=[registry], hedging=policy)
+    for _ in range(10):
+        cli.get_task(task_id)
+    assert policy.stats()["hedged"] > 0
+
+    # hedges that lost are counted once they return
+    sent = 10 + policy.stats()["hedged"]
+    expected = [
+        "tes_client_open_requests 0",
+        'tes_client_requests_total{endpoint="get_task",method="GET",'
+        f'status="200"}} {sent}',
+        'tes_client_request_duration_seconds_count{endpoint="get_task"} '
+        f'{sent}',
+    ]
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        lines = registry.render().splitlines()
+        if all(line in lines for line in expected):
+            break
+        time.sleep(0.01)
+    for line in expected:
+        assert line in lines
+
+
+def test_metrics_server():
+    registry = MetricsRegistry()
+    server = registry.serve()
+    try:
+        response = requests.get(
+            f"http://127.0.0.1:{server.server_address[1]}/metrics")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain")
+        assert "tes_client_open_requests 0" in response.text
+    finally:
+        server.shutdown()
+        server.server_close()
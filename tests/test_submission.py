@@ -0,0 +1,64 @@
+import pytest
+import queue
+import requests
+import time
+
+from concurrent.futures import CancelledError
+
+from tes.submission import SubmissionQueue
+
+
+@pytest.mark.fake_api(latency=0.1)
+def test_enqueue(build_task, fake_api, fake_client):
+    with SubmissionQueue(fake_client, max_workers=10) as submissions:
+        start = time.monotonic()
+        futures = [submissions.enqueue(build_task()) for _ in range(20)]
+        assert time.monotonic() - start < 0.05
+        submissions.flush()
+        assert time.monotonic() - start < 0.5
+        assert submissions.pending() == 0
+    assert sorted(f.result() for f in futures) == sorted(fake_api.tasks)
+    with pytest.raises(RuntimeError):
+        submissions.enqueue(build_task())
+    with pytest.raises(TypeError):
+        submissions.enqueue(42)  # type: ignore
+
+
+@pytest.mark.fake_api(latency=0.2)
+def test_backpressure(build_task, fake_api, fake_client):
+    submissions = SubmissionQueue(
+        fake_client, max_workers=1, max_queue_size=2)
+    futures = [submissions.enqueue(build_task()) for _ in range(3)]
+    with pytest.raises(queue.Full):
+        submissions.enqueue(build_task(), timeout=0.01)
+    # room again once the next task is taken off the queue
+    futures.append(submissions.enqueue(build_task(), timeout=1))
+    submissions.shutdown()
+    assert all(f.done() for f in futures)
+    assert len(fake_api.tasks) == 4
+    submissions.shutdown()
+
+
+@pytest.mark.fake_api(latency=0.2)
+def test_shutdown_cancel_pending(build_task, fake_api, fake_client):
+    submissions = SubmissionQueue(fake_client, max_workers=1)
+    futures = [submissions.enqueue(build_task()) for _ in range(5)]
+    time.sleep(0.05)
+    submissions.shutdown(cancel_pending=True)
+    assert futures[0].result()
+    assert all(f.cancelled() for f in futures[1:])
+    with pytest.raises(CancelledError):
+        futures[1].result()
+    assert len(fake_api.tasks) == 1
+
+
+def test_errors(build_task, fake_api, fake_client):
+    fake_api.inject_error(400, route="/tasks", method="POST")
+    with SubmissionQueue(fake_client, max_workers=1) as submissions:
+        failed = submissions.enqueue(build_task())
+        created = submissions.enqueue(build_task())
+    with pytest.raises(requests.exceptions.HTTPError):
+        failed.result()
+    assert created.result() in fake_api.tasks
+    with pytest.raises(ValueError):
+        SubmissionQueue(fake_client, max_queue_size=0)
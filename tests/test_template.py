@@ -0,0 +1,73 @@
+import json
+import pytest
+
+from concurrent.futures import wait
+
+from tes.client import HTTPClient
+from tes.futures import TaskPoller
+from tes.models import Executor, Input, Task
+from tes.template import TaskTemplate
+from tes.testing import FakeTES, InMemoryTransport
+
+
+def _template():
+    return Task(
+        name="align-{{sample}}",
+        inputs=[Input(url="s3://bucket/{{ sample }}.fq",
+                      path="/data/{{sample}}.fq")],
+        executors=[Executor(image="aligner:{{version}}",
+                            command=["align", "-q", "{{quality}}",
+                                     "/data/{{sample}}.fq"],
+                            env={"AWK": "{print $1}"})],
+    )
+
+
+def test_render():
+    template = TaskTemplate(_template())
+    assert template.names == {"sample", "version", "quality"}
+    params = {"sample": 'S"1\\', "version": "1.0", "quality": 30, "x": 1}
+    task = template.task(params)
+    assert task.name == 'align-S"1\\'
+    assert task.inputs[0].url == 's3://bucket/S"1\\.fq'
+    assert task.executors[0].command == [
+        "align", "-q", "30", '/data/S"1\\.fq']
+    assert task.executors[0].env == {"AWK": "{print $1}"}
+    assert json.loads(template.render(params)) == json.loads(task.as_json())
+
+    with pytest.raises(KeyError, match="version"):
+        template.render({"sample": "S1", "quality": 1})
+    with pytest.raises(TypeError):
+        TaskTemplate("task")  # type: ignore
+    plain = Task(executors=[Executor(image="alpine", command=["true"])])
+    assert TaskTemplate(plain).render({}) == plain.as_json()
+
+
+def test_map():
+    api = FakeTES(latency=0.01, state_durations={"RUNNING": 0.05})
+    cli = HTTPClient("http://fake", transport=InMemoryTransport(api),
+                     poller=TaskPoller(interval=0.02))
+    params = [{"sample": f"S{i}", "version": "1", "quality": i}
+              for i in range(50)]
+    futures = cli.map(_template(), params, max_concurrency=10)
+    assert len(futures) == 50
+    done, _ = wait(futures, timeout=5)
+    assert len(done) == 50
+    assert all(f.result().state == "COMPLETE" for f in futures)
+    assert [api.tasks[f.task_id]["name"] for f in futures] == [
+        f"align-S{i}" for i in range(50)]
+
+    # tasks cancelled before they are sent are dropped
+    api.latency = 0.1
+    futures = cli.map(TaskTemplate(_template()), params[:5],
+                      max_concurrency=1)
+    assert all(f.cancel() for f in futures[1:])
+    assert futures[0].result(timeout=5).state == "COMPLETE"
+    assert len(api.tasks) == 51
+
+    api.inject_error(400, route="/tasks", method="POST")
+    with pytest.raises(Exception):
+        cli.map(_template(), [{}])
+    assert cli.map(_template(), []) == []
+    failed = cli.map(_template(), params[:1])[0]
+    wait([failed], timeout=5)
+    assert failed.exception() is not None
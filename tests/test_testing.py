@@ -0,0 +1,125 @@
+import json
+import pytest
+import requests
+import time
+
+from tes.client import HTTPClient
+from tes.models import Executor, Task
+from tes.testing import (FINAL_STATE_TAG, FakeTES, FakeTESServer,
+                         make_task)
+
+
+def _task(**kwargs):
+    return Task(executors=[Executor(image="alpine", command=["true"])],
+                **kwargs)
+
+
+def test_client_roundtrip():
+    api = FakeTES(page_size=2)
+    with FakeTESServer(api) as server:
+        cli = HTTPClient(server.url)
+        assert cli.get_service_info().name == "Fake TES"
+        ids = [cli.create_task(_task(name=f"task {i}")) for i in range(3)]
+
+        task = cli.get_task(ids[0], view="MINIMAL")
+        assert task.id == ids[0]
+        assert task.name is None
+        assert cli.get_task(ids[0]).name == "task 0"
+
+        page = cli.list_tasks()
+        assert [t.id for t in page.tasks] == ids[:0:-1]
+        page = cli.list_tasks(page_token=page.next_page_token)
+        assert [t.id for t in page.tasks] == ids[:1]
+        assert page.next_page_token is None
+
+        assert cli.wait(ids[0], timeout=5).state == "COMPLETE"
+        full = cli.get_task(ids[0], view="FULL")
+        assert full.logs[0].logs[0].exit_code == 0
+    assert api.requests[("POST", "/tasks")] == 3
+
+
+def test_state_progression_and_cancel():
+    api = FakeTES(state_durations={"QUEUED": 0.1, "RUNNING": 60})
+    status, _, body = api.handle("POST", "/ga4gh/tes/v1/tasks",
+                                 _task().as_json().encode())
+    assert status == 200
+    url = f"/ga4gh/tes/v1/tasks/{body['id']}"
+    assert api.handle("GET", url)[2]["state"] == "QUEUED"
+    time.sleep(0.15)
+    assert api.handle("GET", url)[2]["state"] == "RUNNING"
+    assert api.handle("POST", url + ":cancel")[0] == 200
+    assert api.handle("GET", url)[2]["state"] == "CANCELED"
+    assert api.handle("GET", url + "x")[0] == 404
+    assert api.handle("POST", url + "x:cancel")[0] == 404
+
+    api = FakeTES()
+    task_id = api.add_task(_task(tags={FINAL_STATE_TAG: "EXECUTOR_ERROR"}))
+    doc = api.handle("GET", f"/ga4gh/tes/v1/tasks/{task_id}?view=FULL")[2]
+    assert doc["state"] == "EXECUTOR_ERROR"
+    assert doc["logs"][0]["logs"][0]["exit_code"] == 1
+
+
+def test_views():
+    api = FakeTES()
+    task = make_task(n_executors=2, log_bytes=10, state="COMPLETE")
+    task.inputs[0].content = "hello"
+    task.inputs[0].url = None
+    task_id = api.add_task(task)
+    url = f"/ga4gh/tes/v1/tasks/{task_id}?view="
+    assert api.handle("GET", url + "MINIMAL")[2] == {
+        "id": task_id, "state": "COMPLETE"}
+    basic = api.handle("GET", url + "BASIC")[2]
+    assert "content" not in basic["inputs"][0]
+    assert "system_logs" not in basic["logs"][0]
+    assert "stdout" not in basic["logs"][0]["logs"][0]
+    full = api.handle("GET", url + "FULL")[2]
+    assert full["inputs"][0]["content"] == "hello"
+    assert full["logs"][0]["logs"][1]["stdout"] == "o" * 10
+
+
+def test_list_filters():
+    api = FakeTES()
+    api.add_task(make_task(state="COMPLETE"))
+    api.add_task(dict(json.loads(_task(name="other").as_json()),
+                      tags={"a": "1"}))
+    url = "/ga4gh/tes/v1/tasks?view=BASIC"
+    assert len(api.handle("GET", url)[2]["tasks"]) == 2
+    tasks = api.handle("GET", url + "&name_prefix=gen")[2]["tasks"]
+    assert [t["name"] for t in tasks] == ["generated task"]
+    tasks = api.handle("GET", url + "&tag_key=a&tag_value=1")[2]["tasks"]
+    assert [t["name"] for t in tasks] == ["other"]
+    assert len(api.handle("GET", url + "&tag_key=a")[2]["tasks"]) == 1
+    assert api.handle("GET", url + "&tag_key=a&tag_value=2")[2] == {
+        "tasks": []}
+    assert api.handle("GET", url + "&page_token=x")[0] == 400
+
+
+def test_error_injection():
+    api = FakeTES(prefix="/")
+    api.inject_error(429, route="/tasks", method="POST")
+    api.inject_error(503, count=2)
+    assert api.handle("GET", "/tasks")[0] == 503
+    status, headers, _ = api.handle("POST", "/tasks", b"{}")
+    assert (status, headers) == (429, {"Retry-After": "1"})
+    assert api.handle("GET", "/service-info")[0] == 503
+    assert api.handle("POST", "/tasks", b"{}")[0] == 400
+    assert api.handle("POST", "/tasks", b"no json")[0] == 400
+    assert api.handle("GET", "/unknown")[0] == 404
+    assert api.handle("GET", "/ga4gh/tes/v1/tasks")[0] == 404
+
+    api = FakeTES(error_rate=1, error_statuses=(500,), seed=1)
+    assert api.handle("GET", "/ga4gh/tes/v1/tasks")[0] == 500
+
+
+def test_server_errors_and_latency():
+    api = FakeTES(prefix="/v1", latency=0.05)
+    api.inject_error(503)
+    with FakeTESServer(api) as server:
+        cli = HTTPClient(server.url)
+        start = time.monotonic()
+        with pytest.raises(requests.HTTPError) as exc:
+            cli.list_tasks()
+        assert exc.value.response.status_code == 503
+        # falls back from the missing `/ga4gh/tes/v1` base path
+        assert cli.list_tasks().tasks == []
+        assert time.monotonic() - start >= 0.2
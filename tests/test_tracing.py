@@ -0,0 +1,113 @@
+import pytest
+import requests
+import requests_mock
+import sys
+
+from tes.client import HTTPClient
+from tes.tracing import NOOP_SPAN, NOOP_TRACER, OpenTelemetryTracer, Span, Tracer
+from tes.utils import UnmarshalError
+
+
+class RecordingSpan(Span):
+    def __init__(self, name, attributes, parent):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = parent
+        self.exceptions = []
+        self.ended = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc):
+        self.exceptions.append(exc)
+
+    def end(self):
+        self.ended = True
+
+
+class RecordingTracer(Tracer):
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None, parent=None):
+        span = RecordingSpan(name, attributes, parent)
+        self.spans.append(span)
+        return span
+
+
+def test_noop_tracer():
+    with NOOP_TRACER.start_span("foo", {"a": 1}) as span:
+        assert span is NOOP_SPAN
+        span.set_attribute("b", 2)
+    with pytest.raises(ValueError):
+        with NOOP_TRACER.start_span("foo"):
+            raise ValueError
+
+
+def test_client_spans():
+    url = "http://fakehost:8000"
+    tracer = RecordingTracer()
+    cli = HTTPClient(url, tracer=tracer)
+    with requests_mock.Mocker() as m:
+        m.get(f"{url}/ga4gh/tes/v1/tasks/1", status_code=404)
+        m.get(f"{url}/v1/tasks/1", exc=requests.exceptions.ConnectTimeout)
+        m.get(f"{url}/tasks/1", json={"id": "1", "state": "RUNNING"})
+        cli.get_task("1")
+
+    root, *children = tracer.spans
+    assert root.name == "tes.get_task"
+    assert root.parent is None
+    assert [s.name for s in children] == [
+        "tes.attempt", "tes.attempt", "tes.attempt",
+        "tes.decode.json", "tes.decode.unmarshal",
+    ]
+    assert all(s.parent is root and s.ended for s in tracer.spans[1:])
+    assert root.ended
+    assert children[0].attributes["http.status_code"] == 404
+    assert children[1].attributes["tes.attempt"] == 2
+    assert isinstance(children[1].exceptions[0],
+                      requests.exceptions.ConnectTimeout)
+    assert children[4].attributes["tes.model"] == "Task"
+
+    tracer.spans.clear()
+    with requests_mock.Mocker() as m:
+        m.get(requests_mock.ANY, json={"state": "bogus"})
+        with pytest.raises(UnmarshalError):
+            cli.get_task("1")
+    assert isinstance(tracer.spans[0].exceptions[0], UnmarshalError)
+    assert isinstance(tracer.spans[-1].exceptions[0], UnmarshalError)
+
+    with pytest.raises(TypeError):
+        HTTPClient(url, tracer=object())  # type: ignore
+
+
+def test_opentelemetry_tracer_missing(monkeypatch):
+    monkeypatch.setitem(sys.modules, "opentelemetry", None)
+    with pytest.raises(ImportError):
+        OpenTelemetryTracer()
+
+
+def test_opentelemetry_tracer():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import \
+        InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = OpenTelemetryTracer(provider.get_tracer("test"))
+
+    with tracer.start_span("parent") as parent:
+        with tracer.start_span("child", {"a": 1}, parent=parent) as child:
+            child.set_attribute("b", 2)
+        with pytest.raises(ValueError):
+            with tracer.start_span("failing", parent=parent):
+                raise ValueError("boom")
+
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    assert spans["child"].parent.span_id == spans["parent"].context.span_id
+    assert spans["child"].attributes == {"a": 1, "b": 2}
+    assert not spans["failing"].status.is_ok
@@ -0,0 +1,367 @@
+import pytest
+import requests
+import requests_mock
+import socket
+import time
+import urllib3
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from tes.bench import TRANSPORTS
+from tes.client import HTTPClient
+from tes.instrumentation import Hooks
+from tes.models import Executor, Task
+from tes.testing import FakeTES, FakeTESServer, InMemoryTransport, make_task
+from tes.transport import (HttpxTransport, RecordingTransport,
+                           ReplayTransport, RequestsTransport,
+                           SessionTransport, Transport, UnixSocketTransport,
+                           Urllib3Transport, _request_headers)
+from tes.utils import NoResponseError, ReplayError, never_connected
+
+
+URL = "http://fakehost:8000"
+
+
+def _task(command):
+    return Task(executors=[Executor(image="alpine", command=[command])])
+
+
+@pytest.mark.parametrize("name", ["traffic.jsonl", "traffic.jsonl.gz"])
+def test_record_replay(tmp_path, name):
+    path = str(tmp_path / name)
+    recorder = RecordingTransport(path)
+    cli = HTTPClient(URL, transport=recorder)
+    with requests_mock.Mocker() as m:
+        m.get(f"{URL}/ga4gh/tes/v1/tasks/1", status_code=404)
+        m.get(f"{URL}/v1/tasks/1", [
+            {"json": {"id": "1", "state": "RUNNING"},
+             "headers": {"Content-Encoding": "identity"}},
+            {"json": {"id": "1", "state": "COMPLETE"}},
+        ])
+        m.get(f"{URL}/ga4gh/tes/v1/tasks?view=MINIMAL",
+              exc=requests.exceptions.ConnectTimeout("timed out"))
+        m.get(f"{URL}/v1/tasks?view=MINIMAL", json={"tasks": []})
+        m.post(f"{URL}/ga4gh/tes/v1/tasks", json={"id": "2"})
+        m.get(f"{URL}/ga4gh/tes/v1/service-info", content=b"\xff")
+        assert cli.get_task("1").state == "RUNNING"
+        assert cli.get_task("1").state == "COMPLETE"
+        assert cli.list_tasks().tasks == []
+        assert cli.create_task(_task("true")) == "2"
+        with pytest.raises(ValueError):
+            cli.get_service_info()
+        recorded = m.call_count
+    recorder.close()
+
+    replay = ReplayTransport(path)
+    cli = HTTPClient(URL, transport=replay)
+    assert cli.get_task("1").state == "RUNNING"
+    assert cli.get_task("1").state == "COMPLETE"
+    # recorded responses are repeated once used up
+    assert cli.get_task("1").state == "COMPLETE"
+    assert cli.list_tasks().tasks == []
+    assert cli.create_task(_task("true")) == "2"
+    response = replay.request("get", f"{URL}/ga4gh/tes/v1/service-info")
+    assert response.content == b"\xff"
+    assert recorded == 8
+    with pytest.raises(NoResponseError) as exc:
+        cli.get_task("3")
+    assert all(isinstance(e, ReplayError)
+               for e in exc.value.exceptions.values())
+    with pytest.raises(NoResponseError):
+        cli.create_task(_task("false"))
+
+
+def test_replay_timing(tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    path.write_text(
+        '{"method":"get","url":"%s/v1/tasks/1","body":null,"elapsed":0.2,'
+        '"status":200,"headers":{},"content":"{\\"id\\": \\"1\\"}"}\n\n'
+        '{"method":"get","url":"%s/v1/tasks/2","body":null,"elapsed":0.2,'
+        '"error":"Unknown","message":"failed"}\n' % (URL, URL))
+    with pytest.raises(ValueError):
+        ReplayTransport(str(path), speed=0)
+    replay = ReplayTransport(str(path), speed=4)
+    start = time.monotonic()
+    response = replay.request("GET", f"{URL}/v1/tasks/1")
+    assert time.monotonic() - start >= 0.05
+    assert response.json() == {"id": "1"}
+    assert response.elapsed.total_seconds() == 0.2
+    with pytest.raises(requests.exceptions.RequestException):
+        replay.request("get", f"{URL}/v1/tasks/2")
+
+
+def test_transport_interface():
+    with pytest.raises(NotImplementedError):
+        Transport().request("get", URL)
+    with requests_mock.Mocker() as m:
+        m.get(URL, text="ok")
+        assert RequestsTransport().request("get", URL).text == "ok"
+    with pytest.raises(TypeError):
+        HTTPClient(URL, transport="requests")
+
+
+def _transports():
+    transports = [RequestsTransport, SessionTransport, Urllib3Transport]
+    try:
+        import httpx  # noqa: F401
+    except ImportError:  # pragma: no cover
+        pass
+    else:
+        transports.append(HttpxTransport)
+    return transports
+
+
+@pytest.mark.parametrize("transport_class", _transports())
+def test_transports(transport_class):
+    api = FakeTES(latency=0.1)
+    api.add_task(make_task(state="COMPLETE"))
+    api.inject_error(503, route="/tasks/{id}")
+    transport = transport_class()
+    with FakeTESServer(api) as server:
+        cli = HTTPClient(server.url, user="user", password="secret",
+                         transport=transport)
+        task_id = cli.create_task(_task("true"))
+        with pytest.raises(requests.exceptions.HTTPError) as exc:
+            cli.get_task(task_id)
+        assert exc.value.response.status_code == 503
+        assert cli.get_task(task_id, view="MINIMAL").state == "COMPLETE"
+        assert len(cli.list_tasks(page_size=1).tasks) == 1
+        response = transport.request(
+            "get", f"{server.url}/ga4gh/tes/v1/service-info",
+            timeout=(1, 1))
+        assert response.json()["name"] == "Fake TES"
+        assert response.elapsed.total_seconds() >= 0.1
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            transport.request(
+                "get", f"{server.url}/ga4gh/tes/v1/service-info",
+                timeout=0.02)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        transport.request("get", f"{server.url}/ga4gh/tes/v1/service-info",
+                          timeout=1)
+    transport.close()
+
+
+def test_request_headers():
+    headers = _request_headers({"headers": {"A": "b"},
+                                "auth": ("user", "secret")})
+    assert headers == {"A": "b", "Authorization": "Basic dXNlcjpzZWNyZXQ="}
+    assert _request_headers({}) == {}
+
+
+def test_in_memory_transport():
+    api = FakeTES(page_size=1)
+    cli = HTTPClient("http://fake", transport=InMemoryTransport(api))
+    ids = [cli.create_task(_task("true")) for _ in range(2)]
+    page = cli.list_tasks()
+    assert [t.id for t in page.tasks] == ids[1:]
+    assert cli.list_tasks(page_token=page.next_page_token).tasks[0].id == \
+        ids[0]
+    assert cli.wait(ids[0], timeout=1).state == "COMPLETE"
+    assert InMemoryTransport().api is not api
+
+
+@pytest.mark.parametrize("error,expected", [
+    (urllib3.exceptions.ConnectTimeoutError(),
+     requests.exceptions.ConnectTimeout),
+    (urllib3.exceptions.SSLError(), requests.exceptions.SSLError),
+    (urllib3.exceptions.ProtocolError(), requests.exceptions.ConnectionError),
+])
+def test_urllib3_errors(error, expected):
+    transport = Urllib3Transport()
+    with mock.patch.object(transport.pool, "request", side_effect=error):
+        with pytest.raises(expected):
+            transport.request("get", URL, timeout=1)
+
+
+def test_httpx_errors():
+    httpx = pytest.importorskip("httpx")
+    transport = HttpxTransport()
+    with mock.patch.object(transport.client, "request",
+                           side_effect=httpx.PoolTimeout("pool")):
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            transport.request("get", URL, timeout=1)
+    with mock.patch.dict("sys.modules", {"httpx": None}):
+        with pytest.raises(ImportError):
+            HttpxTransport()
+
+
+@pytest.mark.parametrize("transport", [
+    SessionTransport, Urllib3Transport, HttpxTransport])
+def test_never_connected(transport):
+    if transport is HttpxTransport:
+        pytest.importorskip("httpx")
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    with pytest.raises(requests.exceptions.ConnectionError) as info:
+        transport().request("post", f"http://127.0.0.1:{port}/", timeout=1)
+    assert never_connected(info.value)
+    assert never_connected(NoResponseError(exceptions={"/": info.value}))
+    assert not never_connected(NoResponseError())
+    assert not never_connected(requests.exceptions.ReadTimeout())
+    assert not never_connected(requests.exceptions.ConnectionError(
+        urllib3.exceptions.ProtocolError("Connection aborted.")))
+
+
+@pytest.mark.parametrize("name,timed", [
+    ("session", False), ("urllib3", True), ("httpx", True),
+    ("httpx-http2", True)])
+def test_connect_time(name, timed):
+    try:
+        transport = TRANSPORTS[name](1)
+    except ImportError as exc:
+        pytest.skip(str(exc))
+    events = []
+
+    class Recorder(Hooks):
+        def post_response(self, event):
+            events.append(event)
+
+    with FakeTESServer() as server:
+        cli = HTTPClient(server.url, transport=transport,
+                         hooks=[Recorder()])
+        cli.get_service_info()
+        cli.get_service_info()
+    transport.close()
+    if timed:
+        assert events[0].connect_time > 0
+        assert events[-1].connect_time == 0.0
+    else:
+        assert all(event.connect_time is None for event in events)
+
+
+def test_http2_multiplexing():
+    pytest.importorskip("h2")
+    pytest.importorskip("httpx")
+    api = FakeTES(latency=0.2)
+    # larger than the initial flow control window
+    task_id = api.add_task(make_task(log_bytes=100000, state="COMPLETE"))
+    transport = HttpxTransport(http2_prior_knowledge=True, max_connections=4)
+    with FakeTESServer(api, http2=True) as server:
+        cli = HTTPClient(server.url, transport=transport)
+        task = cli.get_task(task_id, view="FULL")
+        assert len(task.logs[0].logs[0].stdout) == 100000
+        assert cli.create_task(_task("true"))
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            states = list(executor.map(
+                lambda _: cli.get_task(task_id, view="MINIMAL").state,
+                range(20)))
+        assert states == ["COMPLETE"] * 20
+        # all requests share one connection and are answered concurrently
+        assert time.monotonic() - start < 2
+        assert server.connections == 1
+    transport.close()
+    with mock.patch.dict("sys.modules", {"h2": None}):
+        with pytest.raises(ImportError):
+            FakeTESServer(http2=True)
+
+
+def test_http2_stream_order():
+    h2 = pytest.importorskip("h2.connection")
+    pytest.importorskip("httpx")
+    api = FakeTES()
+    task_id = api.add_task(make_task(state="COMPLETE"))
+    transport = HttpxTransport(http2_prior_knowledge=True)
+    allocate = h2.H2Connection.get_next_available_stream_id
+    delays = [0.2]
+
+    def slow_allocate(conn):
+        # delay the first request after allocating its stream ID
+        stream_id = allocate(conn)
+        if not conn.config.client_side or not delays:
+            return stream_id
+        time.sleep(delays.pop())
+        return stream_id
+
+    with FakeTESServer(api, http2=True) as server:
+        cli = HTTPClient(server.url, transport=transport)
+        cli.get_task(task_id)
+        with mock.patch.object(h2.H2Connection,
+                               "get_next_available_stream_id",
+                               slow_allocate):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [executor.submit(cli.get_task, task_id)
+                           for _ in range(2)]
+                assert [f.result().id for f in futures] == [task_id] * 2
+        with mock.patch.object(transport.client, "request",
+                               side_effect=RuntimeError("failed")):
+            with pytest.raises(RuntimeError):
+                transport.request("get", server.url, timeout=1)
+        # released after errors
+        assert cli.get_task(task_id).id == task_id
+    transport.close()
+
+
+def test_http2_origins():
+    httpx = pytest.importorskip("httpx")
+    pytest.importorskip("h2")
+    api = FakeTES()
+    task_id = api.add_task(make_task(state="COMPLETE"))
+    # plain http URLs speak HTTP/1.1 unless HTTP/2 is known to be spoken
+    transport = HttpxTransport(http2=True)
+    with FakeTESServer(api) as server:
+        cli = HTTPClient(server.url, transport=transport)
+        assert cli.get_task(task_id).id == task_id
+    assert transport._opening == {}
+
+    # https origins negotiating HTTP/1.1 are not locked after the first
+    # response
+    url = "https://tes.example.org/ga4gh/tes/v1/service-info"
+    response = httpx.Response(200, request=httpx.Request("GET", url))
+    response.elapsed = timedelta(0)
+    with mock.patch.object(transport.client, "request",
+                           return_value=response):
+        transport.request("get", url)
+        assert transport._opening_lock(("https", "tes.example.org")) is None
+    transport.close()
+
+    # requests to other origins are not held up
+    transport = HttpxTransport(http2_prior_knowledge=True)
+    with FakeTESServer(api, http2=True) as server:
+        other = transport._opening_lock(("http", "other.example.org"))
+        with other:
+            cli = HTTPClient(server.url, transport=transport)
+            assert cli.get_task(task_id).id == task_id
+        assert len(transport._opening) == 2
+    transport.close()
+
+
+def test_unix_socket(tmp_path):
+    socket_path = str(tmp_path / "tes.sock")
+    api = FakeTES()
+    with FakeTESServer(api, unix_socket=socket_path) as server:
+        assert server.url.startswith("http+unix://%2F")
+        cli = HTTPClient(server.url)
+        assert isinstance(cli.transport, UnixSocketTransport)
+        task_id = cli.create_task(_task("true"))
+        assert cli.get_task(task_id).executors[0].command == ["true"]
+        assert cli.list_tasks(page_size=5).tasks[0].id == task_id
+        assert cli.wait(task_id, timeout=1).state == "COMPLETE"
+        # connections are kept alive
+        assert server.connections == 1
+        response = cli.transport.request(
+            "get", server.url, timeout=1)
+        assert response.status_code == 404
+    assert not (tmp_path / "tes.sock").exists()
+    cli.transport.close()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        cli.transport.request("get", server.url, timeout=1)
+
+    transport = UnixSocketTransport()
+    with FakeTESServer() as server:
+        assert transport.request(
+            "get", f"{server.url}/ga4gh/tes/v1/service-info").ok
+    missing = "http+unix://" + str(tmp_path / "missing.sock").replace(
+        "/", "%2F")
+    with pytest.raises(requests.exceptions.ConnectionError):
+        transport.request("get", missing, timeout=1)
+    with mock.patch("socket.socket.connect", side_effect=socket.timeout):
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            transport.request("get", missing, timeout=1)
+    transport.close()
+    with pytest.raises(ValueError):
+        HTTPClient("unix:///tmp/tes.sock")
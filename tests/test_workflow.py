@@ -0,0 +1,114 @@
+import json
+import pytest
+import time
+
+from tes.futures import TaskPoller
+from tes.testing import FINAL_STATE_TAG
+from tes.utils import TimeoutError
+from tes.workflow import COMPLETE, FAILED, PENDING, SKIPPED, Workflow
+
+
+@pytest.fixture
+def fake_client(fake_client):
+    fake_client.poller = TaskPoller(interval=0.01)
+    return fake_client
+
+
+def _created(api):
+    """Names of created tasks, in creation order."""
+    return [api.tasks[task_id]["name"] for task_id in api.order]
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 0.05})
+def test_run(fake_api, fake_client, build_task):
+    workflow = Workflow(fake_client, max_parallel=2)
+    workflow.add("a", build_task(name="a"))
+    workflow.add("b", build_task(name="b"), after=["a"])
+    workflow.add("c", build_task(name="c"), after=["a"])
+    workflow.add("d", build_task(name="d"), after=["b", "c"])
+    workflow.add("e", build_task(name="e"))
+    assert workflow.run(timeout=5)
+    created = _created(fake_api)
+    assert sorted(created) == ["a", "b", "c", "d", "e"]
+    assert created.index("b") > created.index("a")
+    assert created[-1] == "d"
+    assert all(node.status == COMPLETE for node in workflow.nodes.values())
+    assert workflow.nodes["d"].result.state == "COMPLETE"
+    assert workflow.nodes["d"].task_id in fake_api.tasks
+
+    with pytest.raises(ValueError):
+        workflow.add("a", build_task(name="a"))
+    with pytest.raises(ValueError):
+        workflow.add("f", build_task(name="f"), after=["x"])
+    with pytest.raises(TypeError):
+        workflow.add("f", "task")  # type: ignore
+    with pytest.raises(ValueError):
+        Workflow(fake_client, max_parallel=0)
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 0.05})
+def test_max_parallel(fake_client, build_task):
+    workflow = Workflow(fake_client, max_parallel=3)
+    for index in range(9):
+        workflow.add(str(index), build_task(name=str(index)))
+    start = time.monotonic()
+    assert workflow.run()
+    # three waves of three tasks
+    assert 0.15 <= time.monotonic() - start < 1
+
+
+def test_failures(tmp_path, fake_api, fake_client, build_task):
+    path = str(tmp_path / "state.json")
+    workflow = Workflow(fake_client, state_path=path)
+    flaky = build_task(name="flaky", tags={FINAL_STATE_TAG: "SYSTEM_ERROR"})
+    workflow.add("flaky", flaky, retries=1)
+    workflow.add("child", build_task(name="child"), after=["flaky"])
+    workflow.add("grandchild", build_task(name="grandchild"), after=["child"])
+    workflow.add("other", build_task(name="other"))
+    assert not workflow.run()
+    assert _created(fake_api).count("flaky") == 2
+    assert workflow.nodes["flaky"].status == FAILED
+    assert workflow.nodes["flaky"].result.state == "SYSTEM_ERROR"
+    assert workflow.nodes["child"].status == SKIPPED
+    assert workflow.nodes["grandchild"].status == SKIPPED
+    assert workflow.nodes["other"].status == COMPLETE
+    with open(path) as f:
+        assert json.load(f)["nodes"]["flaky"]["attempts"] == 2
+
+    # resume with the failing task fixed
+    workflow = Workflow(fake_client, state_path=path)
+    workflow.add("flaky", build_task(name="flaky"))
+    workflow.add("child", build_task(name="child"), after=["flaky"])
+    workflow.add("grandchild", build_task(name="grandchild"), after=["child"])
+    workflow.add("other", build_task(name="other"))
+    assert workflow.run()
+    assert _created(fake_api) == [
+        "flaky", "other", "flaky", "flaky", "child", "grandchild"]
+    assert workflow.run()
+    assert len(fake_api.tasks) == 6
+
+    fake_api.inject_error(400, route="/tasks", method="POST")
+    workflow = Workflow(fake_client)
+    workflow.add("invalid", build_task(name="invalid"))
+    assert not workflow.run()
+    assert workflow.nodes["invalid"].task_id is None
+    assert workflow.nodes["invalid"].error.response.status_code == 400
+    assert workflow.run()
+
+
+@pytest.mark.fake_api(state_durations={"RUNNING": 0.3})
+def test_resume_running(tmp_path, fake_api, fake_client, build_task):
+    path = str(tmp_path / "state.json")
+
+    def build():
+        workflow = Workflow(fake_client, state_path=path)
+        workflow.add("a", build_task(name="a"))
+        workflow.add("b", build_task(name="b"), after=["a"])
+        return workflow
+
+    workflow = build()
+    with pytest.raises(TimeoutError):
+        workflow.run(timeout=0.1)
+    assert workflow.nodes["b"].status == PENDING
+    assert build().run(timeout=5)
+    assert _created(fake_api) == ["a", "b"]